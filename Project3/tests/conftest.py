@@ -0,0 +1,136 @@
+# tests/conftest.py
+"""
+Общие настройки тестов. Запуск из корня репозитория:
+
+    python -m pytest Project3/tests
+"""
+
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+
+# Модули читают настройки из окружения при импорте, поэтому задаём их до импорта бота
+os.environ.setdefault('API_KEY', 'test-key')
+
+from Project3.weather_bot.weather import api  # noqa: E402
+from Project3.weather_bot.weather.async_api import HttpClient  # noqa: E402
+
+# Фикстуры aiohttp (aiohttp_server, aiohttp_client) и запуск async-тестов
+pytest_plugins = ['aiohttp.pytest_plugin']
+
+
+class FakeWeatherApi:
+    """
+    Локальная замена AccuWeather и Open-Meteo: отвечает в формате настоящих API.
+    Задержку и код ответа каждого сервиса можно менять по ходу теста; calls — вызванные пути,
+    queries — параметры этих запросов.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.queries = []
+        self.accuweather_delay = 0.0
+        self.accuweather_status = 200
+        self.open_meteo_delay = 0.0
+        self.open_meteo_status = 200
+        self.url = None
+
+    def accuweather_calls(self):
+        return [path for path in self.calls if not path.startswith('/v1/')]
+
+    def open_meteo_calls(self):
+        return [path for path in self.calls if path.startswith('/v1/')]
+
+    async def _accuweather(self, request, payload):
+        self.calls.append(request.path)
+        self.queries.append(dict(request.query))
+        await asyncio.sleep(self.accuweather_delay)
+        if self.accuweather_status != 200:
+            return web.Response(status=self.accuweather_status)
+        return web.json_response(payload)
+
+    async def _open_meteo(self, request, payload):
+        self.calls.append(request.path)
+        self.queries.append(dict(request.query))
+        await asyncio.sleep(self.open_meteo_delay)
+        if self.open_meteo_status != 200:
+            return web.Response(status=self.open_meteo_status)
+        return web.json_response(payload)
+
+    async def city_search(self, request):
+        city = request.query['q']
+        found = [] if city == 'Нигде' else [{
+            'Key': f'key-{city}',
+            'LocalizedName': city,
+            'GeoPosition': {'Latitude': 55.75, 'Longitude': 37.62}
+        }]
+        return await self._accuweather(request, found)
+
+    async def current_conditions(self, request):
+        return await self._accuweather(request, [{
+            'Temperature': {'Metric': {'Value': 3.0}},
+            'Wind': {'Speed': {'Metric': {'Value': 12.0}}},
+            'PrecipitationProbability': 10
+        }])
+
+    async def daily_forecast(self, request):
+        days = int(request.match_info['days'])
+        return await self._accuweather(request, {'DailyForecasts': [{
+            'Date': f'2024-12-{20 + idx}T07:00:00+03:00',
+            'Temperature': {'Minimum': {'Value': -5 + idx}, 'Maximum': {'Value': 1 + idx}},
+            'Day': {'Wind': {'Speed': {'Value': 10 + idx}}, 'PrecipitationProbability': 20, 'IconPhrase': 'Облачно'},
+            'Night': {'IconPhrase': 'Ясно'}
+        } for idx in range(days)]})
+
+    async def open_meteo_search(self, request):
+        found = [] if request.query['name'] == 'Нигде' else [
+            {'id': 1, 'name': request.query['name'], 'latitude': 50.45, 'longitude': 30.52}
+        ]
+        return await self._open_meteo(request, {'results': found})
+
+    async def open_meteo_forecast(self, request):
+        days = int(request.query['forecast_days'])
+        data = {'daily': {
+            'time': [f'2024-12-{20 + idx}' for idx in range(days)],
+            'temperature_2m_max': [2.0 + idx for idx in range(days)],
+            'temperature_2m_min': [-3.0] * days,
+            'wind_speed_10m_max': [15.0] * days,
+            'precipitation_probability_max': [30] * days,
+            'weather_code': [3] * days
+        }}
+        if 'current' in request.query:
+            data['current'] = {'time': '2024-12-20T10:00', 'temperature_2m': 1.5, 'wind_speed_10m': 9.0}
+        return await self._open_meteo(request, data)
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/locations/v1/cities/search', self.city_search)
+        app.router.add_get('/currentconditions/v1/{key}', self.current_conditions)
+        app.router.add_get('/forecasts/v1/daily/{days}day/{key}', self.daily_forecast)
+        app.router.add_get('/v1/search', self.open_meteo_search)
+        app.router.add_get('/v1/forecast', self.open_meteo_forecast)
+        return app
+
+    @property
+    def open_meteo_urls(self):
+        """Аргументы forecast_url и geocoding_url для OpenMeteoProvider."""
+        return {'forecast_url': f'{self.url}/v1/forecast', 'geocoding_url': f'{self.url}/v1/search'}
+
+
+@pytest.fixture
+async def weather_api(loop, aiohttp_server, monkeypatch):
+    """Поддельные AccuWeather и Open-Meteo; запросы AccuWeather уходят на них."""
+    fake = FakeWeatherApi()
+    server = await aiohttp_server(fake.make_app())
+    fake.url = str(server.make_url('')).rstrip('/')
+    monkeypatch.setattr(api, 'ACCUWEATHER_BASE_URL', fake.url)
+    return fake
+
+
+@pytest.fixture
+async def http_client(loop):
+    client = HttpClient()
+    yield client
+    await client.close()
@@ -0,0 +1,35 @@
+# tests/test_advisory.py
+
+import pytest
+
+from Project3.weather_bot.weather import advisory
+from Project3.weather_bot.weather.advisory import advisory_engine, bench
+from Project3.weather_bot.weather.api import check_bad_weather
+
+READINGS = [(-20, 5, 0), (0, 0, 0), (12, 25, 80), (25, 45, 10), (35, 10, 95), (15.5, 30.0, 50)]
+
+
+def test_bench_matches_check_bad_weather():
+    pytest.importorskip('numpy')
+    result = bench(2000, repeat=1)
+    assert result['numpy']
+    assert result['mismatches'] == 0
+
+
+def test_pure_python_batch_matches_check_bad_weather(monkeypatch):
+    # Путь без NumPy должен давать те же рекомендации
+    monkeypatch.setattr(advisory, 'np', None)
+    temperatures, winds, precips = (list(column) for column in zip(*READINGS))
+    assert advisory_engine.evaluate_many(temperatures, winds, precips) == [
+        check_bad_weather(*reading) for reading in READINGS
+    ]
+
+
+def test_translated_advice_keeps_the_same_rules():
+    assert advisory_engine.evaluate(12, 25, 80, 'en-US') == 'Cold, windy and wet. Warm clothes and an umbrella are needed.'
+    temperatures, winds, precips = (list(column) for column in zip(*READINGS))
+    english = advisory_engine.evaluate_many(temperatures, winds, precips, 'en-US')
+    assert english == [advisory_engine.evaluate(*reading, 'en-US') for reading in READINGS]
+    assert set(english).isdisjoint(advisory_engine.texts())
+    # Язык без перевода — тексты правил
+    assert advisory_engine.evaluate(12, 25, 80, 'de-DE') == check_bad_weather(12, 25, 80)
@@ -0,0 +1,130 @@
+# tests/test_batch.py
+
+import json
+
+import pytest
+
+from Project3.weather_bot.weather import batch
+from Project3.weather_bot.weather.cache import geocode_cache
+from Project3.weather_bot.weather.quota import QuotaManager
+
+ROUTES_CSV = """id,start,end,stops,days
+r1,Тверь,Клин,Москва;Нигде,3
+r2,Клин,тверь,,3
+r3,Москва,Тверь,,
+"""
+
+ROUTES_JSONL = [
+    {'id': 'r1', 'start': 'Тверь', 'end': 'Клин', 'stops': ['Москва', 'Нигде'], 'days': 3},
+    {'id': 'r2', 'start': 'Клин', 'end': 'тверь', 'days': 3},
+    {'id': 'r3', 'start': 'Москва', 'end': 'Тверь'},
+]
+
+
+@pytest.fixture(autouse=True)
+def clean_geocode_cache():
+    geocode_cache.clear()
+    yield
+    geocode_cache.clear()
+
+
+@pytest.fixture
+def bot_quota(monkeypatch):
+    quota = QuotaManager(daily_budget=50, minute_budget=0, reserve=0.2, name='accuweather')
+    monkeypatch.setattr(batch, 'accuweather_quota', quota)
+    return quota
+
+
+async def run_cli(weather_api, tmp_path, input_name, *options):
+    output = tmp_path / 'forecasts.jsonl'
+    args = batch.parse_args([str(tmp_path / input_name), '--output', str(output), '--providers', 'accuweather',
+                             '--daily-budget', '100', *options])
+    assert await batch._main(args) == 0
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    return {record['id']: record for record in records}
+
+
+def check_routes(records, weather_api):
+    assert set(records) == {'r1', 'r2', 'r3'}
+    r1 = records['r1']
+    assert not r1['ok']
+    assert [point['query'] for point in r1['points']] == ['Тверь', 'Москва', 'Нигде', 'Клин']
+    assert [point['error'] for point in r1['points']] == [None, None, 'not_found', None]
+    assert [len(point['forecast']) for point in r1['points']] == [3, 3, 0, 3]
+    assert all(day['advice'] for day in r1['points'][0]['forecast'])
+    assert records['r2']['ok'] and records['r3']['ok']
+    assert [len(point['forecast']) for point in records['r3']['points']] == [1, 1]
+
+    # Каждый город геокодируется один раз («Тверь» и «тверь» — один город),
+    # каждый прогноз (локация, дни) запрашивается один раз на все маршруты
+    searches = [path for path in weather_api.calls if path == '/locations/v1/cities/search']
+    assert len(searches) == 4
+    assert sorted(path for path in weather_api.calls if path.startswith('/forecasts/')) == [
+        '/forecasts/v1/daily/3day/key-Клин',
+        '/forecasts/v1/daily/3day/key-Москва',
+        '/forecasts/v1/daily/3day/key-Тверь',
+    ]
+    assert sorted(path for path in weather_api.calls if path.startswith('/currentconditions/')) == [
+        '/currentconditions/v1/key-Москва',
+        '/currentconditions/v1/key-Тверь',
+    ]
+    # Резервный провайдер не вызывается
+    assert weather_api.open_meteo_calls() == []
+
+
+async def test_csv_routes(weather_api, tmp_path, bot_quota):
+    (tmp_path / 'routes.csv').write_text(ROUTES_CSV, encoding='utf-8')
+
+    records = await run_cli(weather_api, tmp_path, 'routes.csv')
+
+    check_routes(records, weather_api)
+    assert records['r3']['days'] == 1
+    assert records['r1']['points'][0]['city'] == 'Тверь'
+    # Без отдельного ключа запросы идут по ключу бота и списываются из его квоты
+    assert bot_quota.stats()['daily_used'] == len(weather_api.accuweather_calls())
+
+
+async def test_separate_key_keeps_bot_quota(weather_api, tmp_path, bot_quota, monkeypatch):
+    (tmp_path / 'routes.csv').write_text(ROUTES_CSV, encoding='utf-8')
+    monkeypatch.setattr(batch, 'BATCH_API_KEY', 'batch-key')
+
+    records = await run_cli(weather_api, tmp_path, 'routes.csv')
+
+    check_routes(records, weather_api)
+    assert {query['apikey'] for query in weather_api.queries} == {'batch-key'}
+    assert bot_quota.stats()['daily_used'] == 0
+
+
+async def test_shared_quota_keeps_bot_reserve(weather_api, tmp_path, bot_quota):
+    (tmp_path / 'routes.csv').write_text(ROUTES_CSV, encoding='utf-8')
+    for _ in range(38):
+        assert bot_quota.acquire('forecast')
+
+    records = await run_cli(weather_api, tmp_path, 'routes.csv')
+
+    # Из 50 запросов бота 10 — резерв для пользователей, пакетному прогону остаются 2
+    assert len(weather_api.accuweather_calls()) == 2
+    assert bot_quota.stats()['daily_used'] == 40
+    assert not any(record['ok'] for record in records.values())
+
+
+async def test_jsonl_routes(weather_api, tmp_path, bot_quota):
+    lines = [json.dumps(route, ensure_ascii=False) for route in ROUTES_JSONL]
+    (tmp_path / 'routes.jsonl').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    records = await run_cli(weather_api, tmp_path, 'routes.jsonl', '--days', '1', '--language', 'en-US')
+
+    check_routes(records, weather_api)
+    assert {query['language'] for query in weather_api.queries} == {'en-US'}
+    assert records['r3']['points'][0]['forecast'][0]['advice'].isascii()
+
+
+async def test_batch_budget_limits_requests(weather_api, tmp_path, bot_quota):
+    (tmp_path / 'routes.csv').write_text(ROUTES_CSV, encoding='utf-8')
+
+    records = await run_cli(weather_api, tmp_path, 'routes.csv', '--daily-budget', '2')
+
+    assert len(weather_api.accuweather_calls()) == 2
+    errors = [point['error'] for record in records.values() for point in record['points']]
+    assert 'failed' in errors
+    assert not any(record['ok'] for record in records.values())
@@ -0,0 +1,110 @@
+# tests/test_cache.py
+
+import asyncio
+
+import pytest
+
+from Project3.weather_bot.weather.cache import SingleFlight, SQLiteStore, TTLCache, normalize_city_name
+
+
+def test_fresh_entry_is_returned_until_ttl():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('moscow', 1)
+    assert cache.get('moscow') == 1
+    assert cache.ttl_remaining('moscow') > 59
+    assert cache.stats()['hits'] == 1
+
+
+def test_expired_entry_is_a_miss_but_stays_stale():
+    cache = TTLCache(maxsize=10, ttl=60, stale_ttl=60)
+    cache.set('moscow', 1, ttl=-1)
+    assert cache.get('moscow') is None
+    assert cache.get_stale('moscow') == 1
+    # Ограничение возраста устаревшей записи
+    assert cache.get_stale('moscow', max_age=0.5) is None
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_entry_past_stale_ttl_is_dropped():
+    cache = TTLCache(maxsize=10, ttl=60, stale_ttl=0.5)
+    cache.set('moscow', 1, ttl=-1)
+    assert cache.get('moscow') is None
+    assert cache.get_stale('moscow') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_persistent_store_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = TTLCache(maxsize=10, ttl=60, store=SQLiteStore(path))
+    cache.set(('moscow', 'ru-RU'), {'key': '294021'})
+    cache.close()
+
+    cache = TTLCache(maxsize=10, ttl=60, store=SQLiteStore(path))
+    assert cache.get(('moscow', 'ru-RU')) == {'key': '294021'}
+    cache.close()
+
+
+def test_normalize_city_name():
+    assert normalize_city_name('  Орёл   ') == normalize_city_name('орел')
+    assert normalize_city_name('Нижний  Новгород') == 'нижний новгород'
+
+
+async def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 'forecast'
+
+    results = await asyncio.gather(*[flight.do('moscow', fetch) for _ in range(5)])
+    assert results == ['forecast'] * 5
+    assert calls == 1
+    assert flight.stats() == {'calls': 1, 'coalesced': 4, 'inflight': 0}
+
+    # После завершения ключ освобождается, следующий вызов идёт заново
+    await flight.do('moscow', fetch)
+    assert calls == 2
+
+
+async def test_single_flight_propagates_errors_to_every_waiter():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError('upstream failed')
+
+    results = await asyncio.gather(*[flight.do('moscow', fetch) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()['inflight'] == 0
+
+
+async def test_single_flight_survives_cancelled_waiter():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'forecast'
+
+    first = asyncio.ensure_future(flight.do('moscow', fetch))
+    second = asyncio.ensure_future(flight.do('moscow', fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    # Отмена одного ожидающего не отменяет общий запрос
+    assert await second == 'forecast'
+    with pytest.raises(asyncio.CancelledError):
+        await first
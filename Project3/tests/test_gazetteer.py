@@ -0,0 +1,95 @@
+# tests/test_gazetteer.py
+
+import logging
+
+import pytest
+
+from Project3.weather_bot.weather import gazetteer as gazetteer_module
+from Project3.weather_bot.weather.gazetteer import Gazetteer, build_index, haversine_km, main, read_cities_csv
+
+CITIES = [
+    ('Москва', 55.7558, 37.6173, 12600000),
+    ('Химки', 55.8970, 37.4297, 250000),
+    ('Липецк', 52.6031, 39.5708, 500000),
+    ('Буэнос-Айрес', -34.6037, -58.3816, 3000000),
+    ('Анадырь', 64.7337, 177.4968, 15000),
+    ('Уэлен', 66.1600, -169.8100, 700),
+]
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = str(tmp_path / 'cities.gaz')
+    assert build_index(CITIES, path, cell=0.5) == len(CITIES)
+    index = Gazetteer(path)
+    yield index
+    index.close()
+
+
+def test_round_trip_returns_every_city_at_its_own_coordinates(gazetteer):
+    assert len(gazetteer) == len(CITIES)
+    for name, lat, lon, population in CITIES:
+        match = gazetteer.nearest(lat, lon)
+        assert match['city'] == name
+        assert match['population'] == population
+        assert match['distance_km'] < 0.01
+
+
+def test_nearest_picks_the_closest_city(gazetteer):
+    # Между Москвой и Химками, ближе к Химкам
+    match = gazetteer.nearest(55.88, 37.45)
+    assert match['city'] == 'Химки'
+    assert match['distance_km'] == pytest.approx(haversine_km(55.88, 37.45, 55.8970, 37.4297), abs=0.05)
+
+
+def test_search_crosses_cell_borders(gazetteer):
+    # Точка в соседней ячейке сетки (Липецк — в ячейке 52.5..53.0)
+    assert gazetteer.nearest(52.49, 39.57)['city'] == 'Липецк'
+
+
+def test_nothing_within_max_distance(gazetteer):
+    assert gazetteer.nearest(45.0, 10.0) is None
+    assert gazetteer.nearest(56.5, 37.6173, max_distance_km=25) is None
+
+
+def test_cli_build_and_query(tmp_path, capsys):
+    csv_path = tmp_path / 'cities.csv'
+    csv_path.write_text(
+        'name,lat,lon,population\n'
+        'Москва,55.7558,37.6173,12600000\n'
+        'Деревня,55.7000,37.6000,50\n'
+        'Сломанная строка,не число,37.0,100\n',
+        encoding='utf-8'
+    )
+    index_path = tmp_path / 'cities.gaz'
+    assert len(read_cities_csv(str(csv_path))) == 2
+
+    assert main(['build', str(csv_path), str(index_path), '--min-population', '100']) == 0
+    assert main(['query', str(index_path), '55.70', '37.60']) == 0
+    assert "'city': 'Москва'" in capsys.readouterr().out
+
+
+def test_search_wraps_around_the_antimeridian(tmp_path):
+    path = str(tmp_path / 'chukotka.gaz')
+    build_index([('Восток', 65.0, 179.9, 1000), ('Запад', 65.0, -179.0, 1000)], path, cell=0.5)
+    index = Gazetteer(path)
+    try:
+        # До «Востока» по ту сторону 180° около 7 км, до «Запада» — около 40 км
+        match = index.nearest(65.0, -179.95)
+        assert match['city'] == 'Восток'
+        assert match['distance_km'] == pytest.approx(haversine_km(65.0, -179.95, 65.0, 179.9), abs=0.05)
+        assert match['distance_km'] < 10
+    finally:
+        index.close()
+
+
+def test_broken_index_is_reported_once(tmp_path, monkeypatch, caplog):
+    broken = tmp_path / 'broken.gaz'
+    broken.write_bytes(b'not an index')
+    monkeypatch.setattr(gazetteer_module, 'GAZETTEER_PATH', str(broken))
+    monkeypatch.setattr(gazetteer_module, '_gazetteer', None)
+
+    with caplog.at_level(logging.ERROR, logger=gazetteer_module.__name__):
+        assert gazetteer_module.get_gazetteer() is None
+        assert gazetteer_module.get_gazetteer() is None
+    assert len(caplog.records) == 1
@@ -0,0 +1,162 @@
+# tests/test_providers.py
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from Project3.weather_bot.weather.providers import (
+    AccuWeatherProvider,
+    CircuitBreaker,
+    OpenMeteoProvider,
+    ProvidersFailed,
+    ProviderUnavailable,
+    QuotaExhausted,
+    WeatherBackend,
+)
+from Project3.weather_bot.weather import async_api
+from Project3.weather_bot.weather.cache import geocode_cache
+from Project3.weather_bot.weather.quota import QuotaManager
+
+MOSCOW = (55.75, 37.62)
+
+
+@pytest.fixture
+def backend(weather_api, http_client):
+    # Отдельная квота: тесты не должны расходовать общий бюджет AccuWeather
+    quota = QuotaManager(daily_budget=100, minute_budget=0, reserve=0, name='test')
+    accuweather = AccuWeatherProvider(http_client, api_key='test-key', quota=quota)
+    open_meteo = OpenMeteoProvider(http_client, **weather_api.open_meteo_urls)
+    return WeatherBackend([accuweather, open_meteo], hedge=True)
+
+
+async def test_primary_answers_when_healthy(backend, weather_api):
+    provider, forecast = await backend.call('forecast', '294021', 3, coords=MOSCOW)
+    assert provider.name == 'accuweather'
+    assert [day.max_temp for day in forecast] == [1.0, 2.0, 3.0]
+    assert weather_api.open_meteo_calls() == []
+
+
+async def test_slow_primary_is_hedged(backend, weather_api):
+    accuweather = backend.primary
+    # p95 основного провайдера — 10 мс, значит дубль уйдёт через HEDGE_MIN_DELAY
+    for _ in range(20):
+        accuweather.latency.add(0.01)
+    weather_api.accuweather_delay = 2.0
+
+    started = asyncio.get_running_loop().time()
+    provider, forecast = await backend.call('forecast', '294021', 3, coords=MOSCOW)
+    assert provider.name == 'open-meteo'
+    assert len(forecast) == 3
+    assert backend.hedged == 1
+    assert asyncio.get_running_loop().time() - started < 1.0
+    # Отменённый медленный запрос не считается ошибкой основного провайдера
+    assert accuweather.breaker.state == 'closed'
+
+
+async def test_failing_primary_opens_breaker_and_recovers(backend, weather_api):
+    accuweather = backend.primary
+    accuweather.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    weather_api.accuweather_status = 500
+
+    for _ in range(2):
+        provider, _ = await backend.call('forecast', '294021', 3, coords=MOSCOW)
+        assert provider.name == 'open-meteo'
+    assert accuweather.breaker.state == 'open'
+    assert backend.failovers == 2
+
+    # Пока breaker разомкнут, AccuWeather не вызывается вовсе
+    calls = len(weather_api.accuweather_calls())
+    provider, _ = await backend.call('forecast', '294021', 3, coords=MOSCOW)
+    assert provider.name == 'open-meteo'
+    assert len(weather_api.accuweather_calls()) == calls
+
+    # После паузы пробный запрос проходит и замыкает breaker
+    weather_api.accuweather_status = 200
+    await asyncio.sleep(0.25)
+    assert accuweather.breaker.state == 'half-open'
+    provider, _ = await backend.call('forecast', '294021', 3, coords=MOSCOW)
+    assert provider.name == 'accuweather'
+    assert accuweather.breaker.state == 'closed'
+
+
+async def test_all_providers_failing_raises(backend, weather_api):
+    weather_api.accuweather_status = 500
+    weather_api.open_meteo_status = 500
+    with pytest.raises(ProvidersFailed):
+        await backend.call('forecast', '294021', 3, coords=MOSCOW)
+
+
+async def test_open_meteo_parsing(weather_api, http_client):
+    provider = OpenMeteoProvider(http_client, **weather_api.open_meteo_urls)
+
+    location = await provider.search_location('Киев', 'ru-RU')
+    assert location == {'key': 'om:50.4500,30.5200', 'lat': 50.45, 'lon': 30.52, 'city': 'Киев'}
+    assert await provider.search_location('Нигде', 'ru-RU') is None
+
+    # Ключ Open-Meteo сам содержит координаты
+    daily = await provider.forecast(location['key'], 3)
+    assert [day.date for day in daily] == [date(2024, 12, 20), date(2024, 12, 21), date(2024, 12, 22)]
+    assert [day.max_temp for day in daily] == [2.0, 3.0, 4.0]
+    assert daily[0].min_temp == -3.0
+    assert daily[0].wind_speed == 15.0
+    assert daily[0].precip_prob == 30
+    assert daily[0].weather_text_day == 'Пасмурно'
+
+    current = await provider.forecast(location['key'], 1)
+    assert len(current) == 1
+    assert current[0].min_temp == current[0].max_temp == 1.5
+    assert current[0].wind_speed == 9.0
+
+
+async def test_accuweather_key_needs_coords_for_open_meteo(weather_api, http_client):
+    provider = OpenMeteoProvider(http_client, **weather_api.open_meteo_urls)
+    with pytest.raises(ProviderUnavailable, match='нет координат'):
+        await provider.forecast('294021', 3)
+
+
+async def test_forecast_follows_the_requested_language(backend, weather_api, http_client):
+    await backend.call('forecast', '294021', 3, coords=MOSCOW, language='en-US')
+    assert weather_api.queries[-1]['language'] == 'en-US'
+
+    provider = OpenMeteoProvider(http_client, **weather_api.open_meteo_urls)
+    daily = await provider.forecast('om:50.4500,30.5200', 3, language='en-US')
+    assert daily[0].weather_text_day == 'Overcast'
+    # Рекомендация к текущим условиям — на том же языке
+    current = await provider.forecast('om:50.4500,30.5200', 1, language='en-US')
+    assert current[0].weather_text_day == 'Cold and dry. Warm clothes are needed.'
+
+
+def exhausted_accuweather(http_client):
+    quota = QuotaManager(daily_budget=1, minute_budget=0, reserve=0, name='test')
+    quota.mark_exhausted()
+    return AccuWeatherProvider(http_client, api_key='test-key', quota=quota)
+
+
+async def test_quota_is_reported_only_when_every_provider_hit_it(weather_api, http_client):
+    accuweather = exhausted_accuweather(http_client)
+    with pytest.raises(QuotaExhausted):
+        await WeatherBackend([accuweather]).call('search_location', 'Тверь', 'ru-RU')
+
+    # Резервный провайдер ответил «не найдено» — это обычный ответ, а не исчерпанная квота
+    open_meteo = OpenMeteoProvider(http_client, **weather_api.open_meteo_urls)
+    backend = WeatherBackend([accuweather, open_meteo])
+    provider, location = await backend.call('search_location', 'Нигде', 'ru-RU')
+    assert provider is open_meteo and location is None
+
+    # Резервный провайдер сломан — это сбой, а не квота
+    weather_api.open_meteo_status = 500
+    with pytest.raises(ProvidersFailed) as error:
+        await backend.call('search_location', 'Тверь', 'ru-RU')
+    assert not isinstance(error.value, QuotaExhausted)
+    assert weather_api.accuweather_calls() == []
+
+
+async def test_find_location_explains_why_nothing_was_found(weather_api, http_client, monkeypatch):
+    open_meteo = OpenMeteoProvider(http_client, **weather_api.open_meteo_urls)
+    monkeypatch.setattr(async_api, 'weather_backend', WeatherBackend([exhausted_accuweather(http_client), open_meteo]))
+    geocode_cache.clear()
+    assert await async_api.find_location('Нигде') == (None, async_api.LOOKUP_NOT_FOUND)
+
+    monkeypatch.setattr(async_api, 'weather_backend', WeatherBackend([exhausted_accuweather(http_client)]))
+    assert await async_api.find_location('Нигде') == (None, async_api.LOOKUP_QUOTA)
@@ -0,0 +1,48 @@
+# tests/test_ratelimit.py
+
+import asyncio
+import time
+
+from Project3.weather_bot.weather.ratelimit import TokenBucket
+
+
+def test_try_acquire_spends_burst_then_refuses():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.delay() <= 0.1
+
+
+def test_refill_is_capped_by_capacity():
+    bucket = TokenBucket(rate=100, capacity=2)
+    assert bucket.try_acquire(2)
+    time.sleep(0.05)
+    # За 50 мс набралось бы 5 токенов, но в ведро помещается только 2
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire()
+
+
+async def test_acquire_waits_for_refill():
+    bucket = TokenBucket(rate=20, capacity=1)
+    await bucket.acquire()
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+async def test_waiters_are_served_in_arrival_order():
+    bucket = TokenBucket(rate=50, capacity=2)
+    order = []
+
+    async def waiter(idx, tokens):
+        await bucket.acquire(tokens)
+        order.append(idx)
+
+    # Крупный запрос в начале очереди не обгоняют мелкие, пришедшие после него
+    tasks = []
+    for idx, tokens in enumerate((2, 1, 2, 1, 1)):
+        tasks.append(asyncio.ensure_future(waiter(idx, tokens)))
+        await asyncio.sleep(0)
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=2)
+    assert order == [0, 1, 2, 3, 4]
@@ -0,0 +1,62 @@
+# tests/test_refresher.py
+
+from Project3.weather_bot.weather.cache import PopularityTracker, TTLCache
+from Project3.weather_bot.weather.quota import QuotaManager
+from Project3.weather_bot.weather.refresher import ForecastRefresher
+
+
+class FakeQuota:
+    def __init__(self, near_limit=False):
+        self._near_limit = near_limit
+
+    def near_limit(self):
+        return self._near_limit
+
+
+def make_refresher(popularity, quota=None, daily_budget=10, **kwargs):
+    calls = []
+
+    async def refresh(location_key, days, coords=None):
+        calls.append((location_key, days, coords))
+
+    budget = QuotaManager(daily_budget=daily_budget, minute_budget=0, reserve=0, name='refresh')
+    refresher = ForecastRefresher(TTLCache(maxsize=10, ttl=60), popularity, refresh, quota or FakeQuota(),
+                                  budget=budget, interval=0, **kwargs)
+    return refresher, calls
+
+
+def popular(*keys, hits=3):
+    popularity = PopularityTracker()
+    for key, coords in keys:
+        for _ in range(hits):
+            popularity.record(key, coords)
+    return popularity
+
+
+async def test_popular_keys_are_refreshed_with_their_coords():
+    refresher, calls = make_refresher(popular((('294021', 5), (55.75, 37.62))))
+    assert await refresher.refresh_once() == 1
+    assert calls == [('294021', 5, (55.75, 37.62))]
+
+
+async def test_keys_below_min_score_are_skipped():
+    refresher, calls = make_refresher(popular((('294021', 5), None), hits=1), min_score=2)
+    assert await refresher.refresh_once() == 0
+    assert calls == []
+
+
+async def test_daily_budget_caps_refreshes_across_cycles():
+    keys = [((str(key), 5), None) for key in range(4)]
+    refresher, calls = make_refresher(popular(*keys, hits=10), daily_budget=3, max_per_cycle=2)
+    assert await refresher.refresh_once() == 2
+    assert await refresher.refresh_once() == 1
+    assert await refresher.refresh_once() == 0
+    assert refresher.stats()['budget']['daily_remaining'] == 0
+
+
+async def test_near_limit_refreshes_only_keys_with_coords():
+    # Без координат резервный провайдер не сможет заменить AccuWeather
+    popularity = popular((('294021', 5), (55.75, 37.62)), (('295212', 5), None))
+    refresher, calls = make_refresher(popularity, quota=FakeQuota(near_limit=True))
+    assert await refresher.refresh_once() == 1
+    assert calls == [('294021', 5, (55.75, 37.62))]
@@ -0,0 +1,126 @@
+# tests/test_sender.py
+
+import asyncio
+
+import pytest
+from aiogram.utils.exceptions import RetryAfter
+
+from Project3.weather_bot.bot.sender import PRIORITY_EDIT, PRIORITY_MEDIA, PRIORITY_TEXT, ScheduledBot, SendScheduler
+
+
+@pytest.fixture
+async def scheduler(loop):
+    scheduler = SendScheduler(global_rate=1000, chat_rate=1000, chat_burst=1000, workers=2, max_retries=2)
+    yield scheduler
+    await scheduler.close()
+
+
+def recorder(log, name, result=None):
+    async def call():
+        log.append(name)
+        return result if result is not None else name
+    return call
+
+
+async def test_requests_to_one_chat_keep_their_order(scheduler):
+    log = []
+    results = await asyncio.gather(*[scheduler.submit(1, recorder(log, idx)) for idx in range(10)])
+    assert results == list(range(10))
+    assert log == list(range(10))
+    assert scheduler.stats()['sent'] == 10
+
+
+async def test_text_overtakes_queued_media(scheduler):
+    log = []
+    # Пока первый запрос чата ждёт отправки, в очередь встают фото и текст
+    first = asyncio.ensure_future(scheduler.submit(1, recorder(log, 'first')))
+    await asyncio.sleep(0)
+    photo = asyncio.ensure_future(scheduler.submit(1, recorder(log, 'photo'), priority=PRIORITY_MEDIA))
+    text = asyncio.ensure_future(scheduler.submit(1, recorder(log, 'text'), priority=PRIORITY_TEXT))
+    await asyncio.gather(first, photo, text)
+    assert log == ['first', 'text', 'photo']
+
+
+async def test_queued_edits_are_coalesced_behind_results(scheduler):
+    log = []
+    first = asyncio.ensure_future(scheduler.submit(1, recorder(log, 'first')))
+    await asyncio.sleep(0)
+    # Три правки прогресса подряд и результат: уходят результат и только последняя правка
+    edits = [
+        asyncio.ensure_future(scheduler.submit(1, recorder(log, f'edit {idx}'), priority=PRIORITY_EDIT,
+                                               coalesce_key=('editMessageText', 42)))
+        for idx in range(3)
+    ]
+    await asyncio.sleep(0)
+    photo = asyncio.ensure_future(scheduler.submit(1, recorder(log, 'photo'), priority=PRIORITY_MEDIA))
+    results = await asyncio.gather(first, *edits, photo)
+    assert log == ['first', 'photo', 'edit 2']
+    assert results == ['first', None, None, 'edit 2', 'photo']
+    assert scheduler.stats()['coalesced'] == 2
+
+
+async def test_scheduled_bot_sends_edits_last_and_coalesced(loop):
+    class CapturingScheduler:
+        async def submit(self, chat_id, func, **kwargs):
+            self.kwargs = kwargs
+            return True
+
+    scheduler = CapturingScheduler()
+    bot = ScheduledBot(token='123456:TEST', scheduler=scheduler)
+    try:
+        await bot.request('editMessageText', {'chat_id': 1, 'message_id': 42, 'text': '2/5'})
+        assert scheduler.kwargs['priority'] == PRIORITY_EDIT
+        assert scheduler.kwargs['coalesce_key'] == ('editMessageText', 42, None)
+        await bot.request('sendMessage', {'chat_id': 1, 'text': 'forecast'})
+        assert scheduler.kwargs == {'priority': PRIORITY_TEXT, 'tokens': 1, 'coalesce_key': None}
+    finally:
+        await bot.close()
+
+
+async def test_retry_after_pauses_and_repeats_the_request(scheduler):
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RetryAfter(0)
+        return 'sent'
+
+    assert await scheduler.submit(1, flaky) == 'sent'
+    assert attempts == 2
+    assert scheduler.stats()['retries'] == 1
+
+
+async def test_retry_after_gives_up_after_max_retries(scheduler):
+    async def always_flooded():
+        raise RetryAfter(0)
+
+    with pytest.raises(RetryAfter):
+        await scheduler.submit(1, always_flooded)
+    assert scheduler.stats()['failed'] == 1
+
+
+async def test_other_errors_are_not_retried(scheduler):
+    calls = 0
+
+    async def broken():
+        nonlocal calls
+        calls += 1
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        await scheduler.submit(1, broken)
+    assert calls == 1
+
+
+async def test_chat_bucket_limits_rate_per_chat():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=20, chat_burst=1, group_rate=20, workers=2)
+    try:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*[scheduler.submit(1, recorder([], idx)) for idx in range(3)])
+        # Первый запрос — из запаса, ещё два ждут по 1/20 сек.
+        assert loop.time() - started >= 0.09
+    finally:
+        await scheduler.close()
@@ -0,0 +1,193 @@
+# tests/test_storage.py
+
+import asyncio
+import os
+
+import pytest
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from Project3.weather_bot.bot.storage import (
+    FSM_REDIS_HOST,
+    FSM_REDIS_PORT,
+    BatchingStorage,
+    FSMBatchMiddleware,
+    SQLiteStorage,
+    create_storage,
+)
+
+CHAT = USER = 42
+
+
+async def run_update(storage, handler):
+    """Обрабатывает «обновление» так же, как диспетчер: пакет открывается и записывается middleware."""
+    middleware = FSMBatchMiddleware(storage)
+    await middleware.on_pre_process_update(None, {})
+    await handler(storage)
+    await middleware.on_post_process_update(None, [], {})
+
+
+async def run_concurrently(first, second, chat=CHAT, user=USER):
+    """
+    Два обновления одного пользователя (например, в двух процессах бота): оба сначала читают
+    состояние, затем меняют его и записывают каждое своё.
+    """
+    read = 0
+    both_read = asyncio.Event()
+
+    def handler(change):
+        async def handle(storage):
+            nonlocal read
+            await storage.get_data(chat=chat, user=user)
+            read += 1
+            if read == 2:
+                both_read.set()
+            await both_read.wait()
+            await change(storage)
+        return handle
+
+    (first_storage, first_change), (second_storage, second_change) = first, second
+    await asyncio.gather(
+        run_update(first_storage, handler(first_change)),
+        run_update(second_storage, handler(second_change))
+    )
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return str(tmp_path / 'fsm.sqlite3')
+
+
+@pytest.fixture
+async def sqlite_storages(loop, sqlite_path):
+    # Два соединения с одним файлом — как два процесса бота
+    storages = [BatchingStorage(SQLiteStorage(sqlite_path)), BatchingStorage(SQLiteStorage(sqlite_path))]
+    yield storages
+    for storage in storages:
+        await storage.close()
+
+
+async def test_concurrent_batches_keep_each_others_keys(sqlite_storages):
+    first, second = sqlite_storages
+    await run_concurrently(
+        (first, lambda storage: storage.update_data(chat=CHAT, user=USER, a=1)),
+        (second, lambda storage: storage.update_data(chat=CHAT, user=USER, b=1))
+    )
+    assert await first.get_data(chat=CHAT, user=USER) == {'a': 1, 'b': 1}
+
+
+async def test_state_change_does_not_overwrite_concurrent_data(sqlite_storages):
+    first, second = sqlite_storages
+    await first.set_data(chat=CHAT, user=USER, data={'start': 'Москва'})
+    await run_concurrently(
+        (first, lambda storage: storage.set_state(chat=CHAT, user=USER, state='WeatherForm:end')),
+        (second, lambda storage: storage.update_data(chat=CHAT, user=USER, end='Тула'))
+    )
+    assert await first.storage.get_record(chat=CHAT, user=USER) == (
+        'WeatherForm:end', {'start': 'Москва', 'end': 'Тула'}
+    )
+
+
+async def test_batch_reads_once_and_writes_once(sqlite_storages):
+    storage, _ = sqlite_storages
+    reads = writes = 0
+    inner = storage.storage
+    get_record, apply = inner.get_record, inner.apply
+
+    async def counting_get_record(**kwargs):
+        nonlocal reads
+        reads += 1
+        return await get_record(**kwargs)
+
+    async def counting_apply(**kwargs):
+        nonlocal writes
+        writes += 1
+        return await apply(**kwargs)
+
+    inner.get_record, inner.apply = counting_get_record, counting_apply
+
+    async def handler(storage):
+        await storage.set_state(chat=CHAT, user=USER, state='WeatherForm:stops')
+        data = await storage.get_data(chat=CHAT, user=USER)
+        data.setdefault('stops', []).append('Тула')
+        # Изменение копии без update_data не попадает в хранилище
+        await storage.update_data(chat=CHAT, user=USER, stops=data['stops'], route_version=1)
+        assert await storage.get_state(chat=CHAT, user=USER) == 'WeatherForm:stops'
+
+    await run_update(storage, handler)
+    assert (reads, writes) == (1, 1)
+    assert await storage.get_data(chat=CHAT, user=USER) == {'stops': ['Тула'], 'route_version': 1}
+
+
+async def test_finish_deletes_the_record(sqlite_storages):
+    storage, _ = sqlite_storages
+    await storage.set_state(chat=CHAT, user=USER, state='WeatherForm:days')
+    await storage.update_data(chat=CHAT, user=USER, start='Москва')
+
+    async def handler(storage):
+        await storage.update_data(chat=CHAT, user=USER, end='Тула')
+        await storage.reset_state(chat=CHAT, user=USER, with_data=True)
+
+    await run_update(storage, handler)
+    assert await storage.storage.get_record(chat=CHAT, user=USER) == (None, {})
+
+
+async def test_set_data_replaces_the_whole_record(sqlite_storages):
+    storage, _ = sqlite_storages
+    await storage.update_data(chat=CHAT, user=USER, start='Москва', stops=['Тула'])
+
+    async def handler(storage):
+        await storage.set_data(chat=CHAT, user=USER, data={'start': 'Орёл'})
+        await storage.update_data(chat=CHAT, user=USER, route_version=1)
+
+    await run_update(storage, handler)
+    assert await storage.get_data(chat=CHAT, user=USER) == {'start': 'Орёл', 'route_version': 1}
+
+
+async def test_expired_record_reads_as_empty(loop, sqlite_path):
+    storage = SQLiteStorage(sqlite_path, ttl=0.05)
+    await storage.update_data(chat=CHAT, user=USER, start='Москва')
+    assert await storage.get_data(chat=CHAT, user=USER) == {'start': 'Москва'}
+    await asyncio.sleep(0.1)
+    assert await storage.get_record(chat=CHAT, user=USER) == (None, {})
+    await storage.close()
+
+
+async def test_memory_storage_gets_key_level_writes(loop):
+    # Хранилища без apply получают update_data с изменёнными ключами, а не всю запись
+    memory = MemoryStorage()
+    first, second = BatchingStorage(memory), BatchingStorage(memory)
+    await run_concurrently(
+        (first, lambda storage: storage.update_data(chat=CHAT, user=USER, a=1)),
+        (second, lambda storage: storage.update_data(chat=CHAT, user=USER, b=1))
+    )
+    assert await memory.get_data(chat=CHAT, user=USER) == {'a': 1, 'b': 1}
+
+
+def test_unknown_storage_kind():
+    with pytest.raises(ValueError):
+        create_storage('mongo')
+
+
+async def test_redis_storage_keeps_concurrent_keys(loop):
+    # Нужен пакет redis и доступный сервер FSM_REDIS_HOST:FSM_REDIS_PORT
+    pytest.importorskip('redis')
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(FSM_REDIS_HOST, FSM_REDIS_PORT), 0.5)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        pytest.skip(f"Нет сервера Redis на {FSM_REDIS_HOST}:{FSM_REDIS_PORT}")
+
+    redis = create_storage('redis')
+    chat = user = f"test-{os.getpid()}"
+    try:
+        first, second = BatchingStorage(redis), BatchingStorage(redis)
+        await run_concurrently(
+            (first, lambda storage: storage.update_data(chat=chat, user=user, a=1)),
+            (second, lambda storage: storage.update_data(chat=chat, user=user, b=1)),
+            chat=chat, user=user
+        )
+        assert await redis.get_data(chat=chat, user=user) == {'a': 1, 'b': 1}
+    finally:
+        await redis.reset_state(chat=chat, user=user, with_data=True)
+        await redis.close()
+        await redis.wait_closed()
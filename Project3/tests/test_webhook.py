@@ -0,0 +1,99 @@
+# tests/test_webhook.py
+
+import pytest
+from aiogram import Bot, types
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.dispatcher import Dispatcher
+from aiohttp import web
+
+from Project3.weather_bot.bot.webhook import METRICS_PATH, SECRET_HEADER, WEBHOOK_PATH, WebhookServer
+
+TOKEN = '123456:TEST'
+SECRET = 'webhook-secret'
+
+
+@pytest.fixture
+async def telegram(aiohttp_server):
+    """Заглушка Bot API: запоминает вызванные методы и отвечает как Telegram."""
+    calls = []
+
+    async def method(request):
+        data = dict(await request.post())
+        calls.append((request.match_info['method'], data))
+        message = {'message_id': len(calls), 'date': 0, 'chat': {'id': int(data['chat_id']), 'type': 'private'},
+                   'text': data.get('text')}
+        return web.json_response({'ok': True, 'result': message})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', method)
+    server = await aiohttp_server(app)
+    server.calls = calls
+    return server
+
+
+@pytest.fixture
+async def dispatcher(telegram):
+    bot = Bot(token=TOKEN, server=TelegramAPIServer.from_base(str(telegram.make_url(''))))
+    dp = Dispatcher(bot)
+
+    async def echo(message: types.Message):
+        await message.answer(f"pong: {message.text}")
+
+    dp.register_message_handler(echo)
+    yield dp
+    session = await bot.get_session()
+    await session.close()
+
+
+def update(update_id, text='ping'):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Test'},
+            'text': text
+        }
+    }
+
+
+async def test_updates_with_secret_reach_the_handler(aiohttp_client, dispatcher, telegram):
+    server = WebhookServer(dispatcher, secret=SECRET, queue_size=10, workers=2,
+                           metrics=lambda: {'quota': {'daily_remaining': 50}})
+    client = await aiohttp_client(server.make_app())
+    await server.start_workers()
+    try:
+        response = await client.post(WEBHOOK_PATH, json=update(1), headers={SECRET_HEADER: SECRET})
+        assert response.status == 200
+        assert (await client.post(WEBHOOK_PATH, json=update(2))).status == 401
+        assert (await client.post(WEBHOOK_PATH, json=update(3), headers={SECRET_HEADER: 'wrong'})).status == 401
+        assert (await client.post(WEBHOOK_PATH, data='not json', headers={SECRET_HEADER: SECRET})).status == 400
+        await server.queue.join()
+    finally:
+        await server.stop_workers()
+
+    # Ответ отправлен через Bot API только на обновление с верным секретом
+    assert [(name, data['chat_id'], data['text']) for name, data in telegram.calls] == [
+        ('sendMessage', '42', 'pong: ping')
+    ]
+
+    metrics = await (await client.get(METRICS_PATH)).json()
+    assert metrics['webhook'] == {'received': 1, 'rejected': 0, 'unauthorized': 2, 'invalid': 1,
+                                  'processed': 1, 'failed': 0, 'queued': 0}
+    assert metrics['quota'] == {'daily_remaining': 50}
+
+
+async def test_full_queue_rejects_updates(aiohttp_client, dispatcher, telegram):
+    # Без обработчиков очередь не разбирается: третье обновление уже не помещается
+    server = WebhookServer(dispatcher, secret=None, queue_size=2, workers=0)
+    client = await aiohttp_client(server.make_app())
+    await server.start_workers()
+    statuses = [(await client.post(WEBHOOK_PATH, json=update(update_id))).status for update_id in range(3)]
+    assert statuses == [200, 200, 503]
+
+    metrics = await (await client.get(METRICS_PATH)).json()
+    assert metrics['webhook']['received'] == 2
+    assert metrics['webhook']['rejected'] == 1
+    assert metrics['webhook']['queued'] == 2
+    assert telegram.calls == []
@@ -4,17 +4,47 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.types import ParseMode, ReplyKeyboardRemove
-from Project3.weather_bot.weather.api import get_location_data, get_weather_forecast
+from aiogram.utils.exceptions import MessageNotModified
+from Project3.weather_bot.weather.async_api import LOOKUP_QUOTA, find_location
+from Project3.weather_bot.weather.geocoding import resolve_coords
+from Project3.weather_bot.weather.models import ResolvedLocation
+from Project3.weather_bot.weather.route import iter_route_forecasts
 from Project3.weather_bot.bot.keyboards import days_keyboard, confirmation_keyboard, location_keyboard
-from Project3.weather_bot.charts.chart_generator import generate_weather_chart
-from Project3.weather_bot.bot.utils import escape_markdown_v2, generate_route_map_link
+from Project3.weather_bot.charts.chart_cache import (
+    chart_cache_key,
+    chart_file_ids,
+    remember_chart_file_id,
+    route_chart_cache_key,
+)
+from Project3.weather_bot.charts.chart_generator import (
+    generate_route_chart,
+    generate_weather_chart,
+    generate_weather_charts,
+)
+from Project3.weather_bot.bot.messages import chart_labels, messages, route_chart_labels
+from Project3.weather_bot.bot.utils import generate_route_map_link
+import asyncio
+import io
 import logging
 import os
+import time
 from aiogram.dispatcher import Dispatcher
-import requests
 
 logger = logging.getLogger(__name__)
 
+# Версия схемы маршрута в состоянии FSM: при её изменении старые незавершённые диалоги отбрасываются
+ROUTE_STATE_VERSION = 1
+# Доставка результатов маршрута: stream — по мере готовности, album — альбомами фото с подписями,
+# route_chart — тексты по мере готовности и один общий график на весь маршрут
+ROUTE_DELIVERY = os.getenv('ROUTE_DELIVERY', 'stream')
+ROUTE_DELIVERY_MODES = ('stream', 'album', 'route_chart')
+# Ограничения Telegram: фото в альбоме и длина подписи
+MEDIA_GROUP_SIZE = 10
+CAPTION_LIMIT = 1024
+
+if ROUTE_DELIVERY not in ROUTE_DELIVERY_MODES:
+    raise ValueError(f"Неизвестный ROUTE_DELIVERY: {ROUTE_DELIVERY}. Допустимые значения: {', '.join(ROUTE_DELIVERY_MODES)}.")
+
 
 class WeatherForm(StatesGroup):
     start = State()  # Ввод начальной точки
@@ -23,122 +53,113 @@ class WeatherForm(StatesGroup):
     confirm_add_more_stops = State()  # Подтверждение добавления дополнительных точек
     days = State()   # Выбор количества дней
 
+def user_language(user):
+    # Язык пользователя Telegram (en, ru, ...) приводится к языку каталога; он же передаётся в API погоды
+    return messages.resolve_language(user.language_code if user else None)
+
 async def weather_start(message: types.Message):
 
+    language = user_language(message.from_user)
     await WeatherForm.start.set()
-    prompt_message = "Введите начальную точку маршрута (например, Москва):"
-    escaped_message = escape_markdown_v2(prompt_message)
     logger.info(f"Отправляем сообщение /weather пользователю {message.from_user.id}")
     await message.reply(
-        escaped_message,
+        messages.text('weather_prompt', language),
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=location_keyboard()
+        reply_markup=location_keyboard(language)
     )
 
 async def weather_start_location(message: types.Message, state: FSMContext):
 
+    language = user_language(message.from_user)
     if message.location:
         # Если пользователь отправил геолокацию
         latitude = message.location.latitude
         longitude = message.location.longitude
-        location = get_location_from_coords(latitude, longitude)
+        location = await resolve_coords(latitude, longitude, language)
         if location:
-            await state.update_data(start=location['city'], start_coords=(latitude, longitude))
+            await state.set_data({'start': location, 'route_version': ROUTE_STATE_VERSION})
             await WeatherForm.end.set()
-            reply_text = f"Начальная точка установлена: {escape_markdown_v2(location['city'])}\nВведите конечную точку маршрута:"
-            escaped_reply_text = escape_markdown_v2(reply_text)
+            reply_text = messages.text('start_set', language, city=location['city'])
             logger.info(f"Начальная точка установлена: {location['city']} для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_reply_text,
+                reply_text,
                 parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=location_keyboard()
+                reply_markup=location_keyboard(language)
             )
         else:
-            error_message = "Не удалось определить местоположение. Пожалуйста, введите название города:"
-            escaped_error = escape_markdown_v2(error_message)
+            error_message = messages.text('location_failed', language)
             logger.warning(f"Не удалось определить начальную точку по геолокации для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_error,
+                error_message,
                 parse_mode=ParseMode.MARKDOWN_V2
             )
             await WeatherForm.start.set()
     else:
         city = message.text.strip()
-        loc_data = get_location_data(city)
+        loc_data, reason = await find_location(city, language=language)
         if loc_data:
-            await state.update_data(start=loc_data['city'], start_coords=(loc_data['lat'], loc_data['lon']))
+            await state.set_data({'start': resolved_stop(loc_data), 'route_version': ROUTE_STATE_VERSION})
             await WeatherForm.end.set()
-            reply_text = f"Начальная точка установлена: {escape_markdown_v2(loc_data['city'])}\nВведите конечную точку маршрута:"
-            escaped_reply_text = escape_markdown_v2(reply_text)
+            reply_text = messages.text('start_set', language, city=loc_data['city'])
             logger.info(f"Начальная точка установлена: {loc_data['city']} для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_reply_text,
+                reply_text,
                 parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=location_keyboard()
+                reply_markup=location_keyboard(language)
             )
         else:
-            error_message = "Не удалось найти город. Пожалуйста, попробуйте снова:"
-            escaped_error = escape_markdown_v2(error_message)
+            error_message = not_found_message('city_not_found', language, reason)
             logger.warning(f"Не удалось найти город '{city}' для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_error,
+                error_message,
                 parse_mode=ParseMode.MARKDOWN_V2
             )
             await WeatherForm.start.set()
 
 async def weather_end_location(message: types.Message, state: FSMContext):
 
+    language = user_language(message.from_user)
     if message.location:
         # Если пользователь отправил геолокацию
         latitude = message.location.latitude
         longitude = message.location.longitude
-        location = get_location_from_coords(latitude, longitude)
+        location = await resolve_coords(latitude, longitude, language)
         if location:
-            await state.update_data(end=location['city'], end_coords=(latitude, longitude))
+            await state.update_data(end=location)
             await WeatherForm.confirm_add_more_stops.set()
-            reply_text = (
-                f"Конечная точка установлена: {escape_markdown_v2(location['city'])}\n"
-                f"Хотите добавить промежуточные точки?"
-            )
-            escaped_reply_text = escape_markdown_v2(reply_text)
+            reply_text = messages.text('end_set', language, city=location['city'])
             logger.info(f"Конечная точка установлена: {location['city']} для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_reply_text,
+                reply_text,
                 parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=confirmation_keyboard()
+                reply_markup=confirmation_keyboard(language)
             )
         else:
-            error_message = "Не удалось определить местоположение. Пожалуйста, введите название города:"
-            escaped_error = escape_markdown_v2(error_message)
+            error_message = messages.text('location_failed', language)
             logger.warning(f"Не удалось определить конечную точку по геолокации для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_error,
+                error_message,
                 parse_mode=ParseMode.MARKDOWN_V2
             )
             await WeatherForm.end.set()
     else:
         city = message.text.strip()
-        loc_data = get_location_data(city)
+        loc_data, reason = await find_location(city, language=language)
         if loc_data:
-            await state.update_data(end=loc_data['city'], end_coords=(loc_data['lat'], loc_data['lon']))
+            await state.update_data(end=resolved_stop(loc_data))
             await WeatherForm.confirm_add_more_stops.set()
-            reply_text = (
-                f"Конечная точка установлена: {escape_markdown_v2(loc_data['city'])}\n"
-                f"Хотите добавить промежуточные точки?"
-            )
-            escaped_reply_text = escape_markdown_v2(reply_text)
+            reply_text = messages.text('end_set', language, city=loc_data['city'])
             logger.info(f"Конечная точка установлена: {loc_data['city']} для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_reply_text,
+                reply_text,
                 parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=confirmation_keyboard()
+                reply_markup=confirmation_keyboard(language)
             )
         else:
-            error_message = "Не удалось найти город. Пожалуйста, попробуйте снова:"
-            escaped_error = escape_markdown_v2(error_message)
+            error_message = not_found_message('city_not_found', language, reason)
             logger.warning(f"Не удалось найти город '{city}' для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_error,
+                error_message,
                 parse_mode=ParseMode.MARKDOWN_V2
             )
             await WeatherForm.end.set()
@@ -150,27 +171,26 @@ async def weather_confirm_add_more_stops(callback_query: types.CallbackQuery, st
     """
     data = callback_query.data
     user_id = callback_query.from_user.id
+    language = user_language(callback_query.from_user)
     if data == 'yes':
         # Остаёмся в состоянии 'stops' для ввода промежуточных точек
-        reply_text = "Введите промежуточные точки через запятую (например, Тула, Орёл):"
-        escaped_reply_text = escape_markdown_v2(reply_text)
+        reply_text = messages.text('stops_prompt', language)
         logger.info(f"Пользователь {user_id} выбрал добавить промежуточные точки.")
         await callback_query.message.reply(
-            escaped_reply_text,
+            reply_text,
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=location_keyboard()
+            reply_markup=location_keyboard(language)
         )
         await WeatherForm.stops.set()
     elif data == 'no':
         # Переходим к выбору дней
         await WeatherForm.next()
-        reply_text = "Промежуточные точки не добавлены.\nВыберите количество дней для прогноза:"
-        escaped_reply_text = escape_markdown_v2(reply_text)
+        reply_text = messages.text('stops_skipped', language)
         logger.info(f"Пользователь {user_id} отказался от добавления промежуточных точек.")
         await callback_query.message.reply(
-            escaped_reply_text,
+            reply_text,
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=days_keyboard()
+            reply_markup=days_keyboard(language)
         )
     else:
         logger.warning(f"Получены неожиданные данные callback_query: {data} от пользователя {user_id}")
@@ -178,19 +198,31 @@ async def weather_confirm_add_more_stops(callback_query: types.CallbackQuery, st
 
 async def weather_add_stops(message: types.Message, state: FSMContext):
 
-    stops_text = message.text.strip()
-    stops = [s.strip() for s in stops_text.split(',') if s.strip()]
+    language = user_language(message.from_user)
     validated_stops = []
+    if message.location:
+        location = await resolve_coords(message.location.latitude, message.location.longitude, language)
+        if not location:
+            error_message = messages.text('location_failed', language)
+            logger.warning(f"Не удалось определить промежуточную точку по геолокации для пользователя {message.from_user.id}")
+            await message.reply(
+                error_message,
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+            return WeatherForm.stops
+        validated_stops.append(location)
+        stops = []
+    else:
+        stops = [s.strip() for s in message.text.strip().split(',') if s.strip()]
     for city in stops:
-        loc_data = get_location_data(city)
+        loc_data, reason = await find_location(city, language=language)
         if loc_data:
-            validated_stops.append(loc_data['city'])
+            validated_stops.append(resolved_stop(loc_data))
         else:
-            error_message = f"Не удалось найти город: {escape_markdown_v2(city)}. Пожалуйста, попробуйте снова:"
-            escaped_error = escape_markdown_v2(error_message)
+            error_message = not_found_message('stop_not_found', language, reason, city=city)
             logger.warning(f"Не удалось найти город '{city}' при добавлении промежуточных точек для пользователя {message.from_user.id}")
             await message.reply(
-                escaped_error,
+                error_message,
                 parse_mode=ParseMode.MARKDOWN_V2
             )
             return WeatherForm.stops  # Остаёмся в состоянии 'stops'
@@ -200,196 +232,317 @@ async def weather_add_stops(message: types.Message, state: FSMContext):
     existing_stops = user_data.get('stops', [])
     existing_stops.extend(validated_stops)
     await state.update_data(stops=existing_stops)
-    logger.info(f"Пользователь {message.from_user.id} добавил промежуточные точки: {validated_stops}")
+    logger.info(f"Пользователь {message.from_user.id} добавил промежуточные точки: {[stop['city'] for stop in validated_stops]}")
 
     # Спрашиваем, хочет ли пользователь добавить ещё промежуточные точки
-    keyboard = confirmation_keyboard()  # Используем клавиатуру подтверждения
-    reply_text = "Промежуточные точки добавлены. Хотите добавить ещё?"
-    escaped_reply_text = escape_markdown_v2(reply_text)
+    keyboard = confirmation_keyboard(language)  # Используем клавиатуру подтверждения
+    reply_text = messages.text('stops_added', language)
     await message.reply(
-        escaped_reply_text,
+        reply_text,
         parse_mode=ParseMode.MARKDOWN_V2,
         reply_markup=keyboard
     )
     await WeatherForm.confirm_add_more_stops.set()  # Переходим в подтверждение добавления ещё
 
-async def weather_days_selection(callback_query: types.CallbackQuery, state: FSMContext):
+def not_found_message(key, language, reason, **params):
+    # Если все провайдеры пропустили запрос из-за квоты, город не «не найден», а просто не запрашивался
+    if reason == LOOKUP_QUOTA:
+        return messages.text('quota_exhausted', language)
+    return messages.text(key, language, **params)
 
-    days = int(callback_query.data)
-    await state.update_data(days=days)
-    prompt_message = f"Получаю прогноз погоды на {days} день(дней)..."
-    escaped_prompt = escape_markdown_v2(prompt_message)
-    user_id = callback_query.from_user.id
-    logger.info(f"Пользователь {user_id} выбрал {days} день(дней) для прогноза.")
-    await callback_query.message.answer(
-        escaped_prompt,
-        parse_mode=ParseMode.MARKDOWN_V2
-    )
+def resolved_stop(loc_data):
+    # В состоянии храним уже найденную точку, чтобы не геокодировать её повторно
+    return ResolvedLocation(city=loc_data['city'], key=loc_data['key'], lat=loc_data['lat'], lon=loc_data['lon']).to_dict()
 
-    user_data = await state.get_data()
-    start_city = user_data['start']
-    end_city = user_data['end']
-    stops = user_data.get('stops', [])
-    days = user_data['days']
-
-    route_points = [start_city] + stops + [end_city]
-    logger.debug(f"Маршрут пользователя {user_id}: {route_points}")
-
-    forecasts = []
-    for city in route_points:
-        loc_data = get_location_data(city)
-        if not loc_data:
-            error_message = f"Не удалось найти город: {escape_markdown_v2(city)}. Попробуйте снова."
-            escaped_error = escape_markdown_v2(error_message)
-            logger.error(f"Не удалось найти город '{city}' для пользователя {user_id}")
+def load_route(user_data):
+    """Точки маршрута из состояния FSM; None, если состояние от другой версии или повреждено."""
+    if user_data.get('route_version') != ROUTE_STATE_VERSION:
+        return None
+    try:
+        points = [user_data['start']] + user_data.get('stops', []) + [user_data['end']]
+        return [ResolvedLocation.from_dict(point) for point in points]
+    except (KeyError, TypeError):
+        return None
+
+def chart_photo(city, chart):
+    # chart — либо file_id уже загруженного графика, либо PNG-байты.
+    # Каждой загрузке нужен свой поток: aiogram читает его до конца
+    if isinstance(chart, str):
+        return chart
+    return types.InputFile(io.BytesIO(chart), filename=f"{city}.png")
+
+def format_stop_forecast(point, number, total, language):
+    # Номер точки в заголовке: прогнозы приходят по мере готовности, а не по порядку маршрута
+    lines = [messages.text('forecast_stop', language, number=number, total=total, city=point.city)]
+    if not point.forecast:
+        lines.append(messages.text('forecast_no_data', language))
+    for day in point.forecast:
+        lines.append(messages.text('forecast_date', language, date=day.date.isoformat()))
+        if day.current_temp is not None:
+            lines.append(messages.text('forecast_current', language, temp=day.current_temp, text=day.current_text or ''))
+        lines.extend((
+            messages.text('forecast_min_temp', language, temp=day.min_temp),
+            messages.text('forecast_max_temp', language, temp=day.max_temp),
+            messages.text('forecast_wind', language, speed=day.wind_speed),
+            messages.text('forecast_precip', language, prob=day.precip_prob),
+            messages.text('forecast_day', language, text=day.weather_text_day),
+            messages.text('forecast_night', language, text=day.weather_text_night) + "\n"
+        ))
+    return "\n".join(lines) + "\n"
+
+async def update_progress(status_message, text):
+    # Прогресс показываем правкой одного сообщения, а не новыми сообщениями
+    try:
+        await status_message.edit_text(text, parse_mode=ParseMode.MARKDOWN_V2)
+    except MessageNotModified:
+        pass
+    except Exception as e:
+        logger.warning(f"Не удалось обновить сообщение о прогрессе: {e}")
+
+async def send_stop_chart(bot, user_id, point, number, total, language):
+    # Уже загруженный в Telegram график отправляем по file_id, иначе рендерим
+    labels = chart_labels(point.city, language)
+    key = chart_cache_key(point.city, point.forecast, labels)
+    chart = chart_file_ids.get(key) or await generate_weather_chart(point.city, point.forecast, labels)
+    if not chart:
+        logger.warning(f"Не удалось сгенерировать график для города {point.city}")
+        return
+    try:
+        chart_caption = messages.text('chart_caption', language, number=number, total=total, city=point.city)
+        logger.info(f"Отправляем график для {point.city} пользователю {user_id}")
+        sent = await bot.send_photo(
+            chat_id=user_id,
+            photo=chart_photo(point.city, chart),
+            caption=chart_caption,
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        if isinstance(chart, bytes):
+            remember_chart_file_id(key, sent)
+    except Exception as e:
+        logger.error(f"Ошибка при отправке фото: {e}")
+
+async def send_route_chart(bot, user_id, points, language):
+    # Один график на маршрут: время рендеринга и объём загрузки не растут с числом точек
+    charted = [point for point in points if point.forecast]
+    if not charted:
+        return
+    labels = route_chart_labels(charted[0].city, charted[-1].city, language)
+    key = route_chart_cache_key(charted, labels)
+    chart = chart_file_ids.get(key) or await generate_route_chart(charted, labels)
+    if not chart:
+        logger.warning(f"Не удалось сгенерировать график маршрута для пользователя {user_id}")
+        return
+    try:
+        logger.info(f"Отправляем график маршрута из {len(charted)} точек пользователю {user_id}")
+        sent = await bot.send_photo(
+            chat_id=user_id,
+            photo=chart_photo('route', chart),
+            caption=messages.text('route_chart_caption', language, start=charted[0].city, end=charted[-1].city),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        if isinstance(chart, bytes):
+            remember_chart_file_id(key, sent)
+    except Exception as e:
+        logger.error(f"Ошибка при отправке графика маршрута: {e}")
+
+def format_stop_caption(point, number, total, language):
+    # Краткий вариант прогноза для подписи к фото: подпись ограничена CAPTION_LIMIT символами
+    lines = [messages.text('forecast_stop', language, number=number, total=total, city=point.city)]
+    for day in point.forecast:
+        lines.append(messages.text(
+            'caption_day', language, date=day.date.isoformat(), min_temp=day.min_temp, max_temp=day.max_temp,
+            wind=day.wind_speed, precip=day.precip_prob,
+            day_text=day.weather_text_day, night_text=day.weather_text_night
+        ))
+    caption = "\n".join(lines)
+    while len(caption) > CAPTION_LIMIT and len(lines) > 1:
+        lines.pop()
+        caption = "\n".join(lines + [messages.text('caption_more', language)])
+    return caption
+
+async def send_route_albums(callback_query, user_id, stops, total, language):
+    """
+    Графики всех точек — альбомами по MEDIA_GROUP_SIZE фото, прогноз — в подписях.
+    stops — пары (номер точки, LocationForecast). Точки без графика отправляются обычным текстом.
+    """
+    charted = [(number, point) for number, point in stops if point.forecast]
+    labels = [chart_labels(point.city, language) for _, point in charted]
+    keys = [chart_cache_key(point.city, point.forecast, point_labels)
+            for (_, point), point_labels in zip(charted, labels)]
+    charts = [chart_file_ids.get(key) for key in keys]
+    to_render = [idx for idx, chart in enumerate(charts) if chart is None]
+    rendered = await generate_weather_charts([charted[idx][1] for idx in to_render],
+                                             [labels[idx] for idx in to_render])
+    for idx, png in zip(to_render, rendered):
+        charts[idx] = png
+        if not png:
+            logger.warning(f"Не удалось сгенерировать график для города {charted[idx][1].city}")
+
+    album = [(number, point, chart, key) for (number, point), chart, key in zip(charted, charts, keys) if chart]
+    with_chart = {number for number, _, _, _ in album}
+    for number, point in stops:
+        if number not in with_chart:
             await callback_query.message.answer(
-                escaped_error,
+                format_stop_forecast(point, number, total, language),
                 parse_mode=ParseMode.MARKDOWN_V2
             )
-            await state.finish()
-            return
-        forecast = get_weather_forecast(loc_data['key'], days)
-        forecasts.append({
-            'city': city,
-            'forecast': forecast,
-            'lat': loc_data['lat'],
-            'lon': loc_data['lon']
-        })
-
-    # Генерация графиков
-    chart_paths = []
-    for point in forecasts:
-        chart_path = await generate_weather_chart(point['city'], point['forecast'])
-        if chart_path:
-            chart_paths.append(chart_path)
-        else:
-            logger.warning(f"Не удалось сгенерировать график для города {point['city']}")
-
-    # Генерация ссылки на карту маршрута
-    map_link = generate_route_map_link(forecasts)
-    logger.debug(f"Сгенерирована ссылка на карту маршрута: {map_link}")
 
-    # Отправка прогнозов и графиков
-    for idx, point in enumerate(forecasts):
-        message_text = f"*{escape_markdown_v2(point['city'])}*\n"
-        if point['forecast']:
-            for day in point['forecast']:
-                date = escape_markdown_v2(day['date'])
-                weather_text_day = escape_markdown_v2(day['weather_text_day'])
-                weather_text_night = escape_markdown_v2(day['weather_text_night'])
-                message_text += (
-                    f"📅 *Дата:* {date}\n"
-                    f"🌡️ *Мин. Температура:* {day['min_temp']}°C\n"
-                    f"🌡️ *Макс. Температура:* {day['max_temp']}°C\n"
-                    f"💨 *Скорость ветра:* {day['wind_speed']} км/ч\n"
-                    f"🌧️ *Вероятность осадков:* {day['precip_prob']}%\n"
-                    f"☀️ *Днём:* {weather_text_day}\n"
-                    f"🌙 *Ночью:* {weather_text_night}\n\n"
-                )
-        else:
-            message_text += "❌ Нет данных для прогноза.\n\n"
-
-        escaped_message_text = escape_markdown_v2(message_text)
-        if idx < len(chart_paths):
-            try:
-                with open(chart_paths[idx], 'rb') as chart:
-                    logger.info(f"Отправляем фото: {chart_paths[idx]} пользователю {user_id}")
-                    await callback_query.bot.send_photo(
-                        chat_id=user_id,
-                        photo=chart,
-                        caption=escaped_message_text,
+    for start in range(0, len(album), MEDIA_GROUP_SIZE):
+        chunk = album[start:start + MEDIA_GROUP_SIZE]
+        try:
+            logger.info(f"Отправляем альбом из {len(chunk)} графиков пользователю {user_id}")
+            if len(chunk) == 1:
+                # Альбом должен содержать от 2 до 10 элементов
+                number, point, chart, _ = chunk[0]
+                sent = [await callback_query.bot.send_photo(
+                    chat_id=user_id,
+                    photo=chart_photo(point.city, chart),
+                    caption=format_stop_caption(point, number, total, language),
+                    parse_mode=ParseMode.MARKDOWN_V2
+                )]
+            else:
+                media = [
+                    types.InputMediaPhoto(
+                        media=chart_photo(point.city, chart),
+                        caption=format_stop_caption(point, number, total, language),
                         parse_mode=ParseMode.MARKDOWN_V2
                     )
-            except Exception as e:
-                logger.error(f"Ошибка при отправке фото: {e}")
+                    for number, point, chart, _ in chunk
+                ]
+                sent = await callback_query.bot.send_media_group(chat_id=user_id, media=media)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке альбома: {e}")
+            for number, point, _, _ in chunk:
                 await callback_query.message.answer(
-                    escaped_message_text,
+                    format_stop_forecast(point, number, total, language),
                     parse_mode=ParseMode.MARKDOWN_V2
                 )
+            continue
+        for (_, _, chart, key), message in zip(chunk, sent):
+            if isinstance(chart, bytes):
+                remember_chart_file_id(key, message)
+
+async def weather_days_selection(callback_query: types.CallbackQuery, state: FSMContext):
+
+    started_at = time.monotonic()
+    days = int(callback_query.data)
+    user_id = callback_query.from_user.id
+    language = user_language(callback_query.from_user)
+    logger.info(f"Пользователь {user_id} выбрал {days} день(дней) для прогноза.")
+
+    user_data = await state.get_data()
+    route_points = load_route(user_data)
+    if route_points is None:
+        logger.warning(f"Устаревшее состояние маршрута у пользователя {user_id}: {user_data}")
+        await callback_query.message.answer(
+            messages.text('route_stale', language),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        await state.finish()
+        return
+    logger.debug(f"Маршрут пользователя {user_id}: {[point.city for point in route_points]}")
+
+    total = len(route_points)
+    status_message = await callback_query.message.answer(
+        messages.text('forecast_progress', language, days=days, done=0, total=total),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+
+    # Прогноз каждой точки отправляем сразу по готовности, график — следом, когда отрисуется
+    # (в режиме route_chart — один общий график после всех прогнозов).
+    # В режиме альбомов ответы копятся и уходят пачками после получения всех прогнозов
+    stream = ROUTE_DELIVERY != 'album'
+    forecasts = [None] * total
+    failed = {}
+    chart_tasks = []
+    done = 0
+    first_result_at = None
+    # Правки индикатора прогресса не ждём: в очереди отправки они уступают результатам,
+    # а ещё не отправленная правка заменяется более новой
+    progress_tasks = []
+    async for idx, point in iter_route_forecasts(route_points, days, language):
+        done += 1
+        if point.error:
+            failed[idx] = point
         else:
-            logger.info(f"Отправляем текстовое сообщение пользователю {user_id}")
+            forecasts[idx] = point
+        if stream and not point.error:
+            logger.info(f"Отправляем прогноз для {point.city} пользователю {user_id}")
             await callback_query.message.answer(
-                escaped_message_text,
+                format_stop_forecast(point, idx + 1, total, language),
                 parse_mode=ParseMode.MARKDOWN_V2
             )
+            if first_result_at is None:
+                first_result_at = time.monotonic()
+                logger.info(f"Первый прогноз отправлен пользователю {user_id} через {first_result_at - started_at:.2f} сек.")
+            if point.forecast and ROUTE_DELIVERY == 'stream':
+                chart_tasks.append(asyncio.ensure_future(send_stop_chart(callback_query.bot, user_id, point, idx + 1, total, language)))
+        elif not point.error and first_result_at is None:
+            # Альбомы уходят после всех точек, поэтому здесь замеряем готовность первого прогноза, а не отправку
+            first_result_at = time.monotonic()
+            logger.info(f"Первый прогноз готов для пользователя {user_id} через {first_result_at - started_at:.2f} сек. "
+                        f"(режим альбомов)")
+        progress_tasks.append(asyncio.ensure_future(
+            update_progress(status_message, messages.text('forecast_progress', language, days=days, done=done, total=total))
+        ))
+
+    stops = [(idx + 1, point) for idx, point in enumerate(forecasts) if point is not None]
+    forecasts = [point for _, point in stops]
+    if failed:
+        error_message = "\n".join([messages.text('route_failed', language)] + [
+            messages.text('route_failed_stop', language, number=idx + 1, city=point.city,
+                          error=messages.plain(f'route_error_{point.error}', language))
+            for idx, point in sorted(failed.items())
+        ])
+        logger.error(f"Не удалось получить прогноз для точек {[point.city for point in failed.values()]} для пользователя {user_id}")
+        if not forecasts:
+            await callback_query.message.answer(
+                error_message,
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+            await asyncio.gather(*progress_tasks)
+            await state.finish()
+            return
 
-    # Отправка ссылки на карту маршрута
-    if map_link:
-        # Экранируем только текст ссылки, не URL
-        escaped_link_text = escape_markdown_v2("Открыть карту")
-        # Не экранируем URL
-        route_map_message = f"🗺️ *Маршрут на карте:* [{escaped_link_text}]({map_link})"
-        logger.info(f"Отправляем ссылку на карту маршрута пользователю {user_id}")
-        await callback_query.message.answer(
-            route_map_message,
-            parse_mode=ParseMode.MARKDOWN_V2,
-            disable_web_page_preview=False
-        )
+    if ROUTE_DELIVERY == 'route_chart':
+        await send_route_chart(callback_query.bot, user_id, forecasts, language)
+    elif stream:
+        await asyncio.gather(*chart_tasks)
+    else:
+        await send_route_albums(callback_query, user_id, stops, total, language)
+        logger.info(f"Альбомы отправлены пользователю {user_id} через {time.monotonic() - started_at:.2f} сек.")
 
-    # Отправка всех графиков
-    for chart_path in chart_paths:
-        try:
-            with open(chart_path, 'rb') as chart:
-                chart_caption = escape_markdown_v2("📊 График прогноза погоды")
-                logger.info(f"Отправляем фото: {chart_path} пользователю {user_id}")
-                await callback_query.bot.send_photo(
-                    chat_id=user_id,
-                    photo=chart,
-                    caption=chart_caption,
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-        except Exception as e:
-            logger.error(f"Ошибка при отправке фото: {e}")
+    # Генерация ссылки на карту маршрута
+    map_link = generate_route_map_link([point.to_dict() for idx, point in enumerate(route_points) if idx not in failed])
+    logger.debug(f"Сгенерирована ссылка на карту маршрута: {map_link}")
 
-    final_message = "✅ Прогноз погоды получен."
-    escaped_final_message = escape_markdown_v2(final_message)
-    logger.info(f"Отправляем финальное сообщение пользователю {user_id}")
+    # Ошибки, ссылка на карту и итог — одним сообщением
+    summary = []
+    if failed:
+        summary.append(error_message)
+    if map_link:
+        summary.append(messages.text('route_map', language, url=map_link))
+    summary.append(messages.text('route_done', language))
+    await asyncio.gather(*progress_tasks)
+    logger.info(f"Прогноз по маршруту из {total} точек доставлен пользователю {user_id} за {time.monotonic() - started_at:.2f} сек.")
     await callback_query.message.answer(
-        escaped_final_message,
-        parse_mode=ParseMode.MARKDOWN_V2
+        "\n\n".join(summary),
+        parse_mode=ParseMode.MARKDOWN_V2,
+        disable_web_page_preview=False
     )
     await state.finish()
 
 async def weather_cancel(message: types.Message, state: FSMContext):
 
-    canceled_message = "Отменено."
-    escaped_canceled_message = escape_markdown_v2(canceled_message)
+    language = user_language(message.from_user)
     logger.info(f"Пользователь {message.from_user.id} отменил процесс.")
     await message.reply(
-        escaped_canceled_message,
+        messages.text('cancelled', language),
         parse_mode=ParseMode.MARKDOWN_V2,
         reply_markup=ReplyKeyboardRemove()
     )
     await state.finish()
 
-def get_location_from_coords(lat, lon):
-
-    logger = logging.getLogger(__name__)
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'format': 'json',
-            'language': 'ru'
-        }
-        headers = {
-            'User-Agent': 'WeatherBot/1.0'
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            address = data.get('address', {})
-            city = address.get('city') or address.get('town') or address.get('village')
-            if city:
-                logger.debug(f"Обратное геокодирование: найдена город {city} по координатам ({lat}, {lon})")
-                return {'city': city, 'lat': lat, 'lon': lon}
-        logger.warning(f"Не удалось выполнить обратное геокодирование для координат ({lat}, {lon})")
-        return None
-    except Exception as e:
-        logger.error(f"Ошибка при обратном геокодировании: {e}")
-        return None
-
 def register_handlers(dp: Dispatcher):
     dp.register_message_handler(weather_start, commands="weather", state="*")
     dp.register_message_handler(weather_start_location, state=WeatherForm.start, content_types=types.ContentTypes.TEXT | types.ContentTypes.LOCATION)
@@ -2,26 +2,28 @@
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 
-def days_keyboard():
+from Project3.weather_bot.bot.messages import messages
+
+def days_keyboard(language=None):
 
     keyboard = [
-        [InlineKeyboardButton("1 день", callback_data='1')],
-        [InlineKeyboardButton("3 дня", callback_data='3')],
-        [InlineKeyboardButton("5 дней", callback_data='5')]
+        [InlineKeyboardButton(messages.plain('button_days_1', language), callback_data='1')],
+        [InlineKeyboardButton(messages.plain('button_days_3', language), callback_data='3')],
+        [InlineKeyboardButton(messages.plain('button_days_5', language), callback_data='5')]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def confirmation_keyboard():
+def confirmation_keyboard(language=None):
 
     keyboard = [
-        [InlineKeyboardButton("Да", callback_data='yes')],
-        [InlineKeyboardButton("Нет", callback_data='no')]
+        [InlineKeyboardButton(messages.plain('button_yes', language), callback_data='yes')],
+        [InlineKeyboardButton(messages.plain('button_no', language), callback_data='no')]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def location_keyboard():
+def location_keyboard(language=None):
 
     keyboard = [
-        [KeyboardButton("📍 Отправить геолокацию", request_location=True)]
+        [KeyboardButton(messages.plain('button_location', language), request_location=True)]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
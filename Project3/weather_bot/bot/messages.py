@@ -0,0 +1,193 @@
+# weather_bot/bot/messages.py
+"""
+Каталог текстов бота.
+
+Тексты хранятся в bot/locales/<язык>.json (ключ -> шаблон) и при запуске
+компилируются сразу для MarkdownV2, HTML и простого текста (кнопки клавиатур).
+Синтаксис шаблона:
+
+    *жирный*        — выделение (в HTML — <b>...</b>, в простом тексте звёздочки убираются);
+    {name}          — параметр, экранируется при подстановке; допускается формат: {value:.1f};
+    [подпись]({url}) — ссылка с адресом из параметра.
+
+Постоянные тексты экранируются один раз при загрузке, поэтому в обработчиках
+сообщение без параметров — просто готовая строка. Недостающие в языке ключи
+берутся из языка по умолчанию (BOT_LANGUAGE).
+"""
+
+import html
+import json
+import logging
+import os
+import re
+
+from aiogram.types import ParseMode
+
+from Project3.weather_bot.bot.utils import escape_markdown_v2, escape_markdown_v2_url
+
+logger = logging.getLogger(__name__)
+
+BOT_LANGUAGE = os.getenv('BOT_LANGUAGE', 'ru-RU')
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+
+PLAIN = None
+PARSE_MODES = (ParseMode.MARKDOWN_V2, ParseMode.HTML, PLAIN)
+
+_TOKEN = re.compile(r"\*|\[(?P<label>[^\]]*)\]\(\{(?P<url>\w+)\}\)|\{(?P<field>\w+)(?::(?P<spec>[^}]*))?\}")
+
+
+def _escape_plain(text):
+    return text
+
+
+_ESCAPE = {
+    ParseMode.MARKDOWN_V2: escape_markdown_v2,
+    ParseMode.HTML: html.escape,
+    PLAIN: _escape_plain,
+}
+# Адрес ссылки экранируется по своим правилам
+_ESCAPE_URL = {
+    ParseMode.MARKDOWN_V2: escape_markdown_v2_url,
+    ParseMode.HTML: html.escape,
+    PLAIN: _escape_plain,
+}
+
+
+def _bold(parse_mode, opening):
+    if parse_mode == ParseMode.MARKDOWN_V2:
+        return '*'
+    if parse_mode == ParseMode.HTML:
+        return '<b>' if opening else '</b>'
+    return ''
+
+
+def _link(parse_mode, label):
+    # Части ссылки до и после адреса; адрес подставляется при отрисовке
+    escape = _ESCAPE[parse_mode]
+    if parse_mode == ParseMode.MARKDOWN_V2:
+        return f"[{escape(label)}](", ")"
+    if parse_mode == ParseMode.HTML:
+        return '<a href="', f'">{escape(label)}</a>'
+    return f"{label} (", ")"
+
+
+class Template:
+    """
+    Шаблон, скомпилированный для одного режима разметки: список готовых фрагментов
+    и параметров. Шаблон без параметров хранит итоговую строку целиком.
+    """
+
+    __slots__ = ('key', 'parse_mode', 'parts', 'static')
+
+    def __init__(self, key, source, parse_mode):
+        self.key = key
+        self.parse_mode = parse_mode
+        escape = _ESCAPE[parse_mode]
+        parts = []
+        literal = []
+        bold = False
+        position = 0
+        for match in _TOKEN.finditer(source):
+            literal.append(escape(source[position:match.start()]))
+            position = match.end()
+            if match.group(0) == '*':
+                bold = not bold
+                literal.append(_bold(parse_mode, bold))
+            elif match.group('url'):
+                before, after = _link(parse_mode, match.group('label'))
+                literal.append(before)
+                parts.extend((''.join(literal), (match.group('url'), '', 'url')))
+                literal = [after]
+            else:
+                parts.extend((''.join(literal), (match.group('field'), match.group('spec') or '', 'text')))
+                literal = []
+        if bold:
+            raise ValueError(f"Незакрытое выделение в шаблоне '{key}'")
+        literal.append(escape(source[position:]))
+        parts.append(''.join(literal))
+        self.parts = [part for part in parts if part != '']
+        self.static = ''.join(self.parts) if all(isinstance(part, str) for part in self.parts) else None
+
+    def render(self, params):
+        if self.static is not None:
+            return self.static
+        escapes = {'text': _ESCAPE[self.parse_mode], 'url': _ESCAPE_URL[self.parse_mode]}
+        rendered = []
+        for part in self.parts:
+            if isinstance(part, str):
+                rendered.append(part)
+            else:
+                name, spec, kind = part
+                rendered.append(escapes[kind](format(params[name], spec)))
+        return ''.join(rendered)
+
+
+class MessageCatalog:
+    """Тексты бота на нескольких языках, скомпилированные для всех режимов разметки."""
+
+    def __init__(self, locales, default_language=BOT_LANGUAGE):
+        if default_language not in locales:
+            raise ValueError(f"Нет текстов для языка по умолчанию {default_language}")
+        self.default_language = default_language
+        self._templates = {}
+        default_keys = set(locales[default_language])
+        for language, entries in locales.items():
+            missing = default_keys - set(entries)
+            if missing:
+                logger.warning(f"В языке {language} нет текстов {sorted(missing)}, используется {default_language}")
+            for key, source in entries.items():
+                for parse_mode in PARSE_MODES:
+                    self._templates[(language, key, parse_mode)] = Template(key, source, parse_mode)
+        self.languages = sorted(locales)
+        # Короткие коды (en, ru — как language_code в Telegram) ведут к первому подходящему языку
+        self._aliases = {}
+        for language in self.languages:
+            self._aliases.setdefault(language.split('-')[0].lower(), language)
+
+    @classmethod
+    def from_directory(cls, path=LOCALES_DIR, default_language=BOT_LANGUAGE):
+        locales = {}
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.json'):
+                with open(os.path.join(path, name), encoding='utf-8') as f:
+                    locales[name[:-len('.json')]] = json.load(f)
+        return cls(locales, default_language)
+
+    def resolve_language(self, language):
+        if not language:
+            return self.default_language
+        if language in self.languages:
+            return language
+        return self._aliases.get(language.split('-')[0].lower(), self.default_language)
+
+    def text(self, key, language=None, parse_mode=ParseMode.MARKDOWN_V2, **params):
+        """Готовый текст для отправки с указанным parse_mode; параметры экранируются при подстановке."""
+        template = self._templates.get((self.resolve_language(language), key, parse_mode))
+        if template is None:
+            template = self._templates[(self.default_language, key, parse_mode)]
+        return template.render(params)
+
+    def plain(self, key, language=None, **params):
+        """Текст без разметки: подписи кнопок, всплывающие уведомления."""
+        return self.text(key, language, PLAIN, **params)
+
+
+messages = MessageCatalog.from_directory()
+
+# Ключи подписей графиков в каталоге: chart_<ключ> и route_chart_<ключ>
+WEATHER_CHART_LABELS = ('date', 'min_temp', 'max_temp', 'wind_speed', 'temperature_axis', 'wind_axis')
+ROUTE_CHART_LABELS = ('max_temp', 'wind_speed', 'precip_prob')
+
+
+def chart_labels(city, language=None):
+    """Подписи графика точки (render_weather_chart) на языке language."""
+    labels = {key: messages.plain(f'chart_{key}', language) for key in WEATHER_CHART_LABELS}
+    labels['title'] = messages.plain('chart_title', language, city=city)
+    return labels
+
+
+def route_chart_labels(start, end, language=None):
+    """Подписи общего графика маршрута (render_route_chart) на языке language."""
+    labels = {key: messages.plain(f'route_chart_{key}', language) for key in ROUTE_CHART_LABELS}
+    labels['title'] = messages.plain('route_chart_title', language, start=start, end=end)
+    return labels
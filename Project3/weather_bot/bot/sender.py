@@ -0,0 +1,232 @@
+# weather_bot/bot/sender.py
+
+import asyncio
+import heapq
+import io
+import itertools
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from aiogram import Bot, types
+from aiogram.utils.exceptions import RetryAfter
+
+from Project3.weather_bot.weather.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: около 30 сообщений в секунду всего, не чаще раза в секунду в один чат
+# (короткие всплески допустимы) и не более 20 сообщений в минуту в группу
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', str(20 / 60)))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', '8'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+# Сколько ведер отдельных чатов держать в памяти
+SEND_MAX_CHATS = 10000
+
+# Чем меньше значение, тем раньше уходит запрос: короткие ответы обгоняют загрузку фото,
+# а правки уже отправленных сообщений (индикатор прогресса) пропускают вперёд новые результаты
+PRIORITY_TEXT = 0
+PRIORITY_MEDIA = 1
+PRIORITY_EDIT = 2
+MEDIA_METHODS = {'sendPhoto', 'sendMediaGroup', 'sendDocument', 'sendVideo', 'sendAnimation'}
+# Методы, на которые распространяются лимиты на отправку сообщений
+RATE_LIMITED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+
+class SendScheduler:
+    """
+    Центральная очередь исходящих запросов к Bot API.
+    Каждый чат обрабатывается по очереди своим обработчиком: запрос ждёт токен
+    чата и переходит в общую очередь с приоритетом, откуда его забирают SEND_WORKERS
+    отправителей после получения глобального токена. RetryAfter приостанавливает
+    только свой чат и повторяет запрос после указанной паузы.
+    Запросы с одинаковым coalesce_key в одном чате схлопываются: если предыдущий ещё
+    стоит в очереди, он не отправляется (его вызов получает None), уходит только последний.
+    """
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE,
+                 chat_burst=TELEGRAM_CHAT_BURST, group_rate=TELEGRAM_GROUP_RATE,
+                 workers=SEND_WORKERS, max_retries=SEND_MAX_RETRIES, max_chats=SEND_MAX_CHATS):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._buckets = OrderedDict()
+        self._chat_queues = {}
+        self._chat_tasks = {}
+        self._coalesced = {}
+        self._ready = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательные id и @username — группы и каналы, у них свой, более строгий лимит
+            rate = self.group_rate if str(chat_id).startswith(('-', '@')) else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+            if len(self._buckets) > self.max_chats:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(chat_id)
+        return bucket
+
+    def _start(self):
+        if self._ready is None:
+            self._ready = asyncio.PriorityQueue()
+            self._tasks = [asyncio.ensure_future(self._sender()) for _ in range(self.workers)]
+
+    async def submit(self, chat_id, func, priority=PRIORITY_TEXT, tokens=1, coalesce_key=None):
+        """Ставит запрос func() в очередь чата и возвращает его результат."""
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        if coalesce_key is not None:
+            previous = self._coalesced.get((chat_id, coalesce_key))
+            if previous is not None and not previous.done():
+                self.coalesced += 1
+                _resolve(previous)
+            self._coalesced[(chat_id, coalesce_key)] = future
+        queue = self._chat_queues.setdefault(chat_id, [])
+        heapq.heappush(queue, (priority, next(self._seq), tokens, coalesce_key, func, future))
+        if chat_id not in self._chat_tasks:
+            self._chat_tasks[chat_id] = asyncio.ensure_future(self._drain_chat(chat_id))
+        return await future
+
+    async def _drain_chat(self, chat_id):
+        queue = self._chat_queues[chat_id]
+        bucket = self._chat_bucket(chat_id)
+        try:
+            while queue:
+                priority, _, tokens, coalesce_key, func, future = heapq.heappop(queue)
+                if coalesce_key is not None and self._coalesced.get((chat_id, coalesce_key)) is future:
+                    del self._coalesced[(chat_id, coalesce_key)]
+                if future.done() and not future.cancelled():
+                    # Заменён более новым запросом с тем же coalesce_key — токен не тратим
+                    continue
+                for attempt in range(self.max_retries + 1):
+                    await bucket.acquire(min(tokens, bucket.capacity))
+                    done = asyncio.get_running_loop().create_future()
+                    await self._ready.put((priority, next(self._seq), tokens, func, done))
+                    try:
+                        result = await done
+                    except RetryAfter as e:
+                        if attempt == self.max_retries:
+                            self.failed += 1
+                            _resolve(future, error=e)
+                            break
+                        self.retries += 1
+                        logger.warning(f"Flood control для чата {chat_id}: повтор через {e.timeout} сек.")
+                        await asyncio.sleep(e.timeout)
+                    except Exception as e:
+                        self.failed += 1
+                        _resolve(future, error=e)
+                        break
+                    else:
+                        self.sent += 1
+                        _resolve(future, result)
+                        break
+        finally:
+            del self._chat_queues[chat_id]
+            del self._chat_tasks[chat_id]
+
+    async def _sender(self):
+        while True:
+            _, _, tokens, func, done = await self._ready.get()
+            try:
+                await self.global_bucket.acquire(min(tokens, self.global_bucket.capacity))
+                result = await func()
+            except Exception as e:
+                _resolve(done, error=e)
+            else:
+                _resolve(done, result)
+            finally:
+                self._ready.task_done()
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'coalesced': self.coalesced,
+            'chats': len(self._chat_queues),
+            'queued': sum(len(queue) for queue in self._chat_queues.values())
+        }
+
+    async def close(self):
+        for task in list(self._chat_tasks.values()) + self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._chat_tasks.values(), *self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._ready = None
+
+
+def _resolve(future, result=None, error=None):
+    # Вызывающий мог уже отменить ожидание
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _snapshot_files(files):
+    # aiohttp закрывает поток после отправки, поэтому для повтора храним содержимое файлов
+    snapshot = {}
+    for key, f in (files or {}).items():
+        if isinstance(f, types.InputFile):
+            snapshot[key] = (f.filename, f.file.read())
+        else:
+            snapshot[key] = f
+    return snapshot
+
+
+def _fresh_files(snapshot):
+    return {
+        key: types.InputFile(io.BytesIO(f[1]), filename=f[0]) if isinstance(f, tuple) else f
+        for key, f in snapshot.items()
+    }
+
+
+class ScheduledBot(Bot):
+    """Bot, отправляющий сообщения в чаты через SendScheduler; остальные методы идут напрямую."""
+
+    def __init__(self, *args, scheduler=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        chat_id = (data or {}).get('chat_id')
+        if self.scheduler is None or chat_id is None or not method.startswith(RATE_LIMITED_PREFIXES):
+            return await super().request(method, data, files, **kwargs)
+
+        send = super().request
+        snapshot = _snapshot_files(files)
+
+        async def call():
+            return await send(method, data, _fresh_files(snapshot), **kwargs)
+
+        coalesce_key = None
+        if method in MEDIA_METHODS:
+            priority = PRIORITY_MEDIA
+        elif method.startswith('edit'):
+            priority = PRIORITY_EDIT
+            # Из нескольких ещё не отправленных правок одного сообщения важна только последняя
+            coalesce_key = (method, data.get('message_id'), data.get('inline_message_id'))
+        else:
+            priority = PRIORITY_TEXT
+        # Альбом расходует лимит как несколько сообщений
+        tokens = len(json.loads(data['media'])) if method == 'sendMediaGroup' else 1
+        return await self.scheduler.submit(chat_id, call, priority=priority, tokens=tokens,
+                                           coalesce_key=coalesce_key)
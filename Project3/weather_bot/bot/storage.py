@@ -0,0 +1,334 @@
+# weather_bot/bot/storage.py
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.dispatcher.storage import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+# Хранилище состояний диалогов: memory, sqlite или redis
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+FSM_SQLITE_PATH = os.getenv('FSM_SQLITE_PATH', 'fsm.sqlite3')
+FSM_REDIS_HOST = os.getenv('FSM_REDIS_HOST', 'localhost')
+FSM_REDIS_PORT = int(os.getenv('FSM_REDIS_PORT', '6379'))
+FSM_REDIS_DB = int(os.getenv('FSM_REDIS_DB', '0'))
+FSM_REDIS_PASSWORD = os.getenv('FSM_REDIS_PASSWORD')
+# Через сколько секунд брошенный диалог считается устаревшим
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', str(24 * 3600)))
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в SQLite (режим WAL), общее для нескольких процессов бота на одном хосте.
+    Состояние и данные пользователя лежат в одной строке; строки старше ttl считаются пустыми
+    и периодически удаляются. Запросы выполняются в пуле потоков, чтобы не блокировать event loop.
+    """
+
+    PURGE_EVERY = 1000  # записей между очистками устаревших диалогов
+
+    def __init__(self, path=FSM_SQLITE_PATH, ttl=FSM_STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS fsm ('
+            'chat TEXT NOT NULL, user TEXT NOT NULL, state TEXT, data TEXT NOT NULL, '
+            'updated_at REAL NOT NULL, PRIMARY KEY (chat, user))'
+        )
+        self.purge_expired()
+
+    async def _run(self, func, *args):
+        def locked():
+            with self._lock:
+                return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, locked)
+
+    def _select(self, chat, user):
+        row = self._conn.execute(
+            'SELECT state, data, updated_at FROM fsm WHERE chat = ? AND user = ?', (chat, user)
+        ).fetchone()
+        if row is None or (self.ttl and row[2] < time.time() - self.ttl):
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def _upsert(self, chat, user, state, data):
+        self._conn.execute(
+            'INSERT INTO fsm (chat, user, state, data, updated_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (chat, user) DO UPDATE SET '
+            'state = excluded.state, data = excluded.data, updated_at = excluded.updated_at',
+            (chat, user, state, json.dumps(data, ensure_ascii=False), time.time())
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge()
+
+    def _apply(self, chat, user, state=..., data=..., patch=None):
+        # Чтение и запись в одной транзакции: параллельные процессы не затирают друг друга.
+        # state и data заменяют значения целиком, patch дополняет данные, прочитанные в транзакции
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            old_state, old_data = self._select(chat, user)
+            state = old_state if state is ... else state
+            data = dict(old_data if data is ... else data)
+            data.update(patch or {})
+            if state is None and not data:
+                self._delete(chat, user)
+            else:
+                self._upsert(chat, user, state, data)
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def _delete(self, chat, user):
+        self._conn.execute('DELETE FROM fsm WHERE chat = ? AND user = ?', (chat, user))
+
+    def _purge(self):
+        if self.ttl:
+            cursor = self._conn.execute('DELETE FROM fsm WHERE updated_at < ?', (time.time() - self.ttl,))
+            if cursor.rowcount:
+                logger.info(f"Удалено устаревших диалогов: {cursor.rowcount}")
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge()
+
+    async def get_state(self, *, chat=None, user=None, default=None):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        state, _ = await self._run(self._select, chat, user)
+        return self.resolve_state(state if state is not None else default)
+
+    async def get_data(self, *, chat=None, user=None, default=None):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        _, data = await self._run(self._select, chat, user)
+        return data or (default or {})
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        await self._run(self._apply, chat, user, self.resolve_state(state))
+
+    async def set_data(self, *, chat=None, user=None, data=None):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        await self._run(self._apply, chat, user, ..., dict(data or {}))
+
+    async def update_data(self, *, chat=None, user=None, data=None, **kwargs):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        patch = dict(data or {})
+        patch.update(kwargs)
+        await self._run(self._apply, chat, user, ..., ..., patch)
+
+    async def reset_state(self, *, chat=None, user=None, with_data=True):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        if with_data:
+            # Завершение диалога — одна операция вместо записи состояния и данных по отдельности
+            await self._run(self._delete, chat, user)
+        else:
+            await self._run(self._apply, chat, user, None)
+
+    async def get_record(self, *, chat=None, user=None):
+        """Состояние и данные одним запросом."""
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        return await self._run(self._select, chat, user)
+
+    async def apply(self, *, chat=None, user=None, state=..., data=..., patch=None):
+        """
+        Изменения одной транзакцией: state и data (если переданы) заменяют значения целиком,
+        ключи patch записываются поверх данных, прочитанных внутри транзакции.
+        """
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        if state is not ...:
+            state = self.resolve_state(state)
+        if data is not ...:
+            data = dict(data or {})
+        await self._run(self._apply, chat, user, state, data, dict(patch or {}))
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def wait_closed(self):
+        pass
+
+
+_batch = ContextVar('fsm_batch', default=None)
+
+
+class BatchingStorage(BaseStorage):
+    """
+    Обёртка над любым FSM-хранилищем, объединяющая обращения в пределах одного обновления.
+    Первое обращение к пользователю читает состояние и данные один раз, все последующие
+    get/set/update работают с локальной копией, а FSMBatchMiddleware записывает изменения
+    после обработки обновления. Записываются только изменения: новое состояние, данные,
+    если их заменили целиком, и ключи из update_data, — поэтому параллельная обработка
+    другого обновления того же пользователя не теряет свои ключи. Хранилище с методом
+    apply (SQLiteStorage) получает изменения одной транзакцией. Вне обновления вызовы
+    передаются как есть.
+    """
+
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    async def _entry(self, chat, user):
+        batch = _batch.get()
+        if batch is None:
+            return None
+        chat, user = self.check_address(chat=chat, user=user)
+        key = (str(chat), str(user))
+        entry = batch.get(key)
+        if entry is None:
+            if hasattr(self.storage, 'get_record'):
+                state, data = await self.storage.get_record(chat=chat, user=user)
+            else:
+                state = await self.storage.get_state(chat=chat, user=user)
+                data = await self.storage.get_data(chat=chat, user=user)
+            entry = batch[key] = {
+                'chat': chat, 'user': user, 'state': state, 'data': data or {},
+                # Что изменилось за обновление: состояние, данные целиком или отдельные ключи
+                'state_set': False, 'data_set': False, 'patch': {}
+            }
+        return entry
+
+    async def get_state(self, *, chat=None, user=None, default=None):
+        entry = await self._entry(chat, user)
+        if entry is None:
+            return await self.storage.get_state(chat=chat, user=user, default=default)
+        return self.resolve_state(entry['state'] if entry['state'] is not None else default)
+
+    async def get_data(self, *, chat=None, user=None, default=None):
+        entry = await self._entry(chat, user)
+        if entry is None:
+            return await self.storage.get_data(chat=chat, user=user, default=default)
+        return copy.deepcopy(entry['data']) or (default or {})
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        entry = await self._entry(chat, user)
+        if entry is None:
+            return await self.storage.set_state(chat=chat, user=user, state=state)
+        entry['state'] = self.resolve_state(state)
+        entry['state_set'] = True
+
+    async def set_data(self, *, chat=None, user=None, data=None):
+        entry = await self._entry(chat, user)
+        if entry is None:
+            return await self.storage.set_data(chat=chat, user=user, data=data)
+        entry['data'] = copy.deepcopy(data or {})
+        entry['data_set'] = True
+        entry['patch'] = {}
+
+    async def update_data(self, *, chat=None, user=None, data=None, **kwargs):
+        entry = await self._entry(chat, user)
+        if entry is None:
+            return await self.storage.update_data(chat=chat, user=user, data=data, **kwargs)
+        patch = copy.deepcopy(dict(data or {}, **kwargs))
+        entry['data'].update(patch)
+        if not entry['data_set']:
+            entry['patch'].update(patch)
+
+    async def reset_state(self, *, chat=None, user=None, with_data=True):
+        entry = await self._entry(chat, user)
+        if entry is None:
+            return await self.storage.reset_state(chat=chat, user=user, with_data=with_data)
+        entry['state'] = None
+        entry['state_set'] = True
+        if with_data:
+            entry['data'] = {}
+            entry['data_set'] = True
+            entry['patch'] = {}
+
+    async def flush(self):
+        batch = _batch.get()
+        _batch.set(None)
+        for entry in (batch or {}).values():
+            changes = {}
+            if entry['state_set']:
+                changes['state'] = entry['state']
+            if entry['data_set']:
+                changes['data'] = entry['data']
+            elif entry['patch']:
+                changes['patch'] = entry['patch']
+            if not changes:
+                continue
+            chat, user = entry['chat'], entry['user']
+            if hasattr(self.storage, 'apply'):
+                await self.storage.apply(chat=chat, user=user, **changes)
+            elif changes.get('state', ...) is None and changes.get('data') == {}:
+                await self.storage.reset_state(chat=chat, user=user, with_data=True)
+            else:
+                # Хранилища без apply (память, Redis) обновляют ключи своим update_data
+                if 'data' in changes:
+                    await self.storage.set_data(chat=chat, user=user, data=changes['data'])
+                elif 'patch' in changes:
+                    await self.storage.update_data(chat=chat, user=user, data=changes['patch'])
+                if 'state' in changes:
+                    await self.storage.set_state(chat=chat, user=user, state=changes['state'])
+
+    def has_bucket(self):
+        return self.storage.has_bucket()
+
+    async def get_bucket(self, *, chat=None, user=None, default=None):
+        return await self.storage.get_bucket(chat=chat, user=user, default=default)
+
+    async def set_bucket(self, *, chat=None, user=None, bucket=None):
+        return await self.storage.set_bucket(chat=chat, user=user, bucket=bucket)
+
+    async def update_bucket(self, *, chat=None, user=None, bucket=None, **kwargs):
+        return await self.storage.update_bucket(chat=chat, user=user, bucket=bucket, **kwargs)
+
+    async def close(self):
+        await self.storage.close()
+
+    async def wait_closed(self):
+        await self.storage.wait_closed()
+
+
+class FSMBatchMiddleware(BaseMiddleware):
+    """Открывает пакет FSM-операций перед обработкой обновления и записывает его после."""
+
+    def __init__(self, storage: BatchingStorage):
+        super().__init__()
+        self.storage = storage
+
+    async def on_pre_process_update(self, update, data):
+        _batch.set({})
+
+    async def on_post_process_update(self, update, results, data):
+        try:
+            await self.storage.flush()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении состояния диалога: {e}")
+
+
+def create_storage(kind=FSM_STORAGE):
+
+    if kind == 'sqlite':
+        logger.info(f"FSM-хранилище: SQLite ({FSM_SQLITE_PATH})")
+        return SQLiteStorage(FSM_SQLITE_PATH, ttl=FSM_STATE_TTL)
+    if kind == 'redis':
+        # Требует пакет redis; подходит и любой сервер с протоколом Redis
+        from aiogram.contrib.fsm_storage.redis import RedisStorage2
+        logger.info(f"FSM-хранилище: Redis ({FSM_REDIS_HOST}:{FSM_REDIS_PORT}/{FSM_REDIS_DB})")
+        return RedisStorage2(
+            host=FSM_REDIS_HOST,
+            port=FSM_REDIS_PORT,
+            db=FSM_REDIS_DB,
+            password=FSM_REDIS_PASSWORD,
+            state_ttl=FSM_STATE_TTL,
+            data_ttl=FSM_STATE_TTL
+        )
+    if kind != 'memory':
+        raise ValueError(f"Неизвестный FSM_STORAGE: {kind}. Допустимые значения: memory, sqlite, redis.")
+    return MemoryStorage()
@@ -1,22 +1,31 @@
 # weather_bot/bot/utils.py
 
-import re
 import html
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Таблицы перевода строятся один раз: str.translate быстрее re.sub и не компилирует шаблон при каждом вызове
+MARKDOWN_V2_SPECIAL_CHARS = "_*[]()~`>#+-=|{}.!\\"
+_MARKDOWN_V2_TABLE = str.maketrans({char: "\\" + char for char in MARKDOWN_V2_SPECIAL_CHARS})
+# Внутри (...) ссылки Telegram требует экранировать только ')' и '\'
+_MARKDOWN_V2_URL_TABLE = str.maketrans({')': "\\)", "\\": "\\\\"})
+
 
 def escape_markdown_v2(text: str) -> str:
 
-    escape_chars = r"_*[]()~`>#+-=|{}.!\\"
     try:
-        return re.sub(f"([{re.escape(escape_chars)}])", r"\\\1", text)
+        return text.translate(_MARKDOWN_V2_TABLE)
     except Exception as e:
         logger.error(f"Ошибка при экранировании MarkdownV2: {e}")
         return text
 
 
+def escape_markdown_v2_url(url: str) -> str:
+
+    return url.translate(_MARKDOWN_V2_URL_TABLE)
+
+
 def escape_html(text: str) -> str:
 
     try:
@@ -0,0 +1,161 @@
+# weather_bot/bot/webhook.py
+
+import asyncio
+import hmac
+import logging
+import os
+
+from aiogram import Bot, types
+from aiogram.dispatcher import Dispatcher
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Публичный адрес бота (например, https://bot.example.com); если не задан, вебхук не регистрируется
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', '8080'))
+# Размер очереди входящих обновлений и число обработчиков
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '8'))
+# Путь для метрик в формате JSON (счётчики вебхука, остаток квоты, кэши); пустое значение отключает
+METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Принимает обновления от Telegram по HTTP и складывает их в ограниченную очередь.
+    Ответ Telegram отправляется сразу; обновления разбирают WEBHOOK_WORKERS обработчиков.
+    Если очередь переполнена, возвращается 503 — Telegram повторит доставку позже.
+    """
+
+    def __init__(self, dp: Dispatcher, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                 queue_size=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS, metrics=None):
+        self.dp = dp
+        self.path = path
+        self.secret = secret
+        self.queue_size = queue_size
+        self.workers = workers
+        self.metrics = metrics
+        self.queue = None
+        self._tasks = []
+        self.received = 0
+        self.rejected = 0
+        self.unauthorized = 0
+        self.invalid = 0
+        self.processed = 0
+        self.failed = 0
+
+    async def handle_update(self, request: web.Request):
+        if self.secret:
+            token = request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(token, self.secret):
+                self.unauthorized += 1
+                logger.warning(f"Отклонён запрос вебхука с неверным секретом от {request.remote}")
+                return web.Response(status=401)
+        try:
+            data = await request.json()
+        except ValueError:
+            self.invalid += 1
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("Очередь обновлений переполнена, обновление отклонено.")
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def handle_metrics(self, request: web.Request):
+        metrics = {'webhook': self.stats()}
+        if self.metrics is not None:
+            metrics.update(self.metrics())
+        return web.json_response(metrics)
+
+    async def _worker(self):
+        Dispatcher.set_current(self.dp)
+        Bot.set_current(self.dp.bot)
+        while True:
+            data = await self.queue.get()
+            try:
+                # process_updates запускает middleware и обрабатывает обновление в отдельной задаче:
+                # у каждой задачи своя копия контекста, а aiogram хранит состояние FSM в ContextVar
+                await self.dp.process_updates([types.Update(**data)])
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка при обработке обновления: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def start_workers(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Запущено обработчиков обновлений: {self.workers}, размер очереди: {self.queue_size}")
+
+    async def stop_workers(self, drain_timeout=10):
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не обработано обновлений при остановке: {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'rejected': self.rejected,
+            'unauthorized': self.unauthorized,
+            'invalid': self.invalid,
+            'processed': self.processed,
+            'failed': self.failed,
+            'queued': self.queue.qsize() if self.queue is not None else 0
+        }
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        if METRICS_PATH:
+            app.router.add_get(METRICS_PATH, self.handle_metrics)
+        return app
+
+
+def run_webhook(dp: Dispatcher, on_startup=None, on_shutdown=None,
+                host=WEBAPP_HOST, port=WEBAPP_PORT, metrics=None):
+
+    server = WebhookServer(dp, metrics=metrics)
+    app = server.make_app()
+
+    async def startup(app):
+        Dispatcher.set_current(dp)
+        Bot.set_current(dp.bot)
+        await server.start_workers()
+        if on_startup is not None:
+            await on_startup(dp)
+        if WEBHOOK_HOST:
+            webhook_url = f"{WEBHOOK_HOST.rstrip('/')}{WEBHOOK_PATH}"
+            await dp.bot.set_webhook(webhook_url, secret_token=WEBHOOK_SECRET, drop_pending_updates=True)
+            logger.info(f"Вебхук зарегистрирован: {webhook_url}")
+
+    async def shutdown(app):
+        await server.stop_workers()
+        logger.info(f"Статистика вебхука: {server.stats()}")
+        if on_shutdown is not None:
+            await on_shutdown(dp)
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        session = await dp.bot.get_session()
+        await session.close()
+
+    app.on_startup.append(startup)
+    app.on_shutdown.append(shutdown)
+    logger.info(f"Бот запускается в режиме вебхука на {host}:{port}{WEBHOOK_PATH}")
+    web.run_app(app, host=host, port=port)
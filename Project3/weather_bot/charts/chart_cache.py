@@ -0,0 +1,51 @@
+# weather_bot/charts/chart_cache.py
+
+import hashlib
+import json
+import logging
+import os
+
+from Project3.weather_bot.weather.cache import SQLiteStore, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Версия оформления графика: увеличьте при изменении render_weather_chart, чтобы не отдавать старые картинки
+CHART_STYLE_VERSION = 1
+
+CHART_FILE_ID_CACHE_SIZE = int(os.getenv('CHART_FILE_ID_CACHE_SIZE', '4096'))
+CHART_FILE_ID_CACHE_TTL = float(os.getenv('CHART_FILE_ID_CACHE_TTL', str(7 * 24 * 3600)))
+CHART_FILE_ID_CACHE_DB = os.getenv('CHART_FILE_ID_CACHE_DB')
+
+# Хэш содержимого графика -> file_id, полученный от Telegram при первой загрузке
+chart_file_ids = TTLCache(
+    maxsize=CHART_FILE_ID_CACHE_SIZE,
+    ttl=CHART_FILE_ID_CACHE_TTL,
+    store=SQLiteStore(CHART_FILE_ID_CACHE_DB, table='chart_file_ids') if CHART_FILE_ID_CACHE_DB else None,
+    name='chart_file_ids'
+)
+
+
+def chart_cache_key(city, forecast, labels=None, style=CHART_STYLE_VERSION):
+
+    # Подписи на разных языках — разные картинки
+    payload = json.dumps([city, [day.astuple() for day in forecast], labels, style], ensure_ascii=False,
+                         default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def route_chart_cache_key(points, labels=None, style=CHART_STYLE_VERSION):
+
+    payload = json.dumps(['route', [[point.city, [day.astuple() for day in point.forecast]] for point in points],
+                          labels, style], ensure_ascii=False, default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def remember_chart_file_id(key, sent_message):
+    """Сохраняет file_id самой большой версии фото из ответа send_photo и возвращает его."""
+    try:
+        file_id = sent_message.photo[-1].file_id
+    except (AttributeError, IndexError, TypeError):
+        logger.warning("Ответ send_photo не содержит file_id")
+        return None
+    chart_file_ids.set(key, file_id)
+    return file_id
@@ -1,20 +1,171 @@
 # weather_bot/charts/chart_generator.py
 
 import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+import asyncio
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import logging
 import re
 
 logger = logging.getLogger(__name__)
 
-async def generate_weather_chart(city, forecast):
+# Число процессов для рендеринга графиков (Plotly + Kaleido)
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '2'))
 
+# Графики рендерятся в память; сохранение на диск включается явно
+CHARTS_SAVE_TO_DISK = os.getenv('CHARTS_SAVE_TO_DISK', '0') == '1'
+CHARTS_DIR = os.getenv('CHARTS_DIR', 'charts/generated_charts')
+CHARTS_MAX_FILES = int(os.getenv('CHARTS_MAX_FILES', '200'))
+CHARTS_MAX_AGE = float(os.getenv('CHARTS_MAX_AGE', str(24 * 3600)))  # сек.
+
+# Общий график маршрута рендерится в фиксированном размере, сколько бы ни было точек
+ROUTE_CHART_WIDTH = int(os.getenv('ROUTE_CHART_WIDTH', '1000'))
+ROUTE_CHART_HEIGHT = int(os.getenv('ROUTE_CHART_HEIGHT', '900'))
+# При большем числе ячеек значения в них не подписываются — цифры перестают помещаться
+ROUTE_CHART_MAX_LABELED_CELLS = 60
+# Поле прогноза и цветовая шкала каждой тепловой карты; подписи — в labels под тем же ключом
+ROUTE_CHART_METRICS = (
+    ('max_temp', 'RdBu_r'),
+    ('wind_speed', 'Greens'),
+    ('precip_prob', 'Blues'),
+)
+
+_executor = None
+
+
+def weather_chart_labels(city):
+    """Подписи графика точки по умолчанию; бот передаёт подписи на языке пользователя из каталога текстов."""
+    return {
+        'title': f'Прогноз погоды для {city}',
+        'date': 'Дата',
+        'min_temp': 'Мин. Температура',
+        'max_temp': 'Макс. Температура',
+        'wind_speed': 'Скорость ветра',
+        'temperature_axis': 'Температура (°C)',
+        'wind_axis': 'Скорость ветра (км/ч)'
+    }
+
+
+def route_chart_labels(start, end):
+    """Подписи общего графика маршрута по умолчанию: заголовок и «название, единица» для каждой тепловой карты."""
+    return {
+        'title': f'Прогноз погоды по маршруту: {start} — {end}',
+        'max_temp': 'Макс. температура, °C',
+        'wind_speed': 'Скорость ветра, км/ч',
+        'precip_prob': 'Вероятность осадков, %'
+    }
+
+
+def _warm_up_renderer():
+    # Первый экспорт запускает процесс Kaleido; делаем это при старте воркера, а не на запросе
+    try:
+        go.Figure().to_image(format='png', width=10, height=10)
+    except Exception as e:
+        logger.warning(f"Не удалось прогреть Kaleido: {e}")
+
+
+def _ping():
+    return os.getpid()
+
+
+def get_chart_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=CHART_WORKERS, initializer=_warm_up_renderer)
+    return _executor
+
+
+async def start_chart_workers():
+    # Запускаем все процессы пула заранее, чтобы первый пользователь не ждал прогрева
+    loop = asyncio.get_running_loop()
+    executor = get_chart_executor()
+    pids = await asyncio.gather(*[loop.run_in_executor(executor, _ping) for _ in range(CHART_WORKERS)])
+    logger.info(f"Пул рендеринга графиков запущен: {len(set(pids))} процесс(ов)")
+
+
+def shutdown_chart_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def generate_weather_chart(city, forecast, labels=None):
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_chart_executor(), render_weather_chart, city, forecast, labels)
+    except Exception as e:
+        logger.error(f"Ошибка при генерации графика: {e}")
+        return None
+
+
+async def generate_route_chart(points, labels=None):
+    """Один PNG-график для всех точек маршрута (LocationForecast) вместо графика на каждую точку."""
+
+    loop = asyncio.get_running_loop()
+    cities = [point.city for point in points]
+    forecasts = [point.forecast for point in points]
     try:
-        dates = [day['date'] for day in forecast]
-        min_temps = [day['min_temp'] for day in forecast]
-        max_temps = [day['max_temp'] for day in forecast]
-        wind_speeds = [day['wind_speed'] for day in forecast]
+        return await loop.run_in_executor(get_chart_executor(), render_route_chart, cities, forecasts, labels)
+    except Exception as e:
+        logger.error(f"Ошибка при генерации графика маршрута: {e}")
+        return None
+
+
+async def generate_weather_charts(points, labels=None):
+    """
+    Параллельно рендерит PNG-графики для всех точек маршрута; порядок совпадает с points.
+    labels — подписи для каждой точки (список той же длины) или None для подписей по умолчанию.
+    """
+    labels = labels or [None] * len(points)
+    return await asyncio.gather(*[
+        generate_weather_chart(point.city, point.forecast, point_labels) for point, point_labels in zip(points, labels)
+    ])
+
+
+def save_chart(city, png):
+
+    # Создание директории для сохранения графиков, если она не существует
+    os.makedirs(CHARTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    safe_city = re.sub(r'\s+', '_', city)
+    chart_path = os.path.join(CHARTS_DIR, f'{safe_city}_{timestamp}.png')
+    with open(chart_path, 'wb') as f:
+        f.write(png)
+    logger.debug(f"График сохранён по пути: {chart_path}")
+    apply_retention()
+    return chart_path
+
+
+def apply_retention(directory=CHARTS_DIR, max_files=CHARTS_MAX_FILES, max_age=CHARTS_MAX_AGE):
+    """Удаляет графики старше max_age секунд и самые старые сверх max_files."""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.png')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        cutoff = datetime.now().timestamp() - max_age
+        removed = 0
+        for position, entry in enumerate(entries):
+            if position >= max_files or entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        if removed:
+            logger.debug(f"Удалено устаревших графиков: {removed}")
+    except Exception as e:
+        logger.error(f"Ошибка при очистке каталога графиков: {e}")
+
+
+def render_weather_chart(city, forecast, labels=None):
+    """Строит график и возвращает PNG в виде байтов (выполняется в процессе пула)."""
+
+    try:
+        labels = labels or weather_chart_labels(city)
+        dates = [day.date for day in forecast]
+        min_temps = [day.min_temp for day in forecast]
+        max_temps = [day.max_temp for day in forecast]
+        wind_speeds = [day.wind_speed for day in forecast]
 
         fig = go.Figure()
 
@@ -24,7 +175,7 @@ async def generate_weather_chart(city, forecast):
                 x=dates,
                 y=min_temps,
                 mode='lines+markers',
-                name='Мин. Температура',
+                name=labels['min_temp'],
                 line=dict(color='blue'),
                 yaxis='y1'
             )
@@ -34,7 +185,7 @@ async def generate_weather_chart(city, forecast):
                 x=dates,
                 y=max_temps,
                 mode='lines+markers',
-                name='Макс. Температура',
+                name=labels['max_temp'],
                 line=dict(color='red'),
                 yaxis='y1'
             )
@@ -46,7 +197,7 @@ async def generate_weather_chart(city, forecast):
                 x=dates,
                 y=wind_speeds,
                 mode='lines+markers',
-                name='Скорость ветра',
+                name=labels['wind_speed'],
                 line=dict(color='green'),
                 yaxis='y2'
             )
@@ -54,15 +205,15 @@ async def generate_weather_chart(city, forecast):
 
         # Настройка макета графика с двумя осями Y
         fig.update_layout(
-            title=f'Прогноз погоды для {city}',
-            xaxis_title='Дата',
+            title=labels['title'],
+            xaxis_title=labels['date'],
             yaxis=dict(
-                title='Температура (°C)',
+                title=labels['temperature_axis'],
                 titlefont=dict(color='blue'),
                 tickfont=dict(color='blue')
             ),
             yaxis2=dict(
-                title='Скорость ветра (км/ч)',
+                title=labels['wind_axis'],
                 titlefont=dict(color='green'),
                 tickfont=dict(color='green'),
                 overlaying='y',
@@ -72,14 +223,66 @@ async def generate_weather_chart(city, forecast):
             template='plotly_white'
         )
 
-        # Создание директории для сохранения графиков, если она не существует
-        os.makedirs('charts/generated_charts', exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        safe_city = re.sub(r'\s+', '_', city)
-        chart_path = f'charts/generated_charts/{safe_city}_{timestamp}.png'
-        fig.write_image(chart_path)
-        logger.debug(f"График сохранён по пути: {chart_path}")
-        return chart_path
+        png = fig.to_image(format='png')
+        if CHARTS_SAVE_TO_DISK:
+            save_chart(city, png)
+        return png
     except Exception as e:
         logger.error(f"Ошибка при генерации графика: {e}")
         return None
+
+
+def render_route_chart(cities, forecasts, labels=None):
+    """
+    Тепловые карты «точка × день» для температуры, ветра и осадков на одном изображении
+    (выполняется в процессе пула). Размер картинки не зависит от числа точек.
+    """
+
+    try:
+        labels = labels or route_chart_labels(cities[0], cities[-1])
+        dates = sorted({day.date for forecast in forecasts for day in forecast})
+        # Номер в подписи сохраняет порядок точек и различает повторяющиеся города
+        rows = [f"{idx}. {city}" for idx, city in enumerate(cities, start=1)]
+        by_date = [{day.date: day for day in forecast} for forecast in forecasts]
+        show_values = len(rows) * len(dates) <= ROUTE_CHART_MAX_LABELED_CELLS
+
+        fig = make_subplots(
+            rows=len(ROUTE_CHART_METRICS), cols=1, shared_xaxes=True, vertical_spacing=0.08,
+            subplot_titles=[labels[field] for field, _ in ROUTE_CHART_METRICS]
+        )
+        columns = [date.strftime('%d.%m') for date in dates]
+        for row, (field, colorscale) in enumerate(ROUTE_CHART_METRICS, start=1):
+            title = labels[field]
+            z = [[getattr(days[date], field) if date in days else None for date in dates] for days in by_date]
+            # Шкала цвета — напротив своей тепловой карты
+            low, high = fig.get_subplot(row, 1).yaxis.domain
+            fig.add_trace(
+                go.Heatmap(
+                    x=columns,
+                    y=rows,
+                    z=z,
+                    colorscale=colorscale,
+                    texttemplate='%{z}' if show_values else None,
+                    hovertemplate='%{y}<br>%{x}: %{z}<extra></extra>',
+                    colorbar=dict(len=high - low, y=(low + high) / 2, title=title.split(',')[-1].strip())
+                ),
+                row=row, col=1
+            )
+            # Первая точка маршрута сверху
+            fig.update_yaxes(autorange='reversed', row=row, col=1)
+
+        fig.update_xaxes(type='category')
+        fig.update_layout(
+            title=labels['title'],
+            template='plotly_white',
+            width=ROUTE_CHART_WIDTH,
+            height=ROUTE_CHART_HEIGHT
+        )
+
+        png = fig.to_image(format='png')
+        if CHARTS_SAVE_TO_DISK:
+            save_chart('route', png)
+        return png
+    except Exception as e:
+        logger.error(f"Ошибка при генерации графика маршрута: {e}")
+        return None
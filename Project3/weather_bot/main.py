@@ -2,18 +2,33 @@
 
 import logging
 import os
-from aiogram import Bot, Dispatcher, executor, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram import Dispatcher, executor, types
+from aiogram.bot.api import TelegramAPIServer
 from dotenv import load_dotenv
 
 from Project3.weather_bot.bot.commands import register_commands
 from Project3.weather_bot.bot.handlers import register_handlers
+from Project3.weather_bot.bot.sender import ScheduledBot, SendScheduler
+from Project3.weather_bot.bot.storage import BatchingStorage, FSMBatchMiddleware, create_storage
+from Project3.weather_bot.bot.webhook import run_webhook
+from Project3.weather_bot.charts.chart_cache import chart_file_ids
+from Project3.weather_bot.charts.chart_generator import shutdown_chart_workers, start_chart_workers
+from Project3.weather_bot.weather.async_api import close_http_client, refresh_forecast, weather_backend
+from Project3.weather_bot.weather.cache import forecast_cache, forecast_flight, forecast_popularity, geocode_cache
+from Project3.weather_bot.weather.gazetteer import get_gazetteer
+from Project3.weather_bot.weather.geocoding import reverse_geocode_cache
+from Project3.weather_bot.weather.quota import accuweather_quota
+from Project3.weather_bot.weather.refresher import ForecastRefresher
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
 
 API_TOKEN = os.getenv('TELEGRAM_TOKEN')
 API_KEY = os.getenv('API_KEY')
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Адрес Bot API (например, локальный тестовый сервер); по умолчанию — api.telegram.org
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER')
 
 if not API_TOKEN:
     raise ValueError("Не найден TELEGRAM_TOKEN в переменных окружения.")
@@ -21,6 +36,9 @@ if not API_TOKEN:
 if not API_KEY:
     raise ValueError("Не найден API_KEY в переменных окружения.")
 
+if BOT_MODE not in ('polling', 'webhook'):
+    raise ValueError(f"Неизвестный BOT_MODE: {BOT_MODE}. Допустимые значения: polling, webhook.")
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,  # Измените на DEBUG для более подробного логирования
@@ -33,14 +51,64 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
-bot = Bot(token=API_TOKEN, parse_mode=types.ParseMode.MARKDOWN_V2)
-storage = MemoryStorage()
+# Все сообщения в чаты проходят через общий планировщик с лимитами Telegram
+send_scheduler = SendScheduler()
+if TELEGRAM_API_SERVER:
+    bot = ScheduledBot(token=API_TOKEN, parse_mode=types.ParseMode.MARKDOWN_V2,
+                       server=TelegramAPIServer.from_base(TELEGRAM_API_SERVER), scheduler=send_scheduler)
+else:
+    bot = ScheduledBot(token=API_TOKEN, parse_mode=types.ParseMode.MARKDOWN_V2, scheduler=send_scheduler)
+# Обращения к FSM в рамках одного обновления объединяются в одно чтение и одну запись
+storage = BatchingStorage(create_storage())
 dp = Dispatcher(bot, storage=storage)
+dp.middleware.setup(FSMBatchMiddleware(storage))
+# Популярные прогнозы обновляются в фоне, пока не истекли
+forecast_refresher = ForecastRefresher(forecast_cache, forecast_popularity, refresh_forecast, accuweather_quota)
 
 # Регистрация команд и обработчиков
 register_commands(dp)
 register_handlers(dp)
 
+
+async def on_startup(dp: Dispatcher):
+    # Отображаем справочник городов в память заранее, а не при первом запросе
+    get_gazetteer()
+    await start_chart_workers()
+    forecast_refresher.start()
+
+
+async def on_shutdown(dp: Dispatcher):
+    await forecast_refresher.stop()
+    # Закрываем пул HTTP-соединений к внешним API
+    await close_http_client()
+    shutdown_chart_workers()
+    logger.info(f"Статистика кэша: {geocode_cache.stats()}, {forecast_cache.stats()}, "
+                f"{reverse_geocode_cache.stats()}, {chart_file_ids.stats()}, "
+                f"объединение запросов: {forecast_flight.stats()}, фоновое обновление: {forecast_refresher.stats()}")
+    logger.info(f"Статистика отправки сообщений: {send_scheduler.stats()}")
+    logger.info(f"Расход квоты AccuWeather: {accuweather_quota.stats()}")
+    logger.info(f"Провайдеры погоды: {weather_backend.stats()}")
+    await send_scheduler.close()
+    geocode_cache.close()
+    reverse_geocode_cache.close()
+    chart_file_ids.close()
+    accuweather_quota.close()
+
+
+def collect_metrics():
+    return {
+        'quota': accuweather_quota.stats(),
+        'caches': [geocode_cache.stats(), forecast_cache.stats(), reverse_geocode_cache.stats(), chart_file_ids.stats()],
+        'forecast_flight': forecast_flight.stats(),
+        'refresher': forecast_refresher.stats(),
+        'providers': weather_backend.stats(),
+        'sender': send_scheduler.stats()
+    }
+
+
 if __name__ == '__main__':
-    logger.info("Бот запускается...")
-    executor.start_polling(dp, skip_updates=True)
+    if BOT_MODE == 'webhook':
+        run_webhook(dp, on_startup=on_startup, on_shutdown=on_shutdown, metrics=collect_metrics)
+    else:
+        logger.info("Бот запускается...")
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,291 @@
+# weather_bot/weather/advisory.py
+"""
+Табличные рекомендации по погоде.
+
+Пороги и тексты рекомендаций задаются JSON-файлом (по умолчанию advisory_rules.json
+рядом с модулем, путь можно переопределить через ADVISORY_RULES_PATH):
+
+    thresholds — возрастающие пороги temperature, wind и precip; значение попадает
+                 в корзину с номером «сколько порогов оно строго больше»;
+    messages   — трёхмерная таблица [корзина температуры][корзина ветра][корзина осадков];
+    error      — текст для показаний, которые нельзя сравнить с порогами;
+    language   — язык текстов messages и error;
+    translations — переводы на другие языки: {язык: {исходный текст: перевод}}.
+
+Правила компилируются в таблицу индексов один раз при загрузке. Одно показание
+оценивается бинарным поиском, массив показаний — одним векторизованным вызовом NumPy.
+
+Сравнение с check_bad_weather (результаты должны совпадать, затем замеряется скорость):
+
+    python -m Project3.weather_bot.weather.advisory bench --size 100000
+    python -m Project3.weather_bot.weather.advisory eval 12 25 80
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from bisect import bisect_left
+
+try:
+    # NumPy указан в requirements.txt; при урезанной установке без него пакетная оценка выполняется поэлементно
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_RULES_PATH = os.getenv(
+    'ADVISORY_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'advisory_rules.json')
+)
+
+AXES = ('temperature', 'wind', 'precip')
+
+
+def load_rules(path):
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class AdvisoryEngine:
+    """
+    Рекомендации по погоде из скомпилированной таблицы правил.
+    Сравнения строгие (значение больше порога), как в check_bad_weather:
+    NaN не больше ни одного порога и попадает в нижнюю корзину.
+    Таблица хранит номера текстов, поэтому язык влияет только на последний шаг — выбор строки.
+    """
+
+    def __init__(self, rules):
+        thresholds = rules['thresholds']
+        self.thresholds = [[float(value) for value in thresholds[axis]] for axis in AXES]
+        for axis, values in zip(AXES, self.thresholds):
+            if any(low >= high for low, high in zip(values, values[1:])):
+                raise ValueError(f"Пороги {axis} должны строго возрастать: {values}")
+        self.error = rules['error']
+        self.language = rules.get('language', 'ru-RU')
+
+        # Одинаковые тексты хранятся один раз, таблица содержит их номера
+        self.messages = []
+        index = {}
+        self.table = []
+        shape = [len(values) + 1 for values in self.thresholds]
+        if len(rules['messages']) != shape[0]:
+            raise ValueError(f"Ожидается {shape[0]} корзин температуры, получено {len(rules['messages'])}")
+        for temp_bin in rules['messages']:
+            if len(temp_bin) != shape[1] or any(len(wind_bin) != shape[2] for wind_bin in temp_bin):
+                raise ValueError(f"Каждая корзина температуры должна иметь размер {shape[1]}×{shape[2]}")
+            for wind_bin in temp_bin:
+                for message in wind_bin:
+                    if message not in index:
+                        index[message] = len(self.messages)
+                        self.messages.append(message)
+                    self.table.append(index[message])
+        self.shape = tuple(shape)
+        self._temp_thresholds, self._wind_thresholds, self._precip_thresholds = self.thresholds
+        # Номер текста ошибки — последний, чтобы подставлять его маской
+        self.error_code = len(self.messages)
+
+        # Тексты по номерам для каждого языка; непереведённые остаются на языке правил
+        source = self.messages + [self.error]
+        self._texts = {self.language: source}
+        for language, translations in rules.get('translations', {}).items():
+            missing = [text for text in source if text not in translations]
+            if missing:
+                logger.warning(f"Нет перевода рекомендаций на {language}: {len(missing)} текст(ов)")
+            self._texts[language] = [translations.get(text, text) for text in source]
+        self.languages = sorted(self._texts)
+        # Для оценки одного показания — вложенные списки с готовыми текстами каждого языка, без арифметики индексов
+        self._nested = {
+            language: [[[texts[index[message]] for message in wind_bin] for wind_bin in temp_bin]
+                       for temp_bin in rules['messages']]
+            for language, texts in self._texts.items()
+        }
+        self._default_nested = self._nested[self.language]
+
+        if np is not None:
+            self._np_thresholds = [np.asarray(values, dtype=np.float64) for values in self.thresholds]
+            self._np_table = np.asarray(self.table, dtype=np.intp)
+            self._np_texts = {language: np.asarray(texts, dtype=object) for language, texts in self._texts.items()}
+
+    @classmethod
+    def from_file(cls, path=ADVISORY_RULES_PATH):
+        return cls(load_rules(path))
+
+    def texts(self, language=None):
+        """Тексты рекомендаций по номерам на языке language (или на языке правил)."""
+        return self._texts.get(language) or self._texts[self.language]
+
+    def evaluate(self, temperature, wind, precip, language=None):
+        """Рекомендация для одного показания."""
+        nested = self._nested.get(language, self._default_nested)
+        # bisect_left сравнивает «порог < значение» — то же, что «значение > порога» в исходных правилах
+        try:
+            return nested[bisect_left(self._temp_thresholds, temperature)][
+                bisect_left(self._wind_thresholds, wind)][bisect_left(self._precip_thresholds, precip)]
+        except Exception as e:
+            logger.error(f"Ошибка оценки погодных условий: {e}")
+            return self.texts(language)[self.error_code]
+
+    def _bins(self, axis, values):
+        # Числовой массив разбивается на корзины целиком; остальное — поэлементно,
+        # чтобы несравнимые значения (None, строки) давали текст ошибки, как в check_bad_weather
+        thresholds = self.thresholds[axis]
+        array = np.asarray(values)
+        if array.dtype.kind in 'biuf':
+            array = array.astype(np.float64, copy=False)
+            bins = np.searchsorted(self._np_thresholds[axis], array, side='left')
+            # searchsorted ставит NaN после всех порогов, а сравнение с NaN всегда ложно
+            bins[np.isnan(array)] = 0
+            return bins, None
+        bins = np.zeros(len(array), dtype=np.intp)
+        invalid = np.zeros(len(array), dtype=bool)
+        for idx, value in enumerate(array.tolist()):
+            try:
+                bins[idx] = bisect_left(thresholds, value)
+            except Exception:
+                invalid[idx] = True
+        return bins, invalid
+
+    def evaluate_many(self, temperatures, winds, precips, language=None):
+        """Рекомендации для массивов показаний одинаковой длины; возвращает список строк."""
+        if np is None:
+            return [self.evaluate(*reading, language) for reading in zip(temperatures, winds, precips)]
+
+        _, w_bins, p_bins = self.shape
+        temp_bins, temp_invalid = self._bins(0, temperatures)
+        wind_bins, wind_invalid = self._bins(1, winds)
+        precip_bins, precip_invalid = self._bins(2, precips)
+        if not len(temp_bins) == len(wind_bins) == len(precip_bins):
+            raise ValueError("Массивы показаний должны быть одинаковой длины")
+        codes = self._np_table[(temp_bins * w_bins + wind_bins) * p_bins + precip_bins]
+        for invalid in (temp_invalid, wind_invalid, precip_invalid):
+            if invalid is not None:
+                codes[invalid] = self.error_code
+        texts = self._np_texts.get(language)
+        if texts is None:
+            texts = self._np_texts[self.language]
+        return texts[codes].tolist()
+
+    def advise_route(self, points, language=None):
+        """
+        Рекомендации на каждый день для всех точек маршрута (LocationForecast) одним вызовом.
+        Для дня берётся максимальная температура; результат выровнен по points и их дням.
+        """
+        days = [day for point in points for day in point.forecast]
+        advice = self.evaluate_many(
+            [day.max_temp for day in days],
+            [day.wind_speed for day in days],
+            [day.precip_prob for day in days],
+            language
+        )
+        result = []
+        start = 0
+        for point in points:
+            result.append(advice[start:start + len(point.forecast)])
+            start += len(point.forecast)
+        return result
+
+
+advisory_engine = AdvisoryEngine.from_file()
+
+
+def _bench_readings(size, seed):
+    # Случайные показания; для проверки совпадения к ним добавляются все пороговые значения
+    # и их соседи, NaN и несравнимые значения
+    rng = random.Random(seed)
+    readings = [(round(rng.uniform(-40, 45), 1), round(rng.uniform(0, 60), 1), rng.randint(0, 100))
+                for _ in range(size)]
+    edges = [[edge + delta for edge in values for delta in (-0.5, 0, 0.5)] for values in advisory_engine.thresholds]
+    special = [(t, w, p) for t in edges[0] for w in edges[1] for p in edges[2]]
+    special += [(float('nan'), 30, 80), (40, float('nan'), 80), (40, 30, float('nan')),
+                (None, 10, 10), (10, None, 10), (10, 10, None), ('10', 10, 10)]
+    return readings, special
+
+
+def bench(size, seed=0, repeat=3):
+    """Проверяет совпадение с check_bad_weather и замеряет время; возвращает словарь с результатами."""
+    from Project3.weather_bot.weather.api import check_bad_weather
+
+    readings, special = _bench_readings(size, seed)
+    columns = [list(column) for column in zip(*readings)]
+
+    def timed(func):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    # Несравнимые значения обе реализации логируют как ошибку — при проверке это шум
+    logging.disable(logging.ERROR)
+    try:
+        checked = readings + special
+        expected = [check_bad_weather(*reading) for reading in checked]
+        scalar = [advisory_engine.evaluate(*reading) for reading in checked]
+        batch = advisory_engine.evaluate_many(*(list(column) for column in zip(*checked)))
+    finally:
+        logging.disable(logging.NOTSET)
+    mismatches = [
+        reading for reading, want, got_scalar, got_batch in zip(checked, expected, scalar, batch)
+        if not want == got_scalar == got_batch
+    ]
+
+    timings = {}
+    _, timings['check_bad_weather'] = timed(lambda: [check_bad_weather(*reading) for reading in readings])
+    _, timings['evaluate'] = timed(lambda: [advisory_engine.evaluate(*reading) for reading in readings])
+    _, timings['evaluate_many'] = timed(lambda: advisory_engine.evaluate_many(*columns))
+    if np is not None:
+        arrays = [np.asarray(column) for column in columns]
+        _, timings['evaluate_many (ndarray)'] = timed(lambda: advisory_engine.evaluate_many(*arrays))
+    return {
+        'readings': len(checked),
+        'mismatches': len(mismatches),
+        'first_mismatch': mismatches[0] if mismatches else None,
+        'timings': timings,
+        'numpy': np is not None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Табличные рекомендации по погоде")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = commands.add_parser('bench', help="Сравнить с check_bad_weather по результатам и скорости")
+    bench_parser.add_argument('--size', type=int, default=100000)
+    bench_parser.add_argument('--seed', type=int, default=0)
+    bench_parser.add_argument('--repeat', type=int, default=3)
+
+    eval_parser = commands.add_parser('eval', help="Рекомендация для одного показания")
+    eval_parser.add_argument('temperature', type=float)
+    eval_parser.add_argument('wind', type=float)
+    eval_parser.add_argument('precip', type=float)
+    eval_parser.add_argument('--language', help="Язык рекомендации, например en-US")
+
+    args = parser.parse_args(argv)
+    if args.command == 'eval':
+        print(advisory_engine.evaluate(args.temperature, args.wind, args.precip, args.language))
+        return 0
+
+    result = bench(args.size, args.seed, args.repeat)
+    print(f"Показаний: {result['readings']}, расхождений с check_bad_weather: {result['mismatches']}")
+    if result['mismatches']:
+        print(f"Первое расхождение: {result['first_mismatch']}")
+    timings = result['timings']
+    reference = timings['check_bad_weather']
+    print(f"Замер на {args.size} показаниях, лучшее из {args.repeat}:")
+    for name, elapsed in timings.items():
+        print(f"{name:>24}: {elapsed * 1000:9.2f} мс  (×{reference / elapsed:.1f})")
+    if not result['numpy']:
+        print("NumPy не установлен: evaluate_many выполнялась поэлементно")
+    return 1 if result['mismatches'] else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
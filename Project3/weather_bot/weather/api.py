@@ -4,7 +4,10 @@ import requests
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime
+from datetime import date
+
+from Project3.weather_bot.weather.advisory import advisory_engine
+from Project3.weather_bot.weather.models import DailyForecast
 
 load_dotenv()
 
@@ -13,31 +16,108 @@ API_KEY = os.getenv('API_KEY')
 if not API_KEY:
     raise ValueError("Не найден API_KEY в переменных окружения.")
 
+ACCUWEATHER_BASE_URL = os.getenv('ACCUWEATHER_BASE_URL', 'https://dataservice.accuweather.com')
+
 logger = logging.getLogger(__name__)
 
-def get_location_data(city_name, api_key=API_KEY):
+def parse_location_data(data):
+
+    if data and 'GeoPosition' in data[0]:
+        location = data[0]
+        location_key = location['Key']
+        lat = location['GeoPosition']['Latitude']
+        lon = location['GeoPosition']['Longitude']
+        city = location['LocalizedName']
+        logger.debug(f"Найдено местоположение: {city} (Key: {location_key})")
+        return {'key': location_key, 'lat': lat, 'lon': lon, 'city': city}
+    return None
 
-    url = 'https://dataservice.accuweather.com/locations/v1/cities/search'
+def parse_current_conditions(data, language='ru-RU'):
+
+    if not data:
+        return None
+    temperature = data[0]['Temperature']['Metric']['Value']
+    wind_speed = data[0]['Wind']['Speed']['Metric']['Value']
+    precip_prob = data[0].get('PrecipitationProbability', 0)
+    weather_status = advisory_engine.evaluate(temperature, wind_speed, precip_prob, language)
+    try:
+        # Для текущего дня мин и макс одинаковы
+        return [DailyForecast.create(date.today(), temperature, temperature, wind_speed, precip_prob,
+                                     weather_status, weather_status)]
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Некорректные текущие условия пропущены: {e}")
+        return None
+
+def parse_daily_forecast(data):
+
+    forecasts = []
+    for day in data.get('DailyForecasts', []):
+        try:
+            # Дата приходит как '2024-12-20T07:00:00+03:00': нужна только календарная часть
+            forecasts.append(DailyForecast.create(
+                date=date.fromisoformat(day.get('Date', '')[:10]),
+                min_temp=day['Temperature']['Minimum']['Value'],
+                max_temp=day['Temperature']['Maximum']['Value'],
+                wind_speed=day['Day']['Wind']['Speed']['Value'],
+                precip_prob=day['Day']['PrecipitationProbability'],
+                weather_text_day=day['Day']['IconPhrase'],
+                weather_text_night=day['Night']['IconPhrase']
+            ))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Некорректный день прогноза пропущен ({e}): {day.get('Date')}")
+    return forecasts
+
+def location_search_request(city_name, api_key=API_KEY, language='ru-RU'):
+
+    url = f'{ACCUWEATHER_BASE_URL}/locations/v1/cities/search'
     params = {
         'apikey': api_key,
         'q': city_name,
-        'language': 'ru-RU'
+        'language': language
+    }
+    return url, params
+
+def geoposition_search_request(lat, lon, api_key=API_KEY, language='ru-RU'):
+
+    url = f'{ACCUWEATHER_BASE_URL}/locations/v1/cities/geoposition/search'
+    params = {
+        'apikey': api_key,
+        'q': f'{lat},{lon}',
+        'language': language
     }
+    return url, params
+
+def forecast_request(location_key, days=1, api_key=API_KEY, language='ru-RU'):
+
+    if days == 1:
+        # Получение текущей погоды
+        url = f'{ACCUWEATHER_BASE_URL}/currentconditions/v1/{location_key}'
+        params = {
+            'apikey': api_key,
+            'details': 'true',
+            'language': language
+        }
+    else:
+        # Получение многодневного прогноза
+        url = f'{ACCUWEATHER_BASE_URL}/forecasts/v1/daily/{days}day/{location_key}'
+        params = {
+            'apikey': api_key,
+            'metric': 'true',
+            'language': language,
+            'details': 'true'
+        }
+    return url, params
+
+def get_location_data(city_name, api_key=API_KEY):
+
+    url, params = location_search_request(city_name, api_key)
     try:
         response = requests.get(url, params=params, timeout=5)
         response.raise_for_status()
-        data = response.json()
-        if data and 'GeoPosition' in data[0]:
-            location = data[0]
-            location_key = location['Key']
-            lat = location['GeoPosition']['Latitude']
-            lon = location['GeoPosition']['Longitude']
-            city = location['LocalizedName']
-            logger.debug(f"Найдено местоположение: {city} (Key: {location_key})")
-            return {'key': location_key, 'lat': lat, 'lon': lon, 'city': city}
-        else:
+        location = parse_location_data(response.json())
+        if location is None:
             logger.warning(f"Город '{city_name}' не найден или нет координат.")
-            return None
+        return location
     except requests.exceptions.HTTPError as http_err:
         logger.error(f"HTTP ошибка при получении данных о локации: {http_err}")
         return None
@@ -47,71 +127,18 @@ def get_location_data(city_name, api_key=API_KEY):
 
 def get_weather_forecast(location_key, days=1, api_key=API_KEY):
 
+    url, params = forecast_request(location_key, days, api_key)
     try:
+        response = requests.get(url, params=params, timeout=5)
+        response.raise_for_status()
         if days == 1:
-            # Получение текущей погоды
-            url = f'https://dataservice.accuweather.com/currentconditions/v1/{location_key}'
-            params = {
-                'apikey': api_key,
-                'details': 'true',
-                'language': 'ru-RU'
-            }
-            response = requests.get(url, params=params, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            if data:
-                temperature = data[0]['Temperature']['Metric']['Value']
-                wind_speed = data[0]['Wind']['Speed']['Metric']['Value']
-                precip_prob = data[0].get('PrecipitationProbability', 0)
-                weather_status = check_bad_weather(temperature, wind_speed, precip_prob)
-                forecast = [{
-                    'date': datetime.now().strftime('%Y-%m-%d'),
-                    'min_temp': temperature,  # Для текущего дня мин и макс одинаковы
-                    'max_temp': temperature,
-                    'wind_speed': wind_speed,
-                    'precip_prob': precip_prob,
-                    'weather_text_day': weather_status,
-                    'weather_text_night': weather_status
-                }]
+            forecast = parse_current_conditions(response.json())
+            if forecast:
                 logger.debug(f"Получен текущий прогноз для Key {location_key}: {forecast}")
-                return forecast
-        else:
-            # Получение многодневного прогноза
-            url = f'https://dataservice.accuweather.com/forecasts/v1/daily/{days}day/{location_key}'
-            params = {
-                'apikey': api_key,
-                'metric': 'true',
-                'language': 'ru-RU',
-                'details': 'true'
-            }
-            response = requests.get(url, params=params, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            forecasts = []
-            for day in data.get('DailyForecasts', []):
-                date_raw = day.get('Date', '')
-                try:
-                    date_obj = datetime.fromisoformat(date_raw.rstrip('Z'))
-                    date_str = date_obj.strftime('%Y-%m-%d')
-                except Exception:
-                    date_str = date_raw
-                min_temp = day['Temperature']['Minimum']['Value']
-                max_temp = day['Temperature']['Maximum']['Value']
-                wind_speed = day['Day']['Wind']['Speed']['Value']
-                precip_prob = day['Day']['PrecipitationProbability']
-                weather_text_day = day['Day']['IconPhrase']
-                weather_text_night = day['Night']['IconPhrase']
-                forecasts.append({
-                    'date': date_str,
-                    'min_temp': min_temp,
-                    'max_temp': max_temp,
-                    'wind_speed': wind_speed,
-                    'precip_prob': precip_prob,
-                    'weather_text_day': weather_text_day,
-                    'weather_text_night': weather_text_night
-                })
-            logger.debug(f"Получен {days}-дневный прогноз для Key {location_key}: {forecasts}")
-            return forecasts
+            return forecast
+        forecasts = parse_daily_forecast(response.json())
+        logger.debug(f"Получен {days}-дневный прогноз для Key {location_key}: {forecasts}")
+        return forecasts
     except requests.exceptions.HTTPError as http_err:
         logger.error(f"HTTP ошибка при получении прогноза погоды: {http_err}")
         return []
@@ -121,6 +148,8 @@ def get_weather_forecast(location_key, days=1, api_key=API_KEY):
 
 def check_bad_weather(temperature, wind, precip_prob):
 
+    # Эталонная реализация правил: бот использует advisory_engine, собранный из advisory_rules.json,
+    # а эта функция остаётся для сверки (python -m Project3.weather_bot.weather.advisory bench)
     try:
         if temperature > 35:
             if wind > 20:
@@ -0,0 +1,260 @@
+# weather_bot/weather/async_api.py
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+
+import aiohttp
+
+try:
+    # Необязательная зависимость: orjson разбирает ответы API заметно быстрее стандартного json
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+from Project3.weather_bot.weather.api import API_KEY
+from Project3.weather_bot.weather.cache import (
+    FORECAST_SWR_TTL,
+    forecast_cache,
+    forecast_flight,
+    forecast_popularity,
+    forecast_ttl,
+    geocode_cache,
+    geocode_cache_key,
+    quantize_coords,
+)
+from Project3.weather_bot.weather.providers import ProvidersFailed, QuotaExhausted, create_backend
+from Project3.weather_bot.weather.quota import accuweather_quota
+
+logger = logging.getLogger(__name__)
+
+# Настройки пула соединений и таймаутов (секунды)
+HTTP_LIMIT = int(os.getenv('HTTP_LIMIT', '100'))
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', '10'))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', '5'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30'))
+
+# Режим получения прогноза:
+#   horizon — отдельный запрос на каждый горизонт (1 день — текущие условия);
+#   wide — один раз берётся самый длинный дневной прогноз, а 1/3/5 дней нарезаются локально.
+FORECAST_MODE = os.getenv('FORECAST_MODE', 'horizon')
+WIDE_FORECAST_DAYS = int(os.getenv('WIDE_FORECAST_DAYS', '5'))
+# В режиме wide: добавлять ли к первому дню текущие условия
+FORECAST_CURRENT_OVERLAY = os.getenv('FORECAST_CURRENT_OVERLAY', '0') == '1'
+
+
+class HttpClient:
+    """
+    Общая aiohttp-сессия с пулом keep-alive соединений.
+    Сессия создаётся лениво, внутри работающего event loop.
+    """
+
+    def __init__(self, limit=HTTP_LIMIT, limit_per_host=HTTP_LIMIT_PER_HOST,
+                 total_timeout=HTTP_TOTAL_TIMEOUT, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._lock = asyncio.Lock()
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=self.limit,
+                        limit_per_host=self.limit_per_host,
+                        keepalive_timeout=self.keepalive_timeout,
+                        ttl_dns_cache=300
+                    )
+                    self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+                    logger.debug("Создана HTTP-сессия с пулом соединений.")
+        return self._session
+
+    async def get_json(self, url, params=None, headers=None, timeout=None):
+        session = await self.get_session()
+        async with session.get(url, params=params, headers=headers, timeout=timeout) as response:
+            response.raise_for_status()
+            return await response.json(loads=json_loads, content_type=None)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.debug("HTTP-сессия закрыта.")
+        self._session = None
+
+
+http_client = HttpClient()
+weather_backend = create_backend(http_client)
+_background_tasks = set()
+
+# Локации, найденные резервным провайдером, кэшируются ненадолго, чтобы вскоре вернуться к основному
+FALLBACK_GEOCODE_TTL = float(os.getenv('FALLBACK_GEOCODE_TTL', '3600'))
+
+
+def _geocode_ttl(provider):
+    return None if provider is weather_backend.primary else FALLBACK_GEOCODE_TTL
+
+
+# Причины, по которым find_location не вернул локацию
+LOOKUP_NOT_FOUND = 'not_found'  # провайдер ответил, что такого города нет
+LOOKUP_QUOTA = 'quota_exhausted'  # все провайдеры пропустили запрос из-за квоты
+LOOKUP_FAILED = 'failed'  # ошибки провайдеров
+
+
+async def find_location(city_name, api_key=API_KEY, language='ru-RU'):
+    """(локация, None) или (None, причина) — одна из LOOKUP_*."""
+
+    cache_key = geocode_cache_key(city_name, language)
+    location = geocode_cache.get(cache_key)
+    if location is not None:
+        logger.debug(f"Местоположение '{city_name}' взято из кэша")
+        return location, None
+
+    try:
+        provider, location = await weather_backend.call('search_location', city_name, language, api_key=api_key)
+    except QuotaExhausted as e:
+        logger.error(f"Локация '{city_name}' не запрашивалась: квота исчерпана ({e})")
+        return None, LOOKUP_QUOTA
+    except ProvidersFailed as e:
+        logger.error(f"Ошибка при получении данных о локации '{city_name}': {e}")
+        return None, LOOKUP_FAILED
+    if location is None:
+        logger.warning(f"Город '{city_name}' не найден или нет координат.")
+        return None, LOOKUP_NOT_FOUND
+    logger.debug(f"Найдено местоположение: {location['city']} (Key: {location['key']}, {provider.name})")
+    geocode_cache.set(cache_key, location, ttl=_geocode_ttl(provider))
+    return location, None
+
+
+async def get_location_data(city_name, api_key=API_KEY, language='ru-RU'):
+    location, _ = await find_location(city_name, api_key, language)
+    return location
+
+
+async def get_location_by_coords(lat, lon, api_key=API_KEY, language='ru-RU'):
+
+    # Та же сетка, что и у кэша названий по координатам (REVERSE_GEOCODE_CELL)
+    cache_key = ('geo', *quantize_coords(lat, lon), language)
+    location = geocode_cache.get(cache_key)
+    if location is not None:
+        return location
+
+    try:
+        provider, location = await weather_backend.call('location_by_coords', lat, lon, language, api_key=api_key)
+    except ProvidersFailed as e:
+        logger.error(f"Ошибка при поиске локации по координатам ({lat}, {lon}): {e}")
+        return None
+    if location is None:
+        logger.warning(f"Не найдено местоположение по координатам ({lat}, {lon}).")
+        return None
+    geocode_cache.set(cache_key, location, ttl=_geocode_ttl(provider))
+    return location
+
+
+async def get_weather_forecast(location_key, days=1, api_key=API_KEY, coords=None, language='ru-RU'):
+    """
+    Прогноз на days дней для ключа локации. coords (lat, lon) позволяют обратиться
+    к провайдерам, которые работают по координатам, а не по ключу AccuWeather.
+    Описания погоды и рекомендации — на языке language, поэтому он входит в ключ кэша.
+    """
+    if days == 1 and accuweather_quota.near_limit():
+        # Текущие условия — второстепенный запрос: при нехватке квоты отдаём первый день уже известного прогноза
+        for cached_days in (WIDE_FORECAST_DAYS, 5, 3):
+            daily = forecast_cache.get_stale((location_key, cached_days, language))
+            if daily:
+                logger.info(f"Квота на исходе: текущие условия для Key {location_key} взяты из {cached_days}-дневного прогноза")
+                return daily[:1]
+    if FORECAST_MODE == 'wide' and days <= WIDE_FORECAST_DAYS:
+        return await get_wide_forecast_view(location_key, days, api_key, coords, language)
+    return await get_cached_forecast(location_key, days, api_key, coords=coords, language=language)
+
+
+async def get_wide_forecast_view(location_key, days, api_key=API_KEY, coords=None, language='ru-RU'):
+    """
+    Нарезает прогноз на days дней из одного закэшированного WIDE_FORECAST_DAYS-дневного прогноза.
+    """
+    forecast = await get_cached_forecast(location_key, WIDE_FORECAST_DAYS, api_key, coords=coords, language=language)
+    view = forecast[:days]
+    if FORECAST_CURRENT_OVERLAY and view:
+        current = await get_cached_forecast(location_key, 1, api_key, optional=True, coords=coords, language=language)
+        if current:
+            first_day = dataclasses.replace(view[0], current_temp=current[0].max_temp,
+                                            current_text=current[0].weather_text_day)
+            view = [first_day] + view[1:]
+    return view
+
+
+async def get_cached_forecast(location_key, days, api_key=API_KEY, optional=False, coords=None, language='ru-RU'):
+
+    cache_key = (location_key, days, language)
+    # Координаты нужны фоновому обновлению, чтобы при нехватке квоты AccuWeather обратиться к резервному провайдеру
+    forecast_popularity.record(cache_key, coords)
+    forecast = forecast_cache.get(cache_key)
+    if forecast is not None:
+        logger.debug(f"Прогноз для Key {location_key} на {days} дн. взят из кэша")
+        return forecast
+    # Недавно истёкший прогноз отдаём сразу, а свежий запрашиваем в фоне
+    forecast = forecast_cache.get_stale(cache_key, max_age=FORECAST_SWR_TTL)
+    if forecast is not None:
+        logger.debug(f"Прогноз для Key {location_key} на {days} дн. устарел, обновляется в фоне")
+        task = asyncio.ensure_future(refresh_forecast(location_key, days, language, api_key, coords))
+        # Держим ссылку, чтобы фоновая задача не была собрана сборщиком мусора до завершения
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return forecast
+    if accuweather_quota.near_limit():
+        # При нехватке квоты устаревший прогноз лучше, чем ещё один запрос
+        forecast = forecast_cache.get_stale(cache_key)
+        if forecast is not None:
+            logger.info(f"Квота на исходе: прогноз для Key {location_key} на {days} дн. взят из устаревшего кэша")
+            return forecast
+    # Одновременные запросы одного и того же прогноза выполняются одним вызовом
+    return await forecast_flight.do(
+        cache_key, lambda: _fetch_weather_forecast(location_key, days, api_key, optional, coords, language)
+    )
+
+
+async def refresh_forecast(location_key, days, language='ru-RU', api_key=API_KEY, coords=None):
+    """
+    Обновляет запись кэша прогноза, не дожидаясь запроса пользователя.
+    Аргументы повторяют ключ кэша (location_key, days, language).
+    Фоновое обновление второстепенно: при нехватке квоты оно не выполняется.
+    """
+    return await forecast_flight.do(
+        (location_key, days, language),
+        lambda: _fetch_weather_forecast(location_key, days, api_key, True, coords, language)
+    )
+
+
+def _stale_forecast(location_key, days, language):
+    forecast = forecast_cache.get_stale((location_key, days, language))
+    if forecast:
+        logger.info(f"Для Key {location_key} на {days} дн. отдан устаревший прогноз из кэша")
+        return forecast
+    return []
+
+
+async def _fetch_weather_forecast(location_key, days, api_key, optional=False, coords=None, language='ru-RU'):
+
+    try:
+        provider, forecast = await weather_backend.call(
+            'forecast', location_key, days, coords=coords, api_key=api_key, optional=optional, language=language
+        )
+    except ProvidersFailed as e:
+        logger.error(f"Ошибка при получении прогноза погоды для Key {location_key}: {e}")
+        return _stale_forecast(location_key, days, language)
+    logger.debug(f"Получен прогноз на {days} дн. для Key {location_key} от {provider.name}: {forecast}")
+    if forecast:
+        forecast_cache.set((location_key, days, language), forecast, ttl=forecast_ttl(days))
+    return forecast
+
+
+async def close_http_client():
+    await http_client.close()
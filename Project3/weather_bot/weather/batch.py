@@ -0,0 +1,323 @@
+# weather_bot/weather/batch.py
+"""
+Пакетный прогноз погоды для множества маршрутов без Telegram.
+
+Маршруты читаются из CSV (колонки id, start, end, stops, days; промежуточные точки
+в stops разделяются «;») или из JSONL с теми же полями (stops — список или строка).
+Каждый уникальный город геокодируется один раз, каждый уникальный прогноз
+(локация, число дней) запрашивается один раз для всех маршрутов; одновременных
+запросов к API не больше concurrency. Результаты выводятся в JSONL по мере готовности
+маршрутов. Точки без прогноза получают код ошибки в поле error (not_found, no_data, failed).
+
+У пакетного режима свои провайдеры и бюджет AccuWeather (BATCH_PROVIDERS, BATCH_DAILY_BUDGET,
+BATCH_MINUTE_BUDGET, BATCH_QUOTA_DB) и по умолчанию нет хеджирования. С отдельным ключом
+(BATCH_API_KEY) квота полностью своя; без него прогон идёт по ключу бота, и каждый запрос
+списывается ещё и из квоты бота как второстепенный, чтобы вместе они не превысили лимит ключа.
+Параметры можно переопределить ключами командной строки.
+
+    python -m Project3.weather_bot.weather.batch routes.csv --days 3 --output forecasts.jsonl
+    python -m Project3.weather_bot.weather.batch routes.jsonl --charts charts/ --concurrency 8 --language en-US
+    python -m Project3.weather_bot.weather.batch routes.csv --providers accuweather,open-meteo --daily-budget 200
+
+Для прогона без настоящего AccuWeather укажите адрес локального сервера в ACCUWEATHER_BASE_URL.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import List
+
+from Project3.weather_bot.weather.advisory import advisory_engine
+from Project3.weather_bot.weather.api import API_KEY
+from Project3.weather_bot.weather.async_api import FALLBACK_GEOCODE_TTL, HttpClient
+from Project3.weather_bot.weather.cache import SQLiteStore, geocode_cache, geocode_cache_key, normalize_city_name
+from Project3.weather_bot.weather.models import LocationForecast
+from Project3.weather_bot.weather.providers import AccuWeatherProvider, create_backend
+from Project3.weather_bot.weather.quota import QuotaManager, SharedQuota, accuweather_quota
+from Project3.weather_bot.weather.route import ERROR_FAILED
+
+logger = logging.getLogger(__name__)
+
+# Одновременных запросов к API погоды в пакетном режиме
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+# Провайдеры и квота пакетного режима — отдельно от бота
+BATCH_PROVIDERS = os.getenv('BATCH_PROVIDERS', 'accuweather')
+BATCH_HEDGE = os.getenv('BATCH_HEDGE', '0') == '1'
+# Отдельный ключ AccuWeather; не задан — используется ключ бота и его квота
+BATCH_API_KEY = os.getenv('BATCH_API_KEY')
+BATCH_DAILY_BUDGET = int(os.getenv('BATCH_DAILY_BUDGET', '25'))
+BATCH_MINUTE_BUDGET = int(os.getenv('BATCH_MINUTE_BUDGET', '0'))
+BATCH_QUOTA_DB = os.getenv('BATCH_QUOTA_DB')
+FORECAST_DAYS = (1, 3, 5)
+
+# Коды ошибок точки в выходном JSONL, в дополнение к route.ERROR_FAILED
+ERROR_NOT_FOUND = 'not_found'
+ERROR_NO_DATA = 'no_data'
+
+
+@dataclass
+class BatchRoute:
+    __slots__ = ('id', 'points', 'days')
+    id: str
+    points: List[str]  # названия городов: начало, промежуточные точки, конец
+    days: int
+
+
+def _route_from_row(row, line_no, default_days):
+    stops = row.get('stops') or []
+    if isinstance(stops, str):
+        stops = stops.split(';')
+    points = [row.get('start')] + list(stops) + [row.get('end')]
+    points = [str(point).strip() for point in points if point and str(point).strip()]
+    if len(points) < 2:
+        raise ValueError(f"Строка {line_no}: у маршрута должны быть start и end")
+    days = int(row.get('days') or default_days)
+    if days not in FORECAST_DAYS:
+        raise ValueError(f"Строка {line_no}: число дней должно быть одним из {FORECAST_DAYS}, получено {days}")
+    return BatchRoute(str(row.get('id') or line_no), points, days)
+
+
+def read_routes(path, default_days=1, fmt=None):
+    """Маршруты из CSV или JSONL; формат определяется по расширению, '-' — стандартный ввод."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            rows = enumerate(csv.DictReader(stream), start=2)
+        else:
+            rows = ((line_no, json.loads(line)) for line_no, line in enumerate(stream, start=1) if line.strip())
+        return [_route_from_row(row, line_no, default_days) for line_no, row in rows]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _day_record(day, advice):
+    record = day.to_dict()
+    record['date'] = day.date.isoformat()
+    record['advice'] = advice
+    return record
+
+
+def route_record(route, points, charts=None, language=None):
+    """Запись JSONL для маршрута: точки с прогнозом и рекомендациями на каждый день."""
+    advice = advisory_engine.advise_route(points, language)
+    record = {
+        'id': route.id,
+        'days': route.days,
+        'ok': all(point.error is None for point in points),
+        'points': [
+            {
+                'query': query,
+                'city': point.city,
+                'lat': point.lat,
+                'lon': point.lon,
+                'error': point.error,
+                'forecast': [_day_record(day, text) for day, text in zip(point.forecast, point_advice)]
+            }
+            for query, point, point_advice in zip(route.points, points, advice)
+        ]
+    }
+    if charts is not None:
+        record['charts'] = charts
+    return record
+
+
+def _chart_filename(city, key):
+    safe_city = re.sub(r'[^\w-]+', '_', city)
+    return f"{safe_city}_{key[:12]}.png"
+
+
+def create_batch_backend(http_client, providers=BATCH_PROVIDERS, hedge=BATCH_HEDGE, daily_budget=BATCH_DAILY_BUDGET,
+                         minute_budget=BATCH_MINUTE_BUDGET, api_key=None):
+    """
+    Бэкенд пакетного режима с собственным бюджетом AccuWeather (без резерва: все запросы основные).
+    Без отдельного api_key бюджет выделяется из квоты бота (accuweather_quota).
+    """
+    quota = QuotaManager(
+        daily_budget=daily_budget,
+        minute_budget=minute_budget,
+        reserve=0,
+        store=SQLiteStore(BATCH_QUOTA_DB, table='batch_quota') if BATCH_QUOTA_DB else None,
+        name='batch'
+    )
+    if not api_key or api_key == API_KEY:
+        quota = SharedQuota(accuweather_quota, quota)
+        api_key = API_KEY
+    return create_backend(http_client, providers, hedge=hedge, quota=quota, api_key=api_key)
+
+
+class BatchRunner:
+    """
+    Получает прогнозы для многих маршрутов сразу через собственный backend. Геокодирование,
+    прогнозы и графики запускаются по одному разу на уникальный ключ; маршруты ждут общие задачи.
+    Найденные локации берутся из общего кэша геокодирования и пополняют его.
+    """
+
+    def __init__(self, backend, concurrency=BATCH_CONCURRENCY, charts_dir=None, language='ru-RU'):
+        self.backend = backend
+        self.charts_dir = charts_dir
+        self.language = language
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._locations = {}
+        self._forecasts = {}
+        self._charts = {}
+        self.stats = Counter()
+
+    @staticmethod
+    def _once(tasks, key, factory):
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(factory())
+        return task
+
+    async def _resolve(self, city):
+        cache_key = geocode_cache_key(city, self.language)
+        location = geocode_cache.get(cache_key)
+        if location is not None:
+            return location
+        async with self._semaphore:
+            self.stats['geocoded'] += 1
+            provider, location = await self.backend.call('search_location', city, self.language)
+        if location is not None:
+            ttl = None if provider is self.backend.primary else FALLBACK_GEOCODE_TTL
+            geocode_cache.set(cache_key, location, ttl=ttl)
+        return location
+
+    async def _fetch(self, location, days):
+        async with self._semaphore:
+            self.stats['forecasts'] += 1
+            _, forecast = await self.backend.call('forecast', location['key'], days,
+                                                  coords=(location['lat'], location['lon']), language=self.language)
+        return forecast
+
+    async def _stop(self, query, days):
+        try:
+            location = await self._once(self._locations, normalize_city_name(query), lambda: self._resolve(query))
+            if location is None:
+                return LocationForecast(query, [], None, None, ERROR_NOT_FOUND)
+            forecast = await self._once(self._forecasts, (location['key'], days),
+                                        lambda: self._fetch(location, days))
+        except Exception as e:
+            logger.error(f"Ошибка при получении прогноза для '{query}': {e}")
+            return LocationForecast(query, [], None, None, ERROR_FAILED)
+        return LocationForecast(location['city'], forecast, location['lat'], location['lon'],
+                                None if forecast else ERROR_NO_DATA)
+
+    async def _chart(self, point):
+        if not point.forecast:
+            return None
+        # Импорт здесь: без --charts пакетному режиму не нужны Plotly и пул процессов
+        from Project3.weather_bot.bot.messages import chart_labels
+        from Project3.weather_bot.charts.chart_cache import chart_cache_key
+        from Project3.weather_bot.charts.chart_generator import generate_weather_chart
+
+        labels = chart_labels(point.city, self.language)
+        key = chart_cache_key(point.city, point.forecast, labels)
+
+        async def render():
+            png = await generate_weather_chart(point.city, point.forecast, labels)
+            if not png:
+                return None
+            path = os.path.join(self.charts_dir, _chart_filename(point.city, key))
+            with open(path, 'wb') as f:
+                f.write(png)
+            self.stats['charts'] += 1
+            return path
+
+        return await self._once(self._charts, key, render)
+
+    async def run_route(self, route):
+        points = await asyncio.gather(*[self._stop(query, route.days) for query in route.points])
+        charts = None
+        if self.charts_dir:
+            charts = await asyncio.gather(*[self._chart(point) for point in points])
+        self.stats['routes'] += 1
+        if not all(point.error is None for point in points):
+            self.stats['failed_routes'] += 1
+        return route_record(route, points, charts, self.language)
+
+    async def iter_records(self, routes):
+        """Записи маршрутов по мере готовности (порядок может отличаться от входного)."""
+        if self.charts_dir:
+            os.makedirs(self.charts_dir, exist_ok=True)
+        tasks = [asyncio.ensure_future(self.run_route(route)) for route in routes]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def run_batch(routes, output, backend, concurrency=BATCH_CONCURRENCY, charts_dir=None, language='ru-RU'):
+    """Пишет JSONL с прогнозами маршрутов в output (текстовый поток); возвращает статистику."""
+    runner = BatchRunner(backend, concurrency, charts_dir, language)
+    async for record in runner.iter_records(routes):
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+    return dict(runner.stats)
+
+
+async def _main(args):
+    routes = read_routes(args.input, args.days, args.format)
+    started_at = time.monotonic()
+    http_client = HttpClient()
+    backend = create_batch_backend(http_client, args.providers, args.hedge, args.daily_budget, args.minute_budget,
+                                   BATCH_API_KEY)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        stats = await run_batch(routes, output, backend, args.concurrency, args.charts, args.language)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await http_client.close()
+        if args.charts:
+            from Project3.weather_bot.charts.chart_generator import shutdown_chart_workers
+            shutdown_chart_workers()
+    unique = len({normalize_city_name(point) for route in routes for point in route.points})
+    logger.info(f"Маршрутов: {len(routes)}, уникальных городов: {unique}, статистика: {stats}, "
+                f"время: {time.monotonic() - started_at:.2f} сек.")
+    logger.info(f"Провайдеры: {backend.stats()}")
+    if isinstance(backend.primary, AccuWeatherProvider):
+        logger.info(f"Квота AccuWeather: {backend.primary.quota.stats()}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный прогноз погоды для маршрутов из CSV/JSONL")
+    parser.add_argument('input', help="Файл маршрутов (.csv или .jsonl), '-' — стандартный ввод")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="Формат входа, если его не видно по расширению")
+    parser.add_argument('--output', default='-', help="Файл JSONL с результатами, по умолчанию стандартный вывод")
+    parser.add_argument('--days', type=int, default=1, choices=FORECAST_DAYS,
+                        help="Дней прогноза для маршрутов без колонки days")
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument('--charts', help="Каталог для PNG-графиков точек маршрутов")
+    parser.add_argument('--language', default='ru-RU',
+                        help="Язык названий городов, описаний погоды, рекомендаций и подписей графиков")
+    parser.add_argument('--providers', default=BATCH_PROVIDERS,
+                        help="Провайдеры прогноза через запятую: первый — основной, остальные — резервные")
+    parser.add_argument('--hedge', action='store_true', default=BATCH_HEDGE,
+                        help="Дублировать медленные запросы резервному провайдеру")
+    parser.add_argument('--daily-budget', type=int, default=BATCH_DAILY_BUDGET,
+                        help="Суточный бюджет запросов к AccuWeather для пакетного режима")
+    parser.add_argument('--minute-budget', type=int, default=BATCH_MINUTE_BUDGET,
+                        help="Поминутный бюджет запросов к AccuWeather (0 — без ограничения)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    return asyncio.run(_main(parse_args(argv)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# weather_bot/weather/cache.py
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Кэш геокодирования: ключи городов практически не меняются, поэтому TTL большой
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', '2048'))
+GEOCODE_CACHE_TTL = float(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))
+GEOCODE_CACHE_DB = os.getenv('GEOCODE_CACHE_DB')  # путь к SQLite-файлу; не задан — только память
+# Размер ячейки сетки в градусах для кэшей обратного геокодирования: 0.01° ≈ 1 км по широте
+REVERSE_GEOCODE_CELL = float(os.getenv('REVERSE_GEOCODE_CELL', '0.01'))
+
+# Кэш прогнозов: TTL соответствует частоте обновления данных у AccuWeather
+FORECAST_CACHE_SIZE = int(os.getenv('FORECAST_CACHE_SIZE', '1024'))
+FORECAST_CURRENT_TTL = float(os.getenv('FORECAST_CURRENT_TTL', '600'))  # текущие условия
+FORECAST_DAILY_TTL = float(os.getenv('FORECAST_DAILY_TTL', '3600'))  # дневной прогноз
+# Сколько ещё хранить устаревший прогноз на случай исчерпания квоты или ошибок API
+FORECAST_STALE_TTL = float(os.getenv('FORECAST_STALE_TTL', str(6 * 3600)))
+# Прогноз, истёкший не более этого времени назад, отдаётся сразу и обновляется в фоне
+FORECAST_SWR_TTL = float(os.getenv('FORECAST_SWR_TTL', '900'))
+
+
+class SQLiteStore:
+    """
+    Постоянное хранилище записей кэша в SQLite (ключ -> JSON-значение).
+    Используется как второй уровень под TTLCache, чтобы кэш переживал перезапуск.
+    """
+
+    def __init__(self, path, table='cache'):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} '
+            f'(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def purge_expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            cursor = self._conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """
+    LRU-кэш в памяти с временем жизни записей и счётчиками попаданий/промахов.
+    При наличии store промахи памяти проверяются в постоянном хранилище.
+    Истёкшие записи ещё stale_ttl секунд доступны через get_stale().
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, store=None, name='cache', stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.name = name
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._data = OrderedDict()  # ключ -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _store_key(key):
+        return json.dumps(key, ensure_ascii=False)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if expires_at + self.stale_ttl <= now:
+                    del self._data[key]
+
+        if self.store is not None:
+            try:
+                stored = self.store.get(self._store_key(key))
+            except Exception as e:
+                logger.error(f"Ошибка чтения постоянного кэша {self.name}: {e}")
+                stored = None
+            if stored is not None and stored[1] > now:
+                value, expires_at = stored
+                with self._lock:
+                    self._put(key, value, expires_at)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def get_stale(self, key, default=None, max_age=None):
+        """Значение, даже если его срок истёк, но не более max_age (по умолчанию stale_ttl) секунд назад."""
+        now = time.time()
+        max_age = self.stale_ttl if max_age is None else min(max_age, self.stale_ttl)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] + max_age > now:
+                self.stale_hits += 1
+                return entry[1]
+
+        if self.store is not None:
+            try:
+                stored = self.store.get(self._store_key(key))
+            except Exception as e:
+                logger.error(f"Ошибка чтения постоянного кэша {self.name}: {e}")
+                stored = None
+            if stored is not None and stored[1] + max_age > now:
+                with self._lock:
+                    self.stale_hits += 1
+                return stored[0]
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._put(key, value, expires_at)
+        if self.store is not None:
+            try:
+                self.store.set(self._store_key(key), value, expires_at)
+            except Exception as e:
+                logger.error(f"Ошибка записи постоянного кэша {self.name}: {e}")
+
+    def ttl_remaining(self, key):
+        """Сколько секунд осталось жить записи в памяти (отрицательное — уже устарела); None — записи нет."""
+        with self._lock:
+            entry = self._data.get(key)
+        return None if entry is None else entry[0] - time.time()
+
+    def _put(self, key, value, expires_at):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self._store_key(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+class SingleFlight:
+    """
+    Объединение одновременных запросов: пока выполняется вызов для ключа,
+    остальные вызывающие ждут его результат вместо повторного запроса.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # помечаем исключение как обработанное
+
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'inflight': len(self._inflight)}
+
+
+class PopularityTracker:
+    """
+    Частота обращений к ключам с экспоненциальным затуханием: decay() уменьшает все
+    счётчики, поэтому популярными остаются ключи, к которым обращались недавно.
+    """
+
+    def __init__(self, factor=0.9, maxsize=10000):
+        self.factor = factor
+        self.maxsize = maxsize
+        self._scores = {}
+        self._context = {}
+
+    def record(self, key, context=None):
+        """Засчитывает обращение к key; context (например, координаты локации) хранится вместе с ключом."""
+        self._scores[key] = self._scores.get(key, 0.0) + 1.0
+        if context is not None:
+            self._context[key] = context
+        if len(self._scores) > self.maxsize:
+            evicted = min(self._scores, key=self._scores.get)
+            del self._scores[evicted]
+            self._context.pop(evicted, None)
+
+    def context(self, key):
+        return self._context.get(key)
+
+    def decay(self):
+        self._scores = {key: score * self.factor for key, score in self._scores.items() if score * self.factor >= 0.01}
+        self._context = {key: context for key, context in self._context.items() if key in self._scores}
+
+    def top(self, n):
+        return heapq.nlargest(n, self._scores.items(), key=lambda item: item[1])
+
+    def __len__(self):
+        return len(self._scores)
+
+
+def normalize_city_name(city_name):
+    return ' '.join(city_name.split()).casefold().replace('ё', 'е')
+
+
+def geocode_cache_key(city_name, language):
+    return normalize_city_name(city_name), language
+
+
+def quantize_coords(lat, lon, cell=REVERSE_GEOCODE_CELL):
+    # Соседние точки попадают в одну ячейку и, значит, в одну запись кэша
+    return round(lat / cell), round(lon / cell)
+
+
+geocode_cache = TTLCache(
+    maxsize=GEOCODE_CACHE_SIZE,
+    ttl=GEOCODE_CACHE_TTL,
+    store=SQLiteStore(GEOCODE_CACHE_DB, table='geocode') if GEOCODE_CACHE_DB else None,
+    name='geocode'
+)
+
+
+def forecast_ttl(days):
+    return FORECAST_CURRENT_TTL if days == 1 else FORECAST_DAILY_TTL
+
+
+forecast_cache = TTLCache(maxsize=FORECAST_CACHE_SIZE, ttl=FORECAST_DAILY_TTL, name='forecast',
+                          stale_ttl=FORECAST_STALE_TTL)
+forecast_flight = SingleFlight()
+forecast_popularity = PopularityTracker()
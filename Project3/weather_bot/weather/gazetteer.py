@@ -0,0 +1,254 @@
+# weather_bot/weather/gazetteer.py
+"""
+Офлайн-справочник городов для мгновенного обратного геокодирования.
+
+CSV-файл (name, lat, lon, population) собирается в компактный бинарный индекс:
+города разложены по ячейкам сетки, ячейки отсортированы, поэтому файл можно
+отобразить в память (mmap) без разбора и искать ближайший город бинарным поиском.
+
+Сборка и проверка индекса:
+
+    python -m Project3.weather_bot.weather.gazetteer build cities.csv cities.gaz --cell 0.5
+    python -m Project3.weather_bot.weather.gazetteer query cities.gaz 52.61 39.59
+"""
+
+import argparse
+import bisect
+import csv
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH')
+# Максимальное расстояние до ближайшего города, при котором ответ считается верным, км
+GAZETTEER_MAX_DISTANCE_KM = float(os.getenv('GAZETTEER_MAX_DISTANCE_KM', '25'))
+
+MAGIC = b'WBGZ'
+VERSION = 1
+# magic, version, cell (градусы), число городов, число ячеек, размер блока названий
+HEADER = struct.Struct('<4sIdIII')
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def _cell_id(lat_idx, lon_idx):
+    # Две знаковые 32-битные координаты ячейки упаковываются в один int64
+    return (lat_idx << 32) | (lon_idx & 0xFFFFFFFF)
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    # Разность долгот через антимеридиан: 179.9 и -179.9 отстоят на 0.2°, а не на 359.8°
+    dlmb = math.radians((lon2 - lon1 + 180) % 360 - 180)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def read_cities_csv(path, min_population=0):
+
+    cities = []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                population = int(float(row.get('population') or 0))
+                if population < min_population:
+                    continue
+                cities.append((row['name'].strip(), float(row['lat']), float(row['lon']), population))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Строка справочника пропущена ({e}): {row}")
+    return cities
+
+
+def build_index(cities, output_path, cell=0.5):
+    """
+    Записывает бинарный индекс. Разметка файла (little-endian, секции выровнены по 8 байт):
+    заголовок, id ячеек (int64), смещения ячеек (uint32, ncells + 1),
+    широты и долготы (float32), население (uint32), смещения названий (uint32, count + 1),
+    названия в UTF-8.
+    """
+    def cell_of(city):
+        return _cell_id(math.floor(city[1] / cell), math.floor(city[2] / cell))
+
+    cities = sorted(cities, key=lambda city: (cell_of(city), -city[3]))
+    cell_ids = []
+    cell_offsets = []
+    for idx, city in enumerate(cities):
+        cid = cell_of(city)
+        if not cell_ids or cell_ids[-1] != cid:
+            cell_ids.append(cid)
+            cell_offsets.append(idx)
+    cell_offsets.append(len(cities))
+
+    names = bytearray()
+    name_offsets = [0]
+    for city in cities:
+        names += city[0].encode('utf-8')
+        name_offsets.append(len(names))
+
+    count = len(cities)
+    sections = [
+        struct.pack(f'<{len(cell_ids)}q', *cell_ids),
+        struct.pack(f'<{len(cell_offsets)}I', *cell_offsets),
+        struct.pack(f'<{count}f', *(city[1] for city in cities)),
+        struct.pack(f'<{count}f', *(city[2] for city in cities)),
+        struct.pack(f'<{count}I', *(min(city[3], 0xFFFFFFFF) for city in cities)),
+        struct.pack(f'<{count + 1}I', *name_offsets),
+        bytes(names),
+    ]
+    with open(output_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, cell, count, len(cell_ids), len(names)))
+        position = HEADER.size
+        for section in sections:
+            padding = _align(position) - position
+            f.write(b'\0' * padding)
+            f.write(section)
+            position += padding + len(section)
+    logger.info(f"Справочник городов записан в {output_path}: {count} городов, {len(cell_ids)} ячеек")
+    return count
+
+
+class Gazetteer:
+    """Индекс городов, отображённый в память; поиск ближайшего города по координатам."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.cell, self.count, ncells, names_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Неподдерживаемый формат справочника городов: {path}")
+
+        view = memoryview(self._mmap)
+        position = HEADER.size
+
+        def section(length, fmt):
+            nonlocal position
+            position = _align(position)
+            part = view[position:position + length]
+            position += length
+            return part.cast(fmt) if fmt else part
+
+        self._cell_ids = section(ncells * 8, 'q')
+        self._cell_offsets = section((ncells + 1) * 4, 'I')
+        self._lats = section(self.count * 4, 'f')
+        self._lons = section(self.count * 4, 'f')
+        self._populations = section(self.count * 4, 'I')
+        self._name_offsets = section((self.count + 1) * 4, 'I')
+        self._names = section(names_size, None)
+
+    def __len__(self):
+        return self.count
+
+    def _name(self, idx):
+        return bytes(self._names[self._name_offsets[idx]:self._name_offsets[idx + 1]]).decode('utf-8')
+
+    def _wrap_lon_idx(self, lon_idx):
+        # Индекс ячейки за ±180° переводится в ячейку по другую сторону антимеридиана
+        lon = ((lon_idx + 0.5) * self.cell + 180) % 360 - 180
+        return math.floor(lon / self.cell)
+
+    def _cell_range(self, lat_idx, lon_idx):
+        cid = _cell_id(lat_idx, lon_idx)
+        pos = bisect.bisect_left(self._cell_ids, cid)
+        if pos < len(self._cell_ids) and self._cell_ids[pos] == cid:
+            return self._cell_offsets[pos], self._cell_offsets[pos + 1]
+        return 0, 0
+
+    def nearest(self, lat, lon, max_distance_km=GAZETTEER_MAX_DISTANCE_KM):
+        """Ближайший город не дальше max_distance_km: {'city', 'lat', 'lon', 'population', 'distance_km'}."""
+        cell = self.cell
+        lat_idx = math.floor(lat / cell)
+        lon_idx = math.floor(lon / cell)
+        lat_radius = math.ceil(max_distance_km / (KM_PER_DEGREE * cell))
+        # Ячейки по долготе сужаются к полюсам — расширяем окно поиска
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        lon_radius = min(math.ceil(lat_radius / cos_lat), math.ceil(180 / cell))
+
+        lon_cells = {self._wrap_lon_idx(j) for j in range(lon_idx - lon_radius, lon_idx + lon_radius + 1)}
+
+        best_idx = None
+        best_distance = max_distance_km
+        for i in range(lat_idx - lat_radius, lat_idx + lat_radius + 1):
+            for j in lon_cells:
+                start, end = self._cell_range(i, j)
+                for idx in range(start, end):
+                    distance = haversine_km(lat, lon, self._lats[idx], self._lons[idx])
+                    if distance <= best_distance:
+                        best_idx, best_distance = idx, distance
+        if best_idx is None:
+            return None
+        return {
+            'city': self._name(best_idx),
+            'lat': self._lats[best_idx],
+            'lon': self._lons[best_idx],
+            'population': self._populations[best_idx],
+            'distance_km': round(best_distance, 2)
+        }
+
+    def close(self):
+        for part in (self._cell_ids, self._cell_offsets, self._lats, self._lons,
+                     self._populations, self._name_offsets, self._names):
+            part.release()
+        self._mmap.close()
+        self._file.close()
+
+
+_gazetteer = None
+# Справочник не открылся: повторные попытки до перезапуска не делаются
+_UNAVAILABLE = object()
+
+
+def get_gazetteer():
+    """Лениво открывает справочник из GAZETTEER_PATH; None, если он не задан или не читается."""
+    global _gazetteer
+    if _gazetteer is None and GAZETTEER_PATH:
+        try:
+            _gazetteer = Gazetteer(GAZETTEER_PATH)
+            logger.info(f"Загружен справочник городов {GAZETTEER_PATH}: {len(_gazetteer)} городов")
+        except Exception as e:
+            logger.error(f"Не удалось загрузить справочник городов {GAZETTEER_PATH}, он отключён до перезапуска: {e}")
+            _gazetteer = _UNAVAILABLE
+    return None if _gazetteer is _UNAVAILABLE else _gazetteer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-справочник городов для обратного геокодирования")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Собрать индекс из CSV (name, lat, lon, population)")
+    build.add_argument('csv_path')
+    build.add_argument('output_path')
+    build.add_argument('--cell', type=float, default=0.5, help="Размер ячейки сетки, градусы")
+    build.add_argument('--min-population', type=int, default=0)
+
+    query = commands.add_parser('query', help="Найти ближайший город")
+    query.add_argument('index_path')
+    query.add_argument('lat', type=float)
+    query.add_argument('lon', type=float)
+    query.add_argument('--max-distance', type=float, default=GAZETTEER_MAX_DISTANCE_KM)
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        cities = read_cities_csv(args.csv_path, args.min_population)
+        count = build_index(cities, args.output_path, args.cell)
+        print(f"{count} городов записано в {args.output_path}")
+    else:
+        gazetteer = Gazetteer(args.index_path)
+        print(gazetteer.nearest(args.lat, args.lon, args.max_distance))
+        gazetteer.close()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
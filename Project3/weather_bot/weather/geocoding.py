@@ -0,0 +1,101 @@
+# weather_bot/weather/geocoding.py
+
+import logging
+import os
+
+import aiohttp
+
+from Project3.weather_bot.weather.async_api import get_location_by_coords, get_location_data, http_client
+from Project3.weather_bot.weather.cache import SingleFlight, SQLiteStore, TTLCache, quantize_coords
+from Project3.weather_bot.weather.gazetteer import get_gazetteer
+from Project3.weather_bot.weather.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/reverse')
+# Политика Nominatim — не более одного запроса в секунду
+NOMINATIM_RATE = float(os.getenv('NOMINATIM_RATE', '1'))
+NOMINATIM_BURST = float(os.getenv('NOMINATIM_BURST', '1'))
+
+REVERSE_GEOCODE_CACHE_SIZE = int(os.getenv('REVERSE_GEOCODE_CACHE_SIZE', '4096'))
+REVERSE_GEOCODE_CACHE_TTL = float(os.getenv('REVERSE_GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))
+REVERSE_GEOCODE_CACHE_DB = os.getenv('REVERSE_GEOCODE_CACHE_DB')
+
+reverse_geocode_cache = TTLCache(
+    maxsize=REVERSE_GEOCODE_CACHE_SIZE,
+    ttl=REVERSE_GEOCODE_CACHE_TTL,
+    store=SQLiteStore(REVERSE_GEOCODE_CACHE_DB, table='reverse_geocode') if REVERSE_GEOCODE_CACHE_DB else None,
+    name='reverse_geocode'
+)
+nominatim_bucket = TokenBucket(NOMINATIM_RATE, NOMINATIM_BURST)
+reverse_geocode_flight = SingleFlight()
+
+
+async def get_location_from_coords(lat, lon):
+
+    # Сначала офлайн-справочник: без сетевых запросов
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        match = gazetteer.nearest(lat, lon)
+        if match:
+            logger.debug(f"Обратное геокодирование по справочнику: {match['city']} ({match['distance_km']} км)")
+            return {'city': match['city'], 'lat': lat, 'lon': lon}
+
+    cell_key = quantize_coords(lat, lon)
+    cached = reverse_geocode_cache.get(cell_key)
+    if cached is not None:
+        logger.debug(f"Обратное геокодирование для ({lat}, {lon}) взято из кэша")
+        return {'city': cached['city'], 'lat': lat, 'lon': lon}
+
+    city = await reverse_geocode_flight.do(cell_key, lambda: _fetch_city_name(lat, lon))
+    if city:
+        reverse_geocode_cache.set(cell_key, {'city': city})
+        return {'city': city, 'lat': lat, 'lon': lon}
+    return None
+
+
+async def _fetch_city_name(lat, lon):
+
+    try:
+        # Всплески запросов ждут своей очереди, а не упираются в лимит Nominatim
+        await nominatim_bucket.acquire()
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'format': 'json',
+            'language': 'ru'
+        }
+        headers = {
+            'User-Agent': 'WeatherBot/1.0'
+        }
+        data = await http_client.get_json(NOMINATIM_URL, params=params, headers=headers,
+                                          timeout=aiohttp.ClientTimeout(total=10))
+        address = data.get('address', {})
+        city = address.get('city') or address.get('town') or address.get('village')
+        if city:
+            logger.debug(f"Обратное геокодирование: найдена город {city} по координатам ({lat}, {lon})")
+            return city
+        logger.warning(f"Не удалось выполнить обратное геокодирование для координат ({lat}, {lon})")
+        return None
+    except aiohttp.ClientResponseError as http_err:
+        logger.warning(f"Не удалось выполнить обратное геокодирование для координат ({lat}, {lon}): {http_err}")
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка при обратном геокодировании: {e}")
+        return None
+
+
+async def resolve_coords(lat, lon, language='ru-RU'):
+    """
+    Точка маршрута по координатам: название города и ключ AccuWeather.
+    Сначала название из справочника/Nominatim и ключ по названию (обычно из кэша),
+    иначе — поиск AccuWeather по координатам.
+    """
+    location = await get_location_from_coords(lat, lon)
+    loc_data = await get_location_data(location['city'], language=language) if location else None
+    if loc_data is None:
+        loc_data = await get_location_by_coords(lat, lon, language=language)
+    if loc_data is None:
+        return None
+    city = location['city'] if location else loc_data['city']
+    return {'city': city, 'key': loc_data['key'], 'lat': lat, 'lon': lon}
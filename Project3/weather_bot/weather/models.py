@@ -1,21 +1,85 @@
 # weather_bot/weather/models.py
 
-from dataclasses import dataclass
-from typing import List
+from dataclasses import asdict, astuple, dataclass
+from datetime import date
+from typing import List, Optional
+
+# Допустимые диапазоны значений: всё, что вне их, — ошибка данных провайдера
+TEMP_RANGE = (-100.0, 70.0)
+WIND_RANGE = (0.0, 500.0)
+
+
+def _checked(name, value, bounds):
+    value = float(value)
+    if not bounds[0] <= value <= bounds[1]:
+        raise ValueError(f"{name} вне допустимого диапазона: {value}")
+    return value
+
 
 @dataclass
 class DailyForecast:
-    date: str
+    # __slots__ вручную, а не slots=True: совместимость с Python 3.8.
+    # По этой же причине у полей нет значений по умолчанию
+    __slots__ = ('date', 'min_temp', 'max_temp', 'wind_speed', 'precip_prob',
+                 'weather_text_day', 'weather_text_night', 'current_temp', 'current_text')
+    date: date
     min_temp: float
     max_temp: float
     wind_speed: float
     precip_prob: int
     weather_text_day: str
     weather_text_night: str
+    current_temp: Optional[float]  # текущие условия поверх первого дня (FORECAST_CURRENT_OVERLAY)
+    current_text: Optional[str]
+
+    def __post_init__(self):
+        if not isinstance(self.date, date):
+            self.date = date.fromisoformat(str(self.date)[:10])
+        self.min_temp = _checked('min_temp', self.min_temp, TEMP_RANGE)
+        self.max_temp = _checked('max_temp', self.max_temp, TEMP_RANGE)
+        self.wind_speed = _checked('wind_speed', self.wind_speed, WIND_RANGE)
+        self.precip_prob = int(_checked('precip_prob', self.precip_prob or 0, (0, 100)))
+        if self.current_temp is not None:
+            self.current_temp = _checked('current_temp', self.current_temp, TEMP_RANGE)
+
+    @classmethod
+    def create(cls, date, min_temp, max_temp, wind_speed, precip_prob, weather_text_day, weather_text_night):
+        """Прогноз на день без текущих условий."""
+        return cls(date, min_temp, max_temp, wind_speed, precip_prob, weather_text_day, weather_text_night, None, None)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def astuple(self):
+        return astuple(self)
+
 
 @dataclass
 class LocationForecast:
+    __slots__ = ('city', 'forecast', 'lat', 'lon', 'error')
     city: str
     forecast: List[DailyForecast]
+    lat: Optional[float]
+    lon: Optional[float]
+    error: Optional[str]  # код причины, по которой прогноз для точки не получен (route.ERROR_*)
+
+    @classmethod
+    def failed(cls, stop, error):
+        return cls(stop.city, [], stop.lat, stop.lon, error)
+
+
+@dataclass
+class ResolvedLocation:
+    # Точка маршрута, для которой уже известен ключ AccuWeather
+    __slots__ = ('city', 'key', 'lat', 'lon')
+    city: str
+    key: str
     lat: float
     lon: float
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(city=data['city'], key=data['key'], lat=data['lat'], lon=data['lon'])
@@ -0,0 +1,488 @@
+# weather_bot/weather/providers.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import date
+
+import aiohttp
+
+from Project3.weather_bot.weather.advisory import advisory_engine
+from Project3.weather_bot.weather.api import (
+    API_KEY,
+    forecast_request,
+    geoposition_search_request,
+    location_search_request,
+    parse_current_conditions,
+    parse_daily_forecast,
+    parse_location_data,
+)
+from Project3.weather_bot.weather.models import DailyForecast
+from Project3.weather_bot.weather.quota import (
+    ENDPOINT_CURRENT_CONDITIONS,
+    ENDPOINT_DAILY_FORECAST,
+    ENDPOINT_GEOPOSITION,
+    ENDPOINT_LOCATION_SEARCH,
+    accuweather_quota,
+)
+
+logger = logging.getLogger(__name__)
+
+# Порядок провайдеров: первый — основной, остальные — для хеджирования и отказоустойчивости
+WEATHER_PROVIDERS = os.getenv('WEATHER_PROVIDERS', 'accuweather,open-meteo')
+OPEN_METEO_URL = os.getenv('OPEN_METEO_URL', 'https://api.open-meteo.com/v1/forecast')
+OPEN_METEO_GEOCODING_URL = os.getenv('OPEN_METEO_GEOCODING_URL', 'https://geocoding-api.open-meteo.com/v1/search')
+
+# Хеджирование: если провайдер не ответил за p95 своей задержки, параллельно спрашиваем следующего
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', '1') == '1'
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '1.0'))  # пока замеров мало, сек.
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '0.2'))
+HEDGE_MIN_SAMPLES = 20
+
+# Circuit breaker: после стольких ошибок подряд провайдер отключается на BREAKER_RESET_TIMEOUT сек.
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+
+# Так AccuWeather отвечает, когда суточный лимит запросов исчерпан
+QUOTA_EXCEEDED_STATUSES = (429, 503)
+
+# Ключи локаций Open-Meteo — координаты с префиксом: у сервиса нет собственных ключей
+OPEN_METEO_KEY_PREFIX = 'om:'
+
+# Коды погоды WMO, которые возвращает Open-Meteo, по языкам (короткий код языка)
+WMO_WEATHER_TEXT = {
+    'ru': {
+        0: 'Ясно',
+        1: 'Преимущественно ясно',
+        2: 'Переменная облачность',
+        3: 'Пасмурно',
+        45: 'Туман',
+        48: 'Изморозь',
+        51: 'Слабая морось',
+        53: 'Морось',
+        55: 'Сильная морось',
+        56: 'Ледяная морось',
+        57: 'Сильная ледяная морось',
+        61: 'Небольшой дождь',
+        63: 'Дождь',
+        65: 'Сильный дождь',
+        66: 'Ледяной дождь',
+        67: 'Сильный ледяной дождь',
+        71: 'Небольшой снег',
+        73: 'Снег',
+        75: 'Сильный снег',
+        77: 'Снежные зёрна',
+        80: 'Небольшой ливень',
+        81: 'Ливень',
+        82: 'Сильный ливень',
+        85: 'Снегопад',
+        86: 'Сильный снегопад',
+        95: 'Гроза',
+        96: 'Гроза с градом',
+        99: 'Сильная гроза с градом',
+    },
+    'en': {
+        0: 'Clear sky',
+        1: 'Mainly clear',
+        2: 'Partly cloudy',
+        3: 'Overcast',
+        45: 'Fog',
+        48: 'Depositing rime fog',
+        51: 'Light drizzle',
+        53: 'Drizzle',
+        55: 'Dense drizzle',
+        56: 'Freezing drizzle',
+        57: 'Dense freezing drizzle',
+        61: 'Light rain',
+        63: 'Rain',
+        65: 'Heavy rain',
+        66: 'Freezing rain',
+        67: 'Heavy freezing rain',
+        71: 'Light snow',
+        73: 'Snow',
+        75: 'Heavy snow',
+        77: 'Snow grains',
+        80: 'Light showers',
+        81: 'Showers',
+        82: 'Violent showers',
+        85: 'Snow showers',
+        86: 'Heavy snow showers',
+        95: 'Thunderstorm',
+        96: 'Thunderstorm with hail',
+        99: 'Severe thunderstorm with hail',
+    },
+}
+WMO_NO_DATA = {'ru': 'Нет данных', 'en': 'No data'}
+
+
+class ProviderUnavailable(Exception):
+    """Провайдер не может выполнить запрос (нет квоты, чужой ключ локации) — это не сбой."""
+
+
+class QuotaExceeded(ProviderUnavailable):
+    """Квота провайдера исчерпана: запрос не выполнялся или отклонён сервером по лимиту."""
+
+
+class ProvidersFailed(Exception):
+    """Ни один провайдер не ответил."""
+
+
+class QuotaExhausted(ProvidersFailed):
+    """Все провайдеры пропустили запрос из-за исчерпанной квоты: ответа «не найдено» не было."""
+
+
+class CircuitBreaker:
+    """
+    Закрыт — запросы идут; после failure_threshold ошибок подряд размыкается на reset_timeout,
+    затем пропускает один пробный запрос: успех замыкает его, ошибка размыкает снова.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half-open' and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # Пробный запрос завершился без результата (отменён или провайдер отказался)
+        self._probing = False
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных запросов для оценки p95."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def p95(self):
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class WeatherProvider:
+
+    name = 'provider'
+
+    def __init__(self, http_client):
+        self.http_client = http_client
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+
+    async def search_location(self, city_name, language, api_key=None):
+        raise NotImplementedError
+
+    async def location_by_coords(self, lat, lon, language, api_key=None):
+        raise NotImplementedError
+
+    async def forecast(self, location_key, days, coords=None, api_key=None, optional=False, language='ru-RU'):
+        raise NotImplementedError
+
+    def stats(self):
+        return {'name': self.name, 'breaker': self.breaker.state, 'p95': round(self.latency.p95(), 3)}
+
+
+class AccuWeatherProvider(WeatherProvider):
+
+    name = 'accuweather'
+
+    def __init__(self, http_client, api_key=API_KEY, quota=accuweather_quota):
+        super().__init__(http_client)
+        self.api_key = api_key
+        self.quota = quota
+
+    def _acquire(self, endpoint, optional=False):
+        if not self.quota.acquire(endpoint, optional=optional):
+            raise QuotaExceeded('квота AccuWeather исчерпана')
+
+    async def _get_json(self, url, params):
+        try:
+            return await self.http_client.get_json(url, params=params)
+        except aiohttp.ClientResponseError as http_err:
+            if http_err.status in QUOTA_EXCEEDED_STATUSES:
+                self.quota.mark_exhausted()
+                raise QuotaExceeded(f'лимит AccuWeather исчерпан (HTTP {http_err.status})') from http_err
+            raise
+
+    async def search_location(self, city_name, language, api_key=None):
+        self._acquire(ENDPOINT_LOCATION_SEARCH)
+        url, params = location_search_request(city_name, api_key or self.api_key, language)
+        return parse_location_data(await self._get_json(url, params))
+
+    async def location_by_coords(self, lat, lon, language, api_key=None):
+        self._acquire(ENDPOINT_GEOPOSITION)
+        url, params = geoposition_search_request(lat, lon, api_key or self.api_key, language)
+        data = await self._get_json(url, params)
+        return parse_location_data([data] if isinstance(data, dict) else data)
+
+    async def forecast(self, location_key, days, coords=None, api_key=None, optional=False, language='ru-RU'):
+        if location_key.startswith(OPEN_METEO_KEY_PREFIX):
+            raise ProviderUnavailable('ключ локации другого провайдера')
+        self._acquire(ENDPOINT_CURRENT_CONDITIONS if days == 1 else ENDPOINT_DAILY_FORECAST, optional)
+        url, params = forecast_request(location_key, days, api_key or self.api_key, language)
+        data = await self._get_json(url, params)
+        if days == 1:
+            return parse_current_conditions(data, language) or []
+        return parse_daily_forecast(data)
+
+
+def open_meteo_key(lat, lon):
+    return f'{OPEN_METEO_KEY_PREFIX}{lat:.4f},{lon:.4f}'
+
+
+def parse_open_meteo_key(location_key):
+    if not location_key.startswith(OPEN_METEO_KEY_PREFIX):
+        return None
+    lat, lon = location_key[len(OPEN_METEO_KEY_PREFIX):].split(',')
+    return float(lat), float(lon)
+
+
+def parse_open_meteo_location(data):
+
+    results = (data or {}).get('results') or []
+    if not results:
+        return None
+    place = results[0]
+    lat, lon = place['latitude'], place['longitude']
+    return {'key': open_meteo_key(lat, lon), 'lat': lat, 'lon': lon, 'city': place['name']}
+
+
+def wmo_weather_texts(language):
+    # Тексты на языке пользователя; для неизвестного языка — русские
+    short = language.split('-')[0].lower()
+    if short not in WMO_WEATHER_TEXT:
+        short = 'ru'
+    return WMO_WEATHER_TEXT[short], WMO_NO_DATA[short]
+
+
+def parse_open_meteo_daily(data, language='ru-RU'):
+
+    texts, no_data = wmo_weather_texts(language)
+    daily = data.get('daily', {})
+    forecasts = []
+    for idx, day in enumerate(daily.get('time', [])):
+        try:
+            weather_text = texts.get(daily['weather_code'][idx], no_data)
+            forecasts.append(DailyForecast.create(
+                date=date.fromisoformat(day),
+                min_temp=daily['temperature_2m_min'][idx],
+                max_temp=daily['temperature_2m_max'][idx],
+                wind_speed=daily['wind_speed_10m_max'][idx],
+                precip_prob=daily['precipitation_probability_max'][idx],
+                weather_text_day=weather_text,
+                weather_text_night=weather_text
+            ))
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Некорректный день прогноза Open-Meteo пропущен ({e}): {day}")
+    return forecasts
+
+
+def parse_open_meteo_current(data, language='ru-RU'):
+
+    current = data.get('current')
+    if not current:
+        return []
+    # Вероятности осадков в текущих условиях нет — берём дневную
+    precip = (data.get('daily', {}).get('precipitation_probability_max') or [0])[0] or 0
+    temperature = current['temperature_2m']
+    wind_speed = current['wind_speed_10m']
+    weather_status = advisory_engine.evaluate(temperature, wind_speed, precip, language)
+    try:
+        return [DailyForecast.create(date.fromisoformat(current['time'][:10]), temperature, temperature,
+                                     wind_speed, precip, weather_status, weather_status)]
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Некорректные текущие условия Open-Meteo пропущены: {e}")
+        return []
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo: бесплатный сервис без ключа; прогноз запрашивается по координатам."""
+
+    name = 'open-meteo'
+
+    def __init__(self, http_client, forecast_url=OPEN_METEO_URL, geocoding_url=OPEN_METEO_GEOCODING_URL):
+        super().__init__(http_client)
+        self.forecast_url = forecast_url
+        self.geocoding_url = geocoding_url
+
+    async def search_location(self, city_name, language, api_key=None):
+        params = {'name': city_name, 'count': 1, 'language': language.split('-')[0], 'format': 'json'}
+        return parse_open_meteo_location(await self.http_client.get_json(self.geocoding_url, params=params))
+
+    async def location_by_coords(self, lat, lon, language, api_key=None):
+        # Обратного геокодирования у Open-Meteo нет, для прогноза достаточно координат
+        return {'key': open_meteo_key(lat, lon), 'lat': lat, 'lon': lon, 'city': f'{lat:.2f}, {lon:.2f}'}
+
+    async def forecast(self, location_key, days, coords=None, api_key=None, optional=False, language='ru-RU'):
+        coords = coords or parse_open_meteo_key(location_key)
+        if coords is None:
+            raise ProviderUnavailable('нет координат локации')
+        params = {
+            'latitude': coords[0],
+            'longitude': coords[1],
+            'daily': 'temperature_2m_max,temperature_2m_min,wind_speed_10m_max,'
+                     'precipitation_probability_max,weather_code',
+            'wind_speed_unit': 'kmh',
+            'timezone': 'auto',
+            'forecast_days': days
+        }
+        if days == 1:
+            params['current'] = 'temperature_2m,wind_speed_10m'
+        data = await self.http_client.get_json(self.forecast_url, params=params)
+        if days == 1:
+            return parse_open_meteo_current(data, language)
+        return parse_open_meteo_daily(data, language)
+
+
+PROVIDER_CLASSES = {
+    AccuWeatherProvider.name: AccuWeatherProvider,
+    OpenMeteoProvider.name: OpenMeteoProvider,
+}
+
+
+class WeatherBackend:
+    """
+    Выполняет запрос у первого доступного провайдера. Если он не ответил за p95 своей
+    задержки, тот же запрос параллельно уходит следующему (hedging); при ошибке —
+    следующему сразу. Возвращается первый успешный ответ, остальные запросы отменяются.
+    Провайдеры с разомкнутым circuit breaker пропускаются.
+    """
+
+    def __init__(self, providers, hedge=HEDGE_REQUESTS):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedged = 0
+        self.failovers = 0
+
+    @property
+    def primary(self):
+        return self.providers[0]
+
+    async def _timed(self, provider, method, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = await getattr(provider, method)(*args, **kwargs)
+        except (ProviderUnavailable, asyncio.CancelledError):
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.latency.add(time.monotonic() - started)
+        provider.breaker.record_success()
+        return result
+
+    def _hedge_delay(self, provider):
+        return max(HEDGE_MIN_DELAY, provider.latency.p95())
+
+    async def call(self, method, *args, **kwargs):
+        """
+        (провайдер, результат) первого успешного ответа; ProvidersFailed, если не ответил никто,
+        и QuotaExhausted, если все провайдеры отказали только из-за квоты.
+        """
+        candidates = iter(self.providers)
+        pending = {}
+        errors = []
+        quota_only = True
+
+        def launch():
+            nonlocal quota_only
+            for provider in candidates:
+                if provider.breaker.allow():
+                    task = asyncio.ensure_future(self._timed(provider, method, *args, **kwargs))
+                    pending[task] = provider
+                    return provider
+                quota_only = False
+            return None
+
+        last = launch()
+        try:
+            while pending:
+                timeout = self._hedge_delay(last) if self.hedge and last is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Ответ задерживается дольше обычного — спрашиваем следующего, не отменяя первый
+                    last = launch()
+                    if last is not None:
+                        self.hedged += 1
+                        logger.debug(f"Хеджирование {method}: запрос продублирован провайдеру {last.name}")
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        return provider, task.result()
+                    except Exception as e:
+                        quota_only = quota_only and isinstance(e, QuotaExceeded)
+                        error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                        errors.append(f"{provider.name}: {error}")
+                        logger.warning(f"Провайдер {provider.name} не выполнил {method}: {error}")
+                if not pending:
+                    last = launch()
+                    if last is not None:
+                        self.failovers += 1
+        finally:
+            for task in pending:
+                task.cancel()
+        if errors and quota_only:
+            raise QuotaExhausted('; '.join(errors))
+        raise ProvidersFailed('; '.join(errors) or 'нет доступных провайдеров')
+
+    def stats(self):
+        return {
+            'hedged': self.hedged,
+            'failovers': self.failovers,
+            'providers': [provider.stats() for provider in self.providers]
+        }
+
+
+def create_backend(http_client, names=WEATHER_PROVIDERS, hedge=HEDGE_REQUESTS, quota=accuweather_quota, api_key=API_KEY):
+    """
+    Бэкенд из провайдеров, перечисленных через запятую. quota и api_key относятся к AccuWeather:
+    отдельным потребителям (например, пакетному режиму) можно выдать собственный бюджет и ключ.
+    """
+    providers = []
+    for name in (name.strip() for name in names.split(',') if name.strip()):
+        if name not in PROVIDER_CLASSES:
+            raise ValueError(f"Неизвестный провайдер погоды: {name}. Допустимые значения: {', '.join(PROVIDER_CLASSES)}.")
+        if name == AccuWeatherProvider.name:
+            providers.append(AccuWeatherProvider(http_client, api_key=api_key, quota=quota))
+        else:
+            providers.append(PROVIDER_CLASSES[name](http_client))
+    if not providers:
+        raise ValueError("Не указан ни один провайдер погоды.")
+    return WeatherBackend(providers, hedge=hedge)
@@ -0,0 +1,190 @@
+# weather_bot/weather/quota.py
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from Project3.weather_bot.weather.cache import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Бесплатный тариф AccuWeather — 50 запросов в сутки
+ACCUWEATHER_DAILY_BUDGET = int(os.getenv('ACCUWEATHER_DAILY_BUDGET', '50'))
+ACCUWEATHER_MINUTE_BUDGET = int(os.getenv('ACCUWEATHER_MINUTE_BUDGET', '10'))
+# Доля суточного бюджета, при остатке которой второстепенные запросы уже не выполняются
+ACCUWEATHER_QUOTA_RESERVE = float(os.getenv('ACCUWEATHER_QUOTA_RESERVE', '0.2'))
+# Файл SQLite для счётчиков, чтобы расход не обнулялся при перезапуске
+ACCUWEATHER_QUOTA_DB = os.getenv('ACCUWEATHER_QUOTA_DB')
+
+ENDPOINT_LOCATION_SEARCH = 'location_search'
+ENDPOINT_GEOPOSITION = 'geoposition'
+ENDPOINT_CURRENT_CONDITIONS = 'current_conditions'
+ENDPOINT_DAILY_FORECAST = 'daily_forecast'
+
+
+def _today():
+    # Суточный лимит AccuWeather считается по UTC
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class QuotaManager:
+    """
+    Учёт запросов к платному API по эндпоинтам в пределах суточного и поминутного бюджета.
+    acquire() списывает запрос из бюджета или отказывает; второстепенные запросы
+    (optional=True) отклоняются заранее, когда остаток опускается до резерва.
+    """
+
+    def __init__(self, daily_budget=ACCUWEATHER_DAILY_BUDGET, minute_budget=ACCUWEATHER_MINUTE_BUDGET,
+                 reserve=ACCUWEATHER_QUOTA_RESERVE, store=None, name='quota'):
+        self.daily_budget = daily_budget
+        self.minute_budget = minute_budget
+        self.reserve = reserve
+        self.store = store
+        self.name = name
+        self.shed = 0
+        self.rejected = 0
+        self._day = None
+        self._used = Counter()
+        self._exhausted = False
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        today = _today()
+        if today == self._day:
+            return
+        self._day = today
+        self._used = Counter()
+        self._exhausted = False
+        if self.store is not None:
+            try:
+                stored = self.store.get(today)
+            except Exception as e:
+                logger.error(f"Ошибка чтения счётчиков квоты {self.name}: {e}")
+                stored = None
+            if stored is not None:
+                self._used.update(stored[0]['used'])
+                self._exhausted = stored[0].get('exhausted', False)
+
+    def _save(self):
+        if self.store is None:
+            return
+        try:
+            self.store.set(self._day, {'used': dict(self._used), 'exhausted': self._exhausted},
+                           time.time() + 2 * 24 * 3600)
+        except Exception as e:
+            logger.error(f"Ошибка записи счётчиков квоты {self.name}: {e}")
+
+    def _trim(self, now):
+        while self._recent and self._recent[0] <= now - 60:
+            self._recent.popleft()
+
+    def _daily_remaining(self):
+        if self._exhausted:
+            return 0
+        return max(0, self.daily_budget - sum(self._used.values()))
+
+    def _near_limit(self):
+        return self._daily_remaining() <= self.daily_budget * self.reserve
+
+    def near_limit(self):
+        """Остаток суточного бюджета дошёл до резерва: стоит обходиться кэшем."""
+        with self._lock:
+            self._roll()
+            return self._near_limit()
+
+    def exhausted(self):
+        with self._lock:
+            self._roll()
+            return self._daily_remaining() == 0
+
+    def acquire(self, endpoint, optional=False):
+        """Списывает один запрос к endpoint; False — запрос выполнять нельзя."""
+        now = time.monotonic()
+        with self._lock:
+            self._roll()
+            self._trim(now)
+            if optional and self._near_limit():
+                self.shed += 1
+                logger.info(f"Квота {self.name}: второстепенный запрос {endpoint} пропущен, остаток {self._daily_remaining()}")
+                return False
+            if self._daily_remaining() == 0 or (self.minute_budget and len(self._recent) >= self.minute_budget):
+                self.rejected += 1
+                logger.warning(f"Квота {self.name}: запрос {endpoint} отклонён, бюджет исчерпан")
+                return False
+            self._used[endpoint] += 1
+            self._recent.append(now)
+            if self._near_limit():
+                logger.warning(f"Квота {self.name}: осталось {self._daily_remaining()} запросов на сегодня")
+            self._save()
+            return True
+
+    def mark_exhausted(self):
+        """Upstream сам сообщил об исчерпании лимита — до конца суток запросы не выполняем."""
+        with self._lock:
+            self._roll()
+            if not self._exhausted:
+                logger.error(f"Квота {self.name}: лимит исчерпан по ответу сервера")
+            self._exhausted = True
+            self._save()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._roll()
+            self._trim(now)
+            return {
+                'name': self.name,
+                'day': self._day,
+                'daily_budget': self.daily_budget,
+                'daily_used': sum(self._used.values()),
+                'daily_remaining': self._daily_remaining(),
+                'minute_remaining': max(0, self.minute_budget - len(self._recent)) if self.minute_budget else None,
+                'by_endpoint': dict(self._used),
+                'shed': self.shed,
+                'rejected': self.rejected
+            }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+class SharedQuota:
+    """
+    Собственный бюджет потребителя внутри общей квоты того же ключа API: запрос должен
+    пройти и свой бюджет, и общий. Из общего бюджета он списывается как второстепенный,
+    поэтому резерв общей квоты остаётся основным запросам.
+    """
+
+    def __init__(self, shared, budget):
+        self.shared = shared
+        self.budget = budget
+
+    def acquire(self, endpoint, optional=False):
+        return self.budget.acquire(endpoint, optional=optional) and self.shared.acquire(endpoint, optional=True)
+
+    def near_limit(self):
+        return self.budget.near_limit() or self.shared.near_limit()
+
+    def exhausted(self):
+        return self.budget.exhausted() or self.shared.exhausted()
+
+    def mark_exhausted(self):
+        # Сервер сообщил об исчерпании лимита ключа — он общий
+        self.shared.mark_exhausted()
+
+    def stats(self):
+        return dict(self.budget.stats(), shared=self.shared.name)
+
+    def close(self):
+        self.budget.close()
+
+
+accuweather_quota = QuotaManager(
+    store=SQLiteStore(ACCUWEATHER_QUOTA_DB, table='quota') if ACCUWEATHER_QUOTA_DB else None,
+    name='accuweather'
+)
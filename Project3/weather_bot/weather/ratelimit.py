@@ -0,0 +1,42 @@
+# weather_bot/weather/ratelimit.py
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: rate токенов в секунду, не более capacity в запасе.
+    acquire() не отказывает, а ставит вызывающего в очередь (asyncio.Lock — FIFO).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        """Сколько секунд осталось ждать, пока в ведре наберётся tokens токенов."""
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.delay(tokens))
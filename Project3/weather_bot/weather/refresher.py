@@ -0,0 +1,101 @@
+# weather_bot/weather/refresher.py
+
+import asyncio
+import logging
+import os
+
+from Project3.weather_bot.weather.quota import QuotaManager
+
+logger = logging.getLogger(__name__)
+
+# Период фонового обновления, сек.; 0 — обновление отключено
+REFRESH_INTERVAL = float(os.getenv('REFRESH_INTERVAL', '60'))
+# Сколько самых популярных прогнозов рассматривать за проход
+REFRESH_TOP_N = int(os.getenv('REFRESH_TOP_N', '20'))
+# Обновлять запись, если до её истечения осталось меньше, сек.
+REFRESH_AHEAD = float(os.getenv('REFRESH_AHEAD', '300'))
+# Не больше стольких запросов к API за один проход
+REFRESH_MAX_PER_CYCLE = int(os.getenv('REFRESH_MAX_PER_CYCLE', '5'))
+# Собственный суточный бюджет фонового обновления, чтобы оно не расходовало квоту пользовательских запросов
+REFRESH_DAILY_BUDGET = int(os.getenv('REFRESH_DAILY_BUDGET', '10'))
+# Ключи с популярностью ниже порога не обновляются: к ним давно не обращались
+REFRESH_MIN_SCORE = float(os.getenv('REFRESH_MIN_SCORE', '2'))
+
+ENDPOINT_REFRESH = 'refresh'
+
+
+class ForecastRefresher:
+    """
+    Фоновое обновление популярных прогнозов до истечения их срока в кэше.
+    Популярность и координаты локаций берутся из PopularityTracker, который пополняет
+    get_cached_forecast; после каждого прохода счётчики затухают. Запросы списываются из
+    собственного бюджета budget. Когда квота AccuWeather на исходе, обновляются только ключи
+    с известными координатами — их прогноз можно получить у резервного провайдера.
+    """
+
+    def __init__(self, cache, popularity, refresh, quota, budget=None, interval=REFRESH_INTERVAL,
+                 top_n=REFRESH_TOP_N, ahead=REFRESH_AHEAD, max_per_cycle=REFRESH_MAX_PER_CYCLE,
+                 min_score=REFRESH_MIN_SCORE):
+        self.cache = cache
+        self.popularity = popularity
+        self.refresh = refresh
+        self.quota = quota
+        self.budget = budget or QuotaManager(daily_budget=REFRESH_DAILY_BUDGET, minute_budget=0, reserve=0,
+                                             name='refresh')
+        self.interval = interval
+        self.top_n = top_n
+        self.ahead = ahead
+        self.max_per_cycle = max_per_cycle
+        self.min_score = min_score
+        self.cycles = 0
+        self.refreshed = 0
+        self._task = None
+
+    async def refresh_once(self):
+        """Один проход: обновляет истекающие записи самых популярных ключей; возвращает их число."""
+        refreshed = 0
+        near_limit = self.quota.near_limit()
+        for key, score in self.popularity.top(self.top_n):
+            # top() отсортирован по убыванию: дальше только менее популярные ключи
+            if refreshed >= self.max_per_cycle or score < self.min_score:
+                break
+            remaining = self.cache.ttl_remaining(key)
+            if remaining is not None and remaining > self.ahead:
+                continue
+            coords = self.popularity.context(key)
+            if near_limit and coords is None:
+                logger.debug(f"Квота на исходе: прогноз {key} без координат не обновляется")
+                continue
+            if not self.budget.acquire(ENDPOINT_REFRESH):
+                break
+            logger.debug(f"Фоновое обновление прогноза {key} (популярность {score:.2f})")
+            await self.refresh(*key, coords=coords)
+            refreshed += 1
+        self.popularity.decay()
+        self.cycles += 1
+        self.refreshed += refreshed
+        return refreshed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления прогнозов: {e}")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+            logger.info(f"Фоновое обновление прогнозов запущено: каждые {self.interval} сек., "
+                        f"до {self.max_per_cycle} запросов за проход")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {'cycles': self.cycles, 'refreshed': self.refreshed, 'tracked': len(self.popularity),
+                'budget': self.budget.stats()}
@@ -0,0 +1,66 @@
+# weather_bot/weather/route.py
+
+import asyncio
+import logging
+import os
+
+from Project3.weather_bot.weather.async_api import get_weather_forecast
+from Project3.weather_bot.weather.models import LocationForecast
+
+logger = logging.getLogger(__name__)
+
+# Максимум точек маршрута, обрабатываемых одновременно
+ROUTE_CONCURRENCY = int(os.getenv('ROUTE_CONCURRENCY', '4'))
+# Общий дедлайн на получение прогнозов для всего маршрута, сек.
+ROUTE_DEADLINE = float(os.getenv('ROUTE_DEADLINE', '20'))
+
+# Коды ошибок точки маршрута (LocationForecast.error); тексты для пользователя — в каталоге бота
+ERROR_TIMEOUT = 'timeout'
+ERROR_FAILED = 'failed'
+
+
+async def fetch_stop_forecast(stop, days, language='ru-RU'):
+
+    # Координаты точки позволяют резервному провайдеру обойтись без ключа AccuWeather
+    forecast = await get_weather_forecast(stop.key, days, coords=(stop.lat, stop.lon), language=language)
+    return LocationForecast(stop.city, forecast, stop.lat, stop.lon, None)
+
+
+async def iter_route_forecasts(route_points, days, language='ru-RU', concurrency=ROUTE_CONCURRENCY,
+                               deadline=ROUTE_DEADLINE):
+    """
+    Параллельно получает прогнозы для точек маршрута (ResolvedLocation с известным ключом)
+    на языке language и отдаёт пары (индекс точки, LocationForecast) по мере готовности.
+    Точки, не успевшие к дедлайну, отдаются в конце с кодом ошибки в поле error.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def worker(idx, stop):
+        async with semaphore:
+            try:
+                return idx, await fetch_stop_forecast(stop, days, language)
+            except Exception as e:
+                logger.error(f"Ошибка при получении прогноза для '{stop.city}': {e}")
+                return idx, LocationForecast.failed(stop, ERROR_FAILED)
+
+    tasks = {asyncio.ensure_future(worker(idx, stop)): idx for idx, stop in enumerate(route_points)}
+    pending = set(tasks)
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+    try:
+        while pending:
+            timeout = deadline_at - loop.time()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if pending:
+        logger.warning(f"Дедлайн {deadline} сек. истёк, не завершено точек маршрута: {len(pending)}")
+        for idx in sorted(tasks[task] for task in pending):
+            yield idx, LocationForecast.failed(route_points[idx], ERROR_TIMEOUT)
+